@@ -9,6 +9,8 @@ from .models import (
     PoliticalParty, PartyCandidate, PollingCenter, PollingStation, VoteCount,
     BarcodeScanSession, BarcodeScanRecord, SubOperationRoom, RegistrationCenter
 )
+from .scan_dedup import claim_scan_keys, release_scan_keys
+from .scan_stats import count_processed
 
 
 
@@ -624,11 +626,16 @@ class BarcodeScanRecordAdmin(admin.ModelAdmin):
     @admin.action(description='تحديد كتم التحقق منه')
     def mark_as_validated(self, request, queryset):
         count = queryset.update(status='validated')
-        self.message_user(request, f'تم التحقق من {count} مسح.')
+        duplicates = claim_scan_keys(list(queryset.select_related('polling_center')))
+        message = f'تم التحقق من {count} مسح.'
+        if duplicates:
+            message += f' {len(duplicates)} منها لمحطات مُسحت مسبقاً في مسحات أخرى.'
+        self.message_user(request, message)
     
     @admin.action(description='تحديد كتمت معالجته')
     def mark_as_processed(self, request, queryset):
         from django.utils import timezone
+        count_processed(queryset.exclude(status='processed').only('operator_id'))
         count = queryset.update(status='processed', is_processed=True, 
                                processed_at=timezone.now(), processed_by=request.user)
         self.message_user(request, f'تمت معالجة {count} مسح.')
@@ -636,10 +643,12 @@ class BarcodeScanRecordAdmin(admin.ModelAdmin):
     @admin.action(description='تحديد كمرفوض')
     def mark_as_rejected(self, request, queryset):
         count = queryset.update(status='rejected')
+        release_scan_keys(queryset)
         self.message_user(request, f'تم رفض {count} مسح.')
     
     @admin.action(description='إعادة معالجة')
     def reprocess_scans(self, request, queryset):
         count = queryset.update(status='pending', is_processed=False)
+        release_scan_keys(queryset)
         self.message_user(request, f'تمت إعادة {count} مسح للمعالجة.')
 
@@ -0,0 +1,224 @@
+"""
+فحص إحصائي لنتائج المحطات (مهمة خلفية anomaly_scan)
+يحمّل أصوات كل المحطات كمصفوفة [محطة × مرشح] في NumPy ويطبق الفحوصات على كل المحطات دفعة واحدة:
+- مشاركة تتجاوز الناخبين المسجلين
+- عدم تطابق الأصوات الصحيحة (والباطلة) المدخلة للمحطة مع مجموع VoteCount والأوراق المستلمة
+- نسب مرشحين (أو مشاركة) شاذة مقارنة بمحطات نفس المركز (انحراف عن الوسيط بمقياس MAD)
+- توزيع غير طبيعي للرقم الأخير في أصوات المرشحين (اختبار مربع كاي مقابل التوزيع المنتظم)
+النتائج تُكتب في StationAnomaly وتُراجع من صفحة anomaly_review
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import PollingStation, StationAnomaly, VoteCount
+
+# فرق الأصوات الصحيحة عن مجموع VoteCount الذي يصبح بعده عدم التطابق حرجاً (نسبة)
+TOTALS_CRITICAL_RATIO = 0.05
+
+# أقل عدد محطات مُبلغة في المركز لمقارنة المحطة بنظيراتها
+OUTLIER_MIN_PEERS = 4
+
+# حد الانحراف المعياري المعدّل (0.6745 × الفرق / MAD)؛ 3.5 هو الحد المعتاد لاختبار Iglewicz-Hoaglin
+OUTLIER_Z = 3.5
+
+# أدنى MAD للنسب، حتى لا تُعد فروق صغيرة شاذة عندما تتطابق محطات المركز تقريباً
+OUTLIER_MIN_MAD = 0.01
+
+# أقل فرق بالأصوات عن الوسيط لتسجيل ملاحظة
+OUTLIER_MIN_VOTES = 20
+
+# الأرقام الأخيرة تُفحص فقط لأعداد من خانتين فأكثر، ولمحطة فيها عدد كافٍ منها
+LAST_DIGIT_MIN_VOTES = 10
+LAST_DIGIT_MIN_COUNT = 20
+
+# القيمة الحرجة لمربع كاي بتسع درجات حرية عند 0.001
+LAST_DIGIT_CHI2_CRITICAL = 27.877
+
+
+# ==================== تحميل البيانات ====================
+
+class StationMatrix:
+    """أصوات كل المحطات: votes[محطة × مرشح] مع بيانات المحطة كمتجهات"""
+
+    def __init__(self):
+        stations = list(PollingStation.objects.values_list(
+            'pk', 'center_id', 'registered_voters', 'total_ballots_received', 'valid_votes', 'invalid_votes'
+        ).order_by('pk'))
+        columns = np.array(stations, dtype=np.int64).reshape(-1, 6)
+        self.station_ids, self.centers, self.registered, self.ballots, self.valid, self.invalid = columns.T
+
+        rows = np.array(list(
+            VoteCount.objects.values_list('station_id', 'candidate_id').annotate(votes=Sum('vote_count')).order_by()
+        ), dtype=np.int64).reshape(-1, 3)
+        self.candidate_ids = np.unique(rows[:, 1])
+        self.votes = np.zeros((len(self.station_ids), len(self.candidate_ids)), dtype=np.int64)
+        np.add.at(
+            self.votes,
+            (np.searchsorted(self.station_ids, rows[:, 0]), np.searchsorted(self.candidate_ids, rows[:, 1])),
+            rows[:, 2],
+        )
+        self.totals = self.votes.sum(axis=1)
+
+
+def _finding(check_type, severity, station_id, score, message, candidate_id=None, suffix='', **details):
+    return {
+        'key': f'{check_type}:{station_id}:{candidate_id or suffix}',
+        'check_type': check_type,
+        'severity': severity,
+        'station_id': int(station_id),
+        'candidate_id': int(candidate_id) if candidate_id else None,
+        'score': round(float(score), 4),
+        'message': message,
+        'details': {key: value.item() if isinstance(value, np.generic) else value for key, value in details.items()},
+    }
+
+
+# ==================== الفحوصات ====================
+
+def check_turnout(data):
+    """الأصوات (مجموع VoteCount أو الصحيحة + الباطلة) أكثر من الناخبين المسجلين"""
+    cast = np.maximum(data.totals, data.valid + data.invalid)
+    flagged = np.flatnonzero((data.registered > 0) & (cast > data.registered))
+    return [
+        _finding(StationAnomaly.CHECK_TURNOUT, StationAnomaly.SEVERITY_CRITICAL, data.station_ids[i],
+                 cast[i] / data.registered[i],
+                 f'الأصوات ({cast[i]}) تتجاوز عدد المسجلين ({data.registered[i]})',
+                 cast=cast[i], registered=data.registered[i])
+        for i in flagged
+    ]
+
+
+def check_totals(data):
+    """الأصوات الصحيحة المدخلة لا تساوي مجموع أصوات المرشحين، أو الصحيحة + الباطلة أكثر من الأوراق المستلمة"""
+    findings = []
+    mismatch = np.flatnonzero((data.valid > 0) & (data.totals > 0) & (data.totals != data.valid))
+    for i in mismatch:
+        ratio = abs(data.totals[i] - data.valid[i]) / max(data.valid[i], data.totals[i])
+        severity = StationAnomaly.SEVERITY_CRITICAL if ratio > TOTALS_CRITICAL_RATIO else StationAnomaly.SEVERITY_WARNING
+        findings.append(_finding(
+            StationAnomaly.CHECK_TOTALS, severity, data.station_ids[i], ratio,
+            f'مجموع أصوات المرشحين ({data.totals[i]}) لا يساوي الأصوات الصحيحة ({data.valid[i]})',
+            suffix='valid', candidate_votes=data.totals[i], valid_votes=data.valid[i],
+        ))
+
+    used = data.valid + data.invalid
+    over = np.flatnonzero((data.ballots > 0) & (used > data.ballots))
+    for i in over:
+        findings.append(_finding(
+            StationAnomaly.CHECK_TOTALS, StationAnomaly.SEVERITY_CRITICAL, data.station_ids[i],
+            used[i] / data.ballots[i],
+            f'الصحيحة + الباطلة ({used[i]}) أكثر من الأوراق المستلمة ({data.ballots[i]})',
+            suffix='ballots', valid_votes=data.valid[i], invalid_votes=data.invalid[i], ballots=data.ballots[i],
+        ))
+    return findings
+
+
+def _robust_z(values):
+    """الانحراف المعدّل عن الوسيط لكل عمود: (z، الوسيط)"""
+    median = np.median(values, axis=0)
+    mad = np.maximum(np.median(np.abs(values - median), axis=0), OUTLIER_MIN_MAD)
+    return 0.6745 * (values - median) / mad, median
+
+
+def check_outliers(data):
+    """نسب المرشحين ونسبة المشاركة في كل محطة مقارنة بوسيط محطات نفس المركز"""
+    findings = []
+    reported = np.flatnonzero(data.totals > 0)
+    if not len(reported):
+        return findings
+    shares = data.votes[reported] / data.totals[reported, None]
+    turnout = np.where(data.registered[reported] > 0, data.totals[reported] / np.maximum(data.registered[reported], 1), np.nan)
+
+    order = np.argsort(data.centers[reported], kind='stable')
+    centers, starts = np.unique(data.centers[reported][order], return_index=True)
+    for group in np.split(order, starts[1:]):
+        if len(group) < OUTLIER_MIN_PEERS:
+            continue
+        rows = reported[group]
+        z, median = _robust_z(shares[group])
+        vote_gap = np.abs(shares[group] - median) * data.totals[rows, None]
+        for r, c in zip(*np.nonzero((np.abs(z) > OUTLIER_Z) & (vote_gap >= OUTLIER_MIN_VOTES))):
+            station = rows[r]
+            findings.append(_finding(
+                StationAnomaly.CHECK_OUTLIER, StationAnomaly.SEVERITY_WARNING, data.station_ids[station], abs(z[r, c]),
+                f'نسبة المرشح {shares[group][r, c]:.1%} مقابل وسيط {median[c]:.1%} في محطات المركز',
+                candidate_id=data.candidate_ids[c], votes=data.votes[station, c],
+                share=round(float(shares[group][r, c]), 4), peer_median=round(float(median[c]), 4), peers=len(group),
+            ))
+
+        known = ~np.isnan(turnout[group])
+        if known.sum() >= OUTLIER_MIN_PEERS:
+            z, median = _robust_z(turnout[group][known])
+            for r in np.flatnonzero(np.abs(z) > OUTLIER_Z):
+                station = rows[known][r]
+                findings.append(_finding(
+                    StationAnomaly.CHECK_OUTLIER, StationAnomaly.SEVERITY_WARNING, data.station_ids[station], abs(z[r]),
+                    f'نسبة المشاركة {turnout[group][known][r]:.1%} مقابل وسيط {median:.1%} في محطات المركز',
+                    suffix='turnout', turnout=round(float(turnout[group][known][r]), 4),
+                    peer_median=round(float(median), 4), peers=int(known.sum()),
+                ))
+    return findings
+
+
+def check_last_digits(data):
+    """مربع كاي للرقم الأخير لأصوات المرشحين (أعداد من خانتين فأكثر) مقابل التوزيع المنتظم"""
+    digits = np.where(data.votes >= LAST_DIGIT_MIN_VOTES, data.votes % 10, -1)
+    observed = np.stack([(digits == d).sum(axis=1) for d in range(10)], axis=1)
+    counts = observed.sum(axis=1)
+    expected = np.maximum(counts, 1)[:, None] / 10
+    chi2 = ((observed - expected) ** 2 / expected).sum(axis=1)
+    flagged = np.flatnonzero((counts >= LAST_DIGIT_MIN_COUNT) & (chi2 > LAST_DIGIT_CHI2_CRITICAL))
+    return [
+        _finding(StationAnomaly.CHECK_LAST_DIGIT, StationAnomaly.SEVERITY_WARNING, data.station_ids[i], chi2[i],
+                 f'توزيع الرقم الأخير غير منتظم (مربع كاي {chi2[i]:.1f} على {counts[i]} قيمة)',
+                 digits=observed[i].tolist(), values=counts[i])
+        for i in flagged
+    ]
+
+
+CHECKS = (check_turnout, check_totals, check_outliers, check_last_digits)
+
+
+# ==================== الحفظ ====================
+
+def save_findings(findings):
+    """
+    تحديث جدول الملاحظات بنتائج الفحص: الملاحظة نفسها (نفس المفتاح) تُحدّث مع حفظ حالة مراجعتها،
+    والملاحظات المفتوحة التي لم تعد قائمة تُحذف (المراجعة منها تبقى للأرشيف)
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        StationAnomaly.objects.bulk_create(
+            [StationAnomaly(**finding, last_seen_at=now) for finding in findings],
+            update_conflicts=True,
+            unique_fields=['key'],
+            update_fields=['severity', 'score', 'message', 'details', 'last_seen_at'],
+            batch_size=500,
+        )
+        resolved, _ = StationAnomaly.objects.filter(
+            last_seen_at__lt=now, status=StationAnomaly.STATUS_OPEN
+        ).delete()
+    return resolved
+
+
+def run_anomaly_scan(progress=None):
+    """تشغيل كل الفحوصات على كل المحطات؛ progress(done, total) اختيارية"""
+    data = StationMatrix()
+    findings = []
+    for done, check in enumerate(CHECKS, 1):
+        findings.extend(check(data))
+        if progress:
+            progress(done, len(CHECKS) + 1)
+    resolved = save_findings(findings)
+    counts = {}
+    for finding in findings:
+        counts[finding['check_type']] = counts.get(finding['check_type'], 0) + 1
+    return {
+        'stations': len(data.station_ids),
+        'reported': int((data.totals > 0).sum()),
+        'findings': len(findings),
+        'by_check': counts,
+        'resolved': resolved,
+    }
@@ -0,0 +1,105 @@
+"""
+مراجعة ملاحظات الفحص الإحصائي لنتائج المحطات (elections/anomalies.py)
+"""
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.paginator import Paginator
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
+
+from .admin_views import is_admin
+from .jobs import enqueue
+from .models import BackgroundJob, StationAnomaly
+
+ANOMALIES_PER_PAGE = 50
+
+
+@login_required
+@user_passes_test(is_admin)
+def anomaly_review(request):
+    """قائمة الملاحظات مع التصفية حسب الفحص والخطورة وحالة المراجعة"""
+    status = request.GET.get('status', StationAnomaly.STATUS_OPEN)
+    check_type = request.GET.get('check_type', '')
+    severity = request.GET.get('severity', '')
+    station = request.GET.get('station', '').strip()
+
+    anomalies = StationAnomaly.objects.select_related(
+        'station', 'station__center', 'candidate', 'candidate__party', 'reviewed_by'
+    ).annotate(
+        severity_rank=Case(
+            When(severity=StationAnomaly.SEVERITY_CRITICAL, then=Value(0)),
+            default=Value(1), output_field=IntegerField(),
+        )
+    ).order_by('severity_rank', '-score', 'pk')
+    if status:
+        anomalies = anomalies.filter(status=status)
+    if check_type:
+        anomalies = anomalies.filter(check_type=check_type)
+    if severity:
+        anomalies = anomalies.filter(severity=severity)
+    if station:
+        anomalies = anomalies.filter(station__full_number__startswith=station)
+
+    summary = {
+        (row['check_type'], row['status']): row['count']
+        for row in StationAnomaly.objects.values('check_type', 'status').annotate(count=Count('id'))
+    }
+    checks = [
+        {'value': value, 'label': label,
+         'open': summary.get((value, StationAnomaly.STATUS_OPEN), 0),
+         'total': sum(count for (kind, _), count in summary.items() if kind == value)}
+        for value, label in StationAnomaly.CHECK_CHOICES
+    ]
+
+    context = {
+        'page_obj': Paginator(anomalies, ANOMALIES_PER_PAGE).get_page(request.GET.get('page')),
+        'checks': checks,
+        'status_choices': StationAnomaly.STATUS_CHOICES,
+        'severity_choices': StationAnomaly.SEVERITY_CHOICES,
+        'filters': {'status': status, 'check_type': check_type, 'severity': severity, 'station': station},
+        'last_scan': BackgroundJob.objects.filter(kind='anomaly_scan').order_by('-created_at').first(),
+        'page_title': 'فحص نتائج المحطات',
+    }
+    return render(request, 'elections/anomaly_review.html', context)
+
+
+@login_required
+@user_passes_test(is_admin)
+@require_POST
+def anomaly_update(request, pk):
+    """تأكيد ملاحظة أو استبعادها أو إعادتها للمراجعة"""
+    anomaly = get_object_or_404(StationAnomaly, pk=pk)
+    status = request.POST.get('status')
+    if status not in dict(StationAnomaly.STATUS_CHOICES):
+        messages.error(request, 'حالة غير صالحة')
+    else:
+        anomaly.status = status
+        anomaly.review_notes = request.POST.get('review_notes', anomaly.review_notes)
+        anomaly.reviewed_by = request.user if status != StationAnomaly.STATUS_OPEN else None
+        anomaly.reviewed_at = timezone.now() if status != StationAnomaly.STATUS_OPEN else None
+        anomaly.save(update_fields=['status', 'review_notes', 'reviewed_by', 'reviewed_at'])
+        messages.success(request, f'تم تحديث الملاحظة: {anomaly.get_status_display()}')
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(
+        next_url, allowed_hosts={request.get_host()}, require_https=request.is_secure()
+    ):
+        return redirect(next_url)
+    return redirect('anomaly_review')
+
+
+@login_required
+@user_passes_test(is_admin)
+@require_POST
+def anomaly_scan_start(request):
+    """تشغيل الفحص كمهمة خلفية"""
+    job = enqueue('anomaly_scan', user=request.user, label='فحص نتائج المحطات')
+    return JsonResponse({
+        'success': True,
+        'job_id': job.pk,
+        'status_url': reverse('job_status', args=[job.pk]),
+    })
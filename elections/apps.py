@@ -3,3 +3,15 @@ from django.apps import AppConfig
 
 class ElectionsConfig(AppConfig):
     name = 'elections'
+
+    def ready(self):
+        # Register the hierarchy rollup signal handlers
+        from . import rollups  # noqa: F401
+        # Register the vote tally signal handlers
+        from . import tallies  # noqa: F401
+        # Invalidate the cached candidate map used by bulk vote entry
+        from . import candidate_resolver  # noqa: F401
+        # Invalidate the in-memory polling center/station directory
+        from . import polling_directory  # noqa: F401
+        # Register the background job handlers (elections/jobs.py)
+        from . import job_handlers  # noqa: F401
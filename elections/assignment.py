@@ -0,0 +1,78 @@
+"""
+ربط الناخبين بالمعرفين بشكل جماعي
+قائمة كاملة من أرقام الناخبين تُعالج داخل معاملة واحدة بعدد ثابت من الاستعلامات:
+بحث IN محلي + بحث IN في قاعدة البيانات القديمة + حجز دفعة أكواد + bulk_update + bulk_create
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Voter, IntroducerVoterCounter
+from .rollups import refresh_for_introducers
+from .search import build_voter_search_text
+from .voter_resolver import voter_resolver, new_voter_fields
+
+BULK_BATCH_SIZE = 500
+
+
+def bulk_assign_voters(introducer, voter_numbers):
+    """
+    ربط قائمة أرقام ناخبين بمعرف واحد
+    يعيد (results, counts): حالة كل رقم ('added' / 'already_exists' / 'not_found') وعدادات الملخص
+    """
+    numbers = list(dict.fromkeys(n for n in voter_numbers if n))
+    results = {}
+
+    with transaction.atomic():
+        # select_for_update يمنع ربط نفس الناخبين من طلبين متزامنين
+        local_voters = {
+            voter.voter_number: voter
+            for voter in Voter.objects.select_for_update().filter(voter_number__in=numbers)
+        }
+        people = voter_resolver.get_people([n for n in numbers if n not in local_voters])
+
+        to_update = []
+        to_create = []
+        for number in numbers:
+            voter = local_voters.get(number)
+            if voter:
+                if voter.introducer_id == introducer.pk:
+                    results[number] = 'already_exists'
+                else:
+                    to_update.append(voter)
+                    results[number] = 'added'
+            elif number in people:
+                to_create.append(Voter(**new_voter_fields(people[number]), introducer=introducer))
+                results[number] = 'added'
+            else:
+                results[number] = 'not_found'
+
+        codes = iter(IntroducerVoterCounter.allocate(introducer, len(to_update) + len(to_create)))
+        now = timezone.now()
+
+        previous_introducers = {voter.introducer_id for voter in to_update}
+        for voter in to_update:
+            voter.introducer = introducer
+            voter.voter_code = next(codes)
+            voter.updated_at = now
+        if to_update:
+            Voter.objects.bulk_update(
+                to_update, ['introducer', 'voter_code', 'updated_at'], batch_size=BULK_BATCH_SIZE
+            )
+
+        # bulk_create لا يستدعي save() لذا يُحسب عمود البحث هنا
+        for voter in to_create:
+            voter.voter_code = next(codes)
+            voter.search_text = build_voter_search_text(voter)
+        if to_create:
+            Voter.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+
+        # bulk_update/bulk_create لا ترسل إشارات، لذا تُحدّث الإحصائيات المجمّعة هنا
+        if to_update or to_create:
+            refresh_for_introducers(previous_introducers | {introducer.pk})
+
+    counts = {
+        'added': len(to_update) + len(to_create),
+        'already_exists': sum(1 for status in results.values() if status == 'already_exists'),
+        'not_found': sum(1 for status in results.values() if status == 'not_found'),
+    }
+    return results, counts
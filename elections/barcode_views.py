@@ -10,10 +10,20 @@ import json
 from datetime import datetime, timedelta
 
 from .models import (
-    BarcodeScanSession, BarcodeScanRecord,
-    PollingCenter, PollingStation, PartyCandidate, VoteCount
+    BarcodeScanSession, BarcodeScanRecord, PollingCenter
 )
 from .decorators import role_required
+from .idempotency import idempotent
+from .polling_directory import polling_directory
+from .scan_dedup import DuplicateScan, claim_scan_key, claim_scan_keys, find_claim, record_key
+from .scan_approval import approve_scans
+from .scan_stats import count_scans, count_session_started, operator_stats, session_stats
+
+# الحد الأقصى لعدد المسحات في دفعة واحدة من الجهاز
+MAX_SCAN_BATCH = 200
+
+# الحد الأقصى لعدد المسحات في طلب موافقة جماعية واحد
+MAX_BULK_APPROVAL = 1000
 
 
 # ==================== Barcode Scanner Main View ====================
@@ -36,20 +46,15 @@ def barcode_scanner(request):
             session=active_session
         ).order_by('-scanned_at')[:10]
     
-    # Get overall statistics for user
-    total_sessions = BarcodeScanSession.objects.filter(operator=request.user).count()
-    total_scans = BarcodeScanRecord.objects.filter(operator=request.user).count()
-    successful_scans = BarcodeScanRecord.objects.filter(
-        operator=request.user, 
-        status='processed'
-    ).count()
+    # Get overall statistics for user (من عدادات أيام المُشغِّل)
+    stats = operator_stats(request.user)
     
     context = {
         'active_session': active_session,
         'recent_scans': recent_scans,
-        'total_sessions': total_sessions,
-        'total_scans': total_scans,
-        'successful_scans': successful_scans,
+        'total_sessions': stats['sessions'],
+        'total_scans': stats['total_scans'],
+        'successful_scans': stats['processed_scans'],
         'page_title': 'ماسح الباركود - جرد الأصوات',
     }
     
@@ -84,6 +89,7 @@ def start_scan_session(request):
             operator=request.user,
             vote_type=vote_type
         )
+        count_session_started(session)
         
         return JsonResponse({
             'success': True,
@@ -112,18 +118,13 @@ def end_scan_session(request, session_id):
         
         session.status = 'completed'
         session.completed_at = timezone.now()
-        session.save()
+        # حفظ الحالة فقط: العدادات تُزاد بتعبيرات F() ولا تُكتب من نسخة قديمة
+        session.save(update_fields=['status', 'completed_at'])
         
         return JsonResponse({
             'success': True,
             'message': 'تم إنهاء الجلسة بنجاح',
-            'stats': {
-                'total_scans': session.total_scans,
-                'successful': session.successful_scans,
-                'failed': session.failed_scans,
-                'duplicates': session.duplicate_scans,
-                'success_rate': session.get_success_rate()
-            }
+            'stats': session_stats(session)
         })
         
     except Exception as e:
@@ -137,6 +138,7 @@ def end_scan_session(request, session_id):
 
 @login_required
 @require_http_methods(["POST"])
+@idempotent('process_barcode_scan')
 def process_barcode_scan(request):
     """معالجة بيانات مسح الباركود"""
     try:
@@ -167,69 +169,53 @@ def process_barcode_scan(request):
                 status='active',
                 defaults={'vote_type': 'general'}
             )
+            if created:
+                count_session_started(session)
         
         # Parse barcode data
         parsed_data = parse_barcode_data(barcode_data)
         
-        # Check for duplicates - مع معلومات أكثر تفصيلاً
-        duplicate_info = check_duplicate_scan_detailed(
-            parsed_data['center_number'], 
-            parsed_data['station_number'],
-            session
+        scan_record = BarcodeScanRecord(
+            session=session,
+            operator=request.user,
+            barcode_data=barcode_data,
+            barcode_type=barcode_type,
+            center_number=parsed_data.get('center_number', ''),
+            station_number=parsed_data.get('station_number', ''),
+            vote_type=parsed_data.get('vote_type', session.vote_type),
+            scan_date=parsed_data.get('scan_date'),
+            total_votes=parsed_data.get('total_votes'),
+            valid_votes=parsed_data.get('valid_votes'),
+            invalid_votes=parsed_data.get('invalid_votes'),
+            vote_data=parsed_data.get('vote_data')
         )
         
-        if duplicate_info['is_duplicate']:
-            session.duplicate_scans += 1
-            session.total_scans += 1
-            session.save()
-            
-            return JsonResponse({
-                'success': False,
-                'error': duplicate_info['message'],
-                'status': 'duplicate',
-                'duplicate_details': {
-                    'previous_session': duplicate_info.get('session_code'),
-                    'scan_date': duplicate_info.get('scan_date'),
-                    'operator': duplicate_info.get('operator')
-                }
-            })
+        # Try to link to existing polling center/station
+        link_to_polling_station(scan_record, commit=False)
         
-        # Create scan record
-        with transaction.atomic():
-            scan_record = BarcodeScanRecord.objects.create(
-                session=session,
-                operator=request.user,
-                barcode_data=barcode_data,
-                barcode_type=barcode_type,
-                center_number=parsed_data.get('center_number', ''),
-                station_number=parsed_data.get('station_number', ''),
-                vote_type=parsed_data.get('vote_type', session.vote_type),
-                scan_date=parsed_data.get('scan_date'),
-                total_votes=parsed_data.get('total_votes'),
-                valid_votes=parsed_data.get('valid_votes'),
-                invalid_votes=parsed_data.get('invalid_votes'),
-                vote_data=parsed_data.get('vote_data')
-            )
-            
-            # Try to link to existing polling center/station
-            link_to_polling_station(scan_record)
-            
-            # Validate extracted data
-            validation_result = validate_scan_data(scan_record)
-            
-            if validation_result['valid']:
-                scan_record.status = 'validated'
-                session.successful_scans += 1
-            else:
-                scan_record.status = 'error'
-                scan_record.validation_errors = '\n'.join(validation_result['errors'])
-                session.failed_scans += 1
-            
-            scan_record.save()
+        # Validate extracted data
+        validation_result = validate_scan_data(scan_record)
+        
+        if validation_result['valid']:
+            scan_record.status = 'validated'
+        else:
+            scan_record.status = 'error'
+            scan_record.validation_errors = '\n'.join(validation_result['errors'])
+        
+        # Save scan record; a validated scan claims its station key in the same transaction
+        try:
+            with transaction.atomic():
+                scan_record.save()
+                if scan_record.status == 'validated':
+                    claim_scan_key(scan_record)
+                
+                # Update session stats
+                count_scans(session, validated=int(scan_record.status == 'validated'),
+                            error=int(scan_record.status == 'error'))
+        except DuplicateScan as duplicate:
+            count_scans(session, duplicate=1)
             
-            # Update session stats
-            session.total_scans += 1
-            session.save()
+            return JsonResponse(_duplicate_result(duplicate.claim, session))
         
         return JsonResponse({
             'success': True,
@@ -247,12 +233,7 @@ def process_barcode_scan(request):
                 'polling_station': scan_record.polling_station.full_number if scan_record.polling_station else None
             },
             'validation': validation_result,
-            'session_stats': {
-                'total_scans': session.total_scans,
-                'successful': session.successful_scans,
-                'failed': session.failed_scans,
-                'success_rate': session.get_success_rate()
-            }
+            'session_stats': session_stats(session)
         })
         
     except Exception as e:
@@ -262,6 +243,69 @@ def process_barcode_scan(request):
         }, status=500)
 
 
+@login_required
+@require_http_methods(["POST"])
+@idempotent('process_barcode_batch')
+def process_barcode_batch(request):
+    """
+    معالجة دفعة مسحات مخزنة على الجهاز (أثناء انقطاع الشبكة) في طلب واحد
+    الجسم: {"session_id": ..., "scans": [{"barcode_data", "barcode_type", "client_id"}, ...]}
+    يعيد نتيجة لكل مسح بنفس ترتيب الدفعة
+    """
+    try:
+        data = json.loads(request.body)
+        scans = data.get('scans')
+    except (ValueError, AttributeError):
+        scans = None
+    if not isinstance(scans, list) or not scans:
+        return JsonResponse({'success': False, 'error': 'قائمة المسحات مفقودة'}, status=400)
+    if len(scans) > MAX_SCAN_BATCH:
+        return JsonResponse({
+            'success': False,
+            'error': f'عدد المسحات ({len(scans)}) يتجاوز الحد ({MAX_SCAN_BATCH})'
+        }, status=400)
+
+    session_id = data.get('session_id')
+    if session_id:
+        session = get_object_or_404(BarcodeScanSession, id=session_id, operator=request.user, status='active')
+    else:
+        session, created = BarcodeScanSession.objects.get_or_create(
+            operator=request.user,
+            status='active',
+            defaults={'vote_type': 'general'}
+        )
+        if created:
+            count_session_started(session)
+
+    results = ingest_scan_batch(session, request.user, scans)
+    return JsonResponse({
+        'success': True,
+        'results': results,
+        'summary': {
+            status: sum(1 for result in results if result['status'] == status)
+            for status in ('validated', 'error', 'duplicate', 'invalid')
+        },
+        'session_stats': session_stats(session)
+    })
+
+
+@login_required
+@require_http_methods(["GET"])
+def scan_stats_api(request):
+    """
+    إحصائيات الماسح للاستطلاع الدوري من الصفحة: الجلسة النشطة، واليوم، ومجموع المُشغِّل
+    (من العدادات دون عدّ سجلات المسح)
+    """
+    active_session = BarcodeScanSession.objects.filter(operator=request.user, status='active').first()
+    return JsonResponse({
+        'success': True,
+        'session_id': active_session.id if active_session else None,
+        'session_stats': session_stats(active_session) if active_session else None,
+        'today': operator_stats(request.user, timezone.localdate()),
+        'overall': operator_stats(request.user),
+    })
+
+
 # ==================== Helper Functions ====================
 
 def parse_barcode_data(barcode_raw):
@@ -344,10 +388,11 @@ def parse_barcode_data(barcode_raw):
     return parsed
 
 
-def link_to_polling_station(scan_record):
+def link_to_polling_station(scan_record, commit=True):
     """
     ربط سجل المسح بمركز ومحطة الاقتراع في قاعدة البيانات
-    مع التحقق من دقة البيانات المدخلة
+    مع التحقق من دقة البيانات المدخلة (البحث في دليل المراكز والمحطات في الذاكرة)
+    commit=False يربط السجل دون حفظه
     """
     try:
         # Find polling center - التحقق من وجود رقم المركز
@@ -355,37 +400,21 @@ def link_to_polling_station(scan_record):
             print(f"Warning: No center number provided in scan record {scan_record.id}")
             return
         
-        # البحث عن المركز بدقة
-        center = PollingCenter.objects.filter(
-            center_number=scan_record.center_number.strip()
-        ).first()
+        center, station = polling_directory.find_station(scan_record.center_number, scan_record.station_number)
         
         if center:
             scan_record.polling_center = center
             
-            # Find polling station - التحقق من وجود رقم المحطة
-            if scan_record.station_number:
-                try:
-                    # تحويل رقم المحطة إلى عدد صحيح
-                    station_num = int(scan_record.station_number)
-                    
-                    station = PollingStation.objects.filter(
-                        center=center,
-                        station_number=station_num
-                    ).first()
-                    
-                    if station:
-                        scan_record.polling_station = station
-                        print(f"Successfully linked to station: {station.full_number}")
-                    else:
-                        print(f"Warning: Station {station_num} not found in center {center.center_number}")
-                        
-                except ValueError:
-                    print(f"Error: Invalid station number format: {scan_record.station_number}")
+            if station:
+                scan_record.polling_station = station
+                print(f"Successfully linked to station: {station.full_number}")
+            elif scan_record.station_number:
+                print(f"Warning: Station {scan_record.station_number} not found in center {center.center_number}")
         else:
             print(f"Warning: Center {scan_record.center_number} not found in database")
         
-        scan_record.save()
+        if commit:
+            scan_record.save()
         
     except Exception as e:
         print(f"Error linking to polling station: {e}")
@@ -428,34 +457,15 @@ def validate_scan_data(scan_record):
     }
 
 
-def check_duplicate_scan(center_number, station_number, session):
+def check_duplicate_scan(center_number, station_number, session, vote_type=None):
     """
-    التحقق من وجود مسح مكرر عبر جميع الجلسات
-    يتحقق من:
-    1. نفس الجلسة الحالية
-    2. أي جلسة سابقة تم معالجتها بنجاح
+    التحقق من وجود مسح مكرر عبر جميع الجلسات (بما فيها الجلسة الحالية):
+    هل مفتاح المحطة محجوز لمسح تم التحقق منه أو معالجته (لأي نوع تصويت إن لم يُحدد)
     """
-    # التحقق من التكرار عبر جميع الجلسات (ليس فقط الجلسة الحالية)
-    duplicate_in_any_session = BarcodeScanRecord.objects.filter(
-        center_number=center_number,
-        station_number=station_number,
-        status__in=['validated', 'processed']
-    ).exists()
-    
-    if duplicate_in_any_session:
-        return True
-    
-    # التحقق إضافي من التكرار في الجلسة الحالية (حتى لو لم تتم المعالجة بعد)
-    duplicate_in_current_session = BarcodeScanRecord.objects.filter(
-        session=session,
-        center_number=center_number,
-        station_number=station_number
-    ).exclude(status='error').exists()
-    
-    return duplicate_in_current_session
+    return find_claim(center_number, station_number, vote_type) is not None
 
 
-def check_duplicate_scan_detailed(center_number, station_number, session):
+def check_duplicate_scan_detailed(center_number, station_number, session, vote_type=None):
     """
     التحقق من وجود مسح مكرر مع إرجاع معلومات تفصيلية
     
@@ -468,50 +478,142 @@ def check_duplicate_scan_detailed(center_number, station_number, session):
             'operator': str (optional)
         }
     """
-    # أولاً: التحقق من التكرار في جلسات سابقة تمت معالجتها
-    previous_scan = BarcodeScanRecord.objects.filter(
-        center_number=center_number,
-        station_number=station_number,
-        status__in=['validated', 'processed']
-    ).select_related('session', 'operator').first()
-    
-    if previous_scan:
-        scan_date = previous_scan.scanned_at.strftime('%Y-%m-%d %H:%M')
-        operator_name = previous_scan.operator.username if previous_scan.operator else 'غير معروف'
-        
+    claim = find_claim(center_number, station_number, vote_type)
+    if claim is None:
+        # لا يوجد تكرار
         return {
-            'is_duplicate': True,
-            'message': f'⚠️ تم مسح هذه المحطة مسبقاً في جلسة سابقة ({previous_scan.session.session_code})',
-            'session_code': previous_scan.session.session_code,
-            'scan_date': scan_date,
-            'operator': operator_name
+            'is_duplicate': False,
+            'message': ''
         }
     
-    # ثانياً: التحقق من التكرار في الجلسة الحالية
-    current_scan = BarcodeScanRecord.objects.filter(
-        session=session,
-        center_number=center_number,
-        station_number=station_number
-    ).exclude(status='error').first()
-    
-    if current_scan:
-        scan_date = current_scan.scanned_at.strftime('%Y-%m-%d %H:%M')
-        
-        return {
-            'is_duplicate': True,
-            'message': '⚠️ تم مسح هذه المحطة مسبقاً في نفس الجلسة الحالية',
-            'session_code': session.session_code,
-            'scan_date': scan_date,
-            'operator': current_scan.operator.username if current_scan.operator else 'غير معروف'
-        }
-    
-    # لا يوجد تكرار
+    duplicate = _duplicate_result(claim, session)
+    return {
+        'is_duplicate': True,
+        'message': duplicate['error'],
+        'session_code': duplicate['duplicate_details']['previous_session'],
+        'scan_date': duplicate['duplicate_details']['scan_date'],
+        'operator': duplicate['duplicate_details']['operator']
+    }
+
+
+def resolve_polling_stations(parsed_scans):
+    """مراكز ومحطات كل المسحات من دليل المراكز والمحطات في الذاكرة: [(المركز، المحطة)] بنفس الترتيب"""
+    return [
+        polling_directory.find_station(parsed['center_number'], parsed['station_number'])
+        for parsed in parsed_scans
+    ]
+
+
+def _duplicate_result(claim, session):
+    """رد المسح المكرر من مفتاح المحطة المحجوز (ScanDedupKey) للمسح السابق"""
+    scan = claim.scan
+    if scan.session_id == session.pk:
+        message = '⚠️ تم مسح هذه المحطة مسبقاً في نفس الجلسة الحالية'
+    else:
+        message = f'⚠️ تم مسح هذه المحطة مسبقاً في جلسة سابقة ({scan.session.session_code})'
     return {
-        'is_duplicate': False,
-        'message': ''
+        'success': False,
+        'status': 'duplicate',
+        'error': message,
+        'duplicate_details': {
+            'previous_session': scan.session.session_code,
+            'scan_date': scan.scanned_at.strftime('%Y-%m-%d %H:%M'),
+            'operator': scan.operator.username if scan.operator else 'غير معروف'
+        }
     }
 
 
+def ingest_scan_batch(session, user, scans):
+    """
+    تحليل دفعة مسحات والتحقق منها معاً ثم حفظها في معاملة واحدة (إدراج واحد للسجلات،
+    إدراج واحد لمفاتيح محطاتها وتحديث واحد لعدادات الجلسة)؛ يعيد نتيجة لكل مسح بنفس الترتيب
+    """
+    parsed_scans = []
+    for item in scans:
+        barcode_data = str((item or {}).get('barcode_data') or '') if isinstance(item, dict) else ''
+        parsed_scans.append(parse_barcode_data(barcode_data) if barcode_data.strip() else None)
+
+    links = iter(resolve_polling_stations([parsed for parsed in parsed_scans if parsed]))
+
+    results, records, seen = [], [], {}
+    for index, (item, parsed) in enumerate(zip(scans, parsed_scans)):
+        client_id = item.get('client_id') if isinstance(item, dict) else None
+        if parsed is None:
+            results.append({'index': index, 'client_id': client_id, 'success': False, 'status': 'invalid',
+                            'error': 'بيانات الباركود مفقودة'})
+            continue
+
+        center, station = next(links)
+        record = BarcodeScanRecord(
+            session=session,
+            operator=user,
+            barcode_data=str(item['barcode_data']),
+            barcode_type=str(item.get('barcode_type') or ''),
+            center_number=parsed.get('center_number', ''),
+            station_number=parsed.get('station_number', ''),
+            vote_type=parsed.get('vote_type', session.vote_type),
+            scan_date=parsed.get('scan_date'),
+            total_votes=parsed.get('total_votes'),
+            valid_votes=parsed.get('valid_votes'),
+            invalid_votes=parsed.get('invalid_votes'),
+            vote_data=parsed.get('vote_data'),
+            polling_center=center,
+            polling_station=station,
+        )
+        validation = validate_scan_data(record)
+        if validation['valid']:
+            key = record_key(record)
+            if key in seen:
+                results.append({
+                    'index': index, 'client_id': client_id, 'success': False, 'status': 'duplicate',
+                    'error': f'⚠️ تم مسح هذه المحطة مسبقاً في نفس الدفعة (المسح رقم {seen[key] + 1})',
+                })
+                continue
+            record.status = 'validated'
+            # كما في المسح المفرد: المسح الخاطئ لا يحجز المحطة ولا يمنع إعادة مسحها
+            seen[key] = index
+        else:
+            record.status = 'error'
+            record.validation_errors = '\n'.join(validation['errors'])
+        records.append(record)
+        results.append({
+            'index': index, 'client_id': client_id, 'success': True, 'status': record.status,
+            'record': record, 'validation': validation,
+        })
+
+    with transaction.atomic():
+        BarcodeScanRecord.objects.bulk_create(records)
+        # المسحات التي سبقها مسح آخر (سابق أو متزامن) إلى محطتها تُحذف وتُعاد كمكررة
+        duplicates = claim_scan_keys([record for record in records if record.status == 'validated'])
+        if duplicates:
+            BarcodeScanRecord.objects.filter(pk__in=list(duplicates)).delete()
+            for result in results:
+                record = result.get('record')
+                if record is not None and record.pk in duplicates:
+                    del result['record'], result['validation']
+                    result.update(_duplicate_result(duplicates[record.pk], session))
+        counts = {status: sum(1 for result in results if result['status'] == status)
+                  for status in ('validated', 'error', 'duplicate')}
+        count_scans(session, **counts)
+
+    for result in results:
+        record = result.pop('record', None)
+        if record is None:
+            continue
+        result['scan_id'] = record.pk
+        result['data'] = {
+            'center_number': record.center_number,
+            'station_number': record.station_number,
+            'full_station_code': record.get_full_station_code(),
+            'vote_type': record.vote_type,
+            'total_votes': record.total_votes,
+            'valid_votes': record.valid_votes,
+            'invalid_votes': record.invalid_votes,
+            'polling_center': record.polling_center.name if record.polling_center else None,
+            'polling_station': record.polling_station.full_number if record.polling_station else None
+        }
+    return results
+
 
 # ==================== Scan Records Management ====================
 
@@ -534,46 +636,14 @@ def approve_and_process_scan(request, scan_id):
                 'error': 'لا يمكن المعالجة. المحطة غير مربوطة في قاعدة البيانات'
             })
         
-        # Process vote data and create VoteCount records
-        with transaction.atomic():
-            created_count = 0
-            
-            if scan_record.vote_data:
-                for candidate_id, vote_count in scan_record.vote_data.items():
-                    try:
-                        candidate = PartyCandidate.objects.get(id=int(candidate_id))
-                        
-                        # Create or update vote count
-                        vote_obj, created = VoteCount.objects.update_or_create(
-                            station=scan_record.polling_station,
-                            candidate=candidate,
-                            vote_type=scan_record.vote_type,
-                            defaults={
-                                'vote_count': int(vote_count),
-                                'entered_by': request.user,
-                                'notes': f'تم الإدخال عبر مسح الباركود - جلسة: {scan_record.session.session_code}'
-                            }
-                        )
-                        
-                        if created:
-                            created_count += 1
-                            
-                    except PartyCandidate.DoesNotExist:
-                        continue
-            
-            # Mark as processed
-            scan_record.status = 'processed'
-            scan_record.is_processed = True
-            scan_record.processed_at = timezone.now()
-            scan_record.processed_by = request.user
-            scan_record.save()
-            
-            # Update station counting status
-            if scan_record.polling_station:
-                scan_record.polling_station.counting_status = 'completed'
-                scan_record.polling_station.valid_votes = scan_record.valid_votes or 0
-                scan_record.polling_station.invalid_votes = scan_record.invalid_votes or 0
-                scan_record.polling_station.save()
+        # Process vote data and create VoteCount records (نفس مسار الموافقة الجماعية)
+        summary = approve_scans([scan_record.pk], request.user)
+        if scan_record.pk in summary['skipped']:
+            return JsonResponse({
+                'success': False,
+                'error': summary['skipped'][scan_record.pk]
+            })
+        created_count = summary['created']
         
         return JsonResponse({
             'success': True,
@@ -588,6 +658,38 @@ def approve_and_process_scan(request, scan_id):
         }, status=500)
 
 
+@login_required
+@role_required(['admin', 'supervisor'])
+@require_http_methods(["POST"])
+def approve_scans_bulk(request):
+    """
+    الموافقة على عدة مسحات متحقق منها ومعالجتها معاً (التحديد المتعدد في صفحة الجلسة)
+    الجسم: {"scan_ids": [...]}؛ الأعداد الأكبر من MAX_BULK_APPROVAL عبر أمر approve_scans
+    """
+    try:
+        scan_ids = [int(pk) for pk in json.loads(request.body).get('scan_ids') or []]
+    except (ValueError, TypeError, AttributeError):
+        scan_ids = []
+    if not scan_ids:
+        return JsonResponse({'success': False, 'error': 'لم يتم تحديد أي مسح'}, status=400)
+    if len(scan_ids) > MAX_BULK_APPROVAL:
+        return JsonResponse({
+            'success': False,
+            'error': f'عدد المسحات ({len(scan_ids)}) يتجاوز الحد ({MAX_BULK_APPROVAL})'
+        }, status=400)
+    
+    summary = approve_scans(scan_ids, request.user)
+    return JsonResponse({
+        'success': True,
+        'message': f'تمت معالجة {len(summary["approved"])} مسح: {summary["created"]} سجل أصوات جديد '
+                   f'و{summary["updated"]} معدّل',
+        'approved': summary['approved'],
+        'skipped': {str(pk): reason for pk, reason in summary['skipped'].items()},
+        'created_count': summary['created'],
+        'updated_count': summary['updated'],
+    })
+
+
 # ==================== Session List and Details ====================
 
 @login_required
@@ -0,0 +1,81 @@
+"""
+تحويل معرفات المرشحين الواردة من رمز QR (المعرف أو كود المرشح) إلى PartyCandidate
+خريطة كاملة لكل المرشحين تُحمّل في الذاكرة مرة واحدة وتُحل بها دفعة الأصوات كاملة دون استعلامات،
+وتُلغى عند تعديل مرشح أو حزب (إشارات) أو بعد انتهاء مدتها، وتُعاد قراءتها مرة عند وجود معرف غير معروف
+"""
+import threading
+import time
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import PartyCandidate, PoliticalParty
+from .search import normalize_digits
+
+# مدة صلاحية الخريطة (ثوانٍ)؛ الإشارات تلغيها فوراً في العملية التي عدّلت المرشح
+MAP_TTL = 300
+
+# أقل عمر للخريطة قبل إعادة قراءتها بسبب معرف غير معروف (يمنع إعادة القراءة مع كل طلب خاطئ)
+MISS_RELOAD_AFTER = 5
+
+
+class CandidateResolver:
+    """خريطة المرشحين: المعرف وكود المرشح -> pk"""
+
+    def __init__(self, ttl=MAP_TTL):
+        self.ttl = ttl
+        self._map = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        by_pk, by_code = set(), {}
+        for pk, code in PartyCandidate.objects.values_list('pk', 'candidate_code'):
+            by_pk.add(pk)
+            if code:
+                by_code[code] = pk
+        return {'by_pk': by_pk, 'by_code': by_code}
+
+    def _current(self, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        now = time.monotonic()
+        if self._map is None or now - self._loaded_at > max_age:
+            with self._lock:
+                if self._map is None or now - self._loaded_at > max_age:
+                    self._map = self._load()
+                    self._loaded_at = time.monotonic()
+        return self._map
+
+    @staticmethod
+    def _lookup(mapping, key):
+        # نفس ترتيب البحث السابق: المعرف (إن كان رقماً) ثم كود المرشح
+        if key.isdigit() and int(key) in mapping['by_pk']:
+            return int(key)
+        return mapping['by_code'].get(key)
+
+    def resolve_many(self, keys):
+        """
+        تحويل قائمة معرفات إلى {المعرف الموحد: pk}؛ المعرفات غير المعروفة لا تظهر في النتيجة
+        """
+        keys = {normalize_digits(str(key)) for key in keys}
+        keys.discard('')
+        mapping = self._current()
+        found = {key: self._lookup(mapping, key) for key in keys}
+        if not all(found.values()):
+            # مرشح أضيف في عملية أخرى بعد تحميل الخريطة
+            mapping = self._current(max_age=MISS_RELOAD_AFTER)
+            found = {key: self._lookup(mapping, key) for key in keys}
+        return {key: value for key, value in found.items() if value}
+
+    def clear(self):
+        with self._lock:
+            self._map = None
+
+
+candidate_resolver = CandidateResolver()
+
+
+@receiver([post_save, post_delete], sender=PartyCandidate)
+@receiver([post_save, post_delete], sender=PoliticalParty)
+def candidate_map_changed(sender, **kwargs):
+    candidate_resolver.clear()
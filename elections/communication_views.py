@@ -8,6 +8,7 @@ from .models import (
     PoliticalEntityAgent, CenterDirector, CommunicationLog
 )
 from .forms import CommunicationLogForm
+from .search import search_voters
 
 @login_required
 def communications_dashboard(request):
@@ -94,10 +95,8 @@ def search_contacts(request):
     )
     add_results(directors, 'مدير مركز', 'centerdirector', 'assigned_center_name')
 
-    # 6. الناخبين (Voters) - نضعهم في النهاية لكثرتهم
-    voters = Voter.objects.filter(
-        Q(full_name__icontains=query) | Q(voter_number__icontains=query) | Q(phone__icontains=query)
-    )
+    # 6. الناخبين (Voters) - نضعهم في النهاية لكثرتهم (عبر فهرس البحث)
+    voters = search_voters(Voter.objects.all(), query)[:5]
     add_results(voters, 'ناخب', 'voter', 'governorate')
     
     return JsonResponse({'results': results})
@@ -3,14 +3,16 @@
 يوفر تقارير PDF و Excel و CSV بحجم A4
 """
 
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.db.models import Count, Sum, Q
 from datetime import datetime
 from django.utils import timezone
 import csv
 import io
+import itertools
 
 try:
     from openpyxl import Workbook
@@ -38,6 +40,11 @@ from .models import (
     PartyCandidate, PoliticalParty, PollingCenter, PollingStation, VoteCount,
     CenterDirector, CandidateMonitor, PoliticalEntityAgent
 )
+from .exports import (
+    CLASSIFICATION_LABELS, EXPORT_CHUNK_SIZE, StreamingExcelWriter,
+    filter_voters, iter_voter_rows, streaming_csv_response, wants_gzip
+)
+from .jobs import enqueue
 
 # Archive is optional - only import if available
 try:
@@ -49,6 +56,27 @@ except (ImportError, RuntimeError):
 
 # ==================== Helper Functions ====================
 
+def wants_background(request):
+    return request.GET.get('background') in ('1', 'true', 'yes')
+
+
+def enqueue_report_export(request, report, file_format):
+    """إضافة تصدير كبير إلى طابور المهام الخلفية بدل توليده داخل الطلب"""
+    filters = {key: value for key, value in request.GET.items() if key != 'background'}
+    job = enqueue(
+        'export_report',
+        {'report': report, 'format': file_format, 'filters': filters},
+        user=request.user,
+        label=f"تصدير {BACKGROUND_REPORTS[report]['title']} ({file_format.upper()})",
+    )
+    return JsonResponse({
+        'success': True,
+        'job_id': job.pk,
+        'status_url': reverse('job_status', args=[job.pk]),
+        'download_url': reverse('job_download', args=[job.pk]),
+    })
+
+
 def get_excel_styles():
     """إرجاع أنماط Excel الموحدة"""
     header_fill = PatternFill(start_color="1a237e", end_color="1a237e", fill_type="solid")
@@ -250,89 +278,69 @@ def export_candidates_comprehensive_pdf(request):
 
 # ==================== تقرير الناخبين الشامل ====================
 
+VOTER_REPORT_HEADERS = [
+    'م', 'رقم الناخب', 'الاسم الكامل', 'تاريخ الميلاد', 'اسم الأم',
+    'المحافظة', 'رقم مركز الاقتراع', 'اسم مركز الاقتراع',
+    'رقم المحطة', 'التصنيف', 'رقم الهاتف'
+]
+VOTER_REPORT_WIDTHS = [6, 15, 35, 12, 25, 12, 15, 40, 10, 12, 15]
+VOTER_REPORT_FIELDS = [
+    'voter_number', 'full_name', 'date_of_birth', 'mother_name',
+    'governorate', 'voting_center_number', 'voting_center_name',
+    'station_number', 'classification', 'phone'
+]
+
+
+def voter_report_rows(params):
+    """صفوف تقرير الناخبين الشامل بعد تطبيق الفلاتر"""
+    counter = itertools.count(1)
+    
+    def transform(row):
+        (voter_number, full_name, date_of_birth, mother_name, governorate,
+         center_number, center_name, station_number, classification, phone) = row
+        return [
+            next(counter),
+            voter_number,
+            full_name,
+            str(date_of_birth) if date_of_birth else '',
+            mother_name or '',
+            governorate,
+            center_number,
+            center_name,
+            station_number or '',
+            CLASSIFICATION_LABELS.get(classification, classification),
+            phone or ''
+        ]
+    
+    voters = filter_voters(Voter.objects.all(), params)
+    return iter_voter_rows(voters, VOTER_REPORT_FIELDS, transform)
+
+
 @login_required
 def export_voters_comprehensive_excel(request):
-    """تصدير تقرير الناخبين الشامل إلى Excel"""
+    """تصدير تقرير الناخبين الشامل إلى Excel (كامل السجل، مع نفس فلاتر تصدير CSV؛ background=1 للتصدير كمهمة خلفية)"""
     if not EXCEL_AVAILABLE:
         return HttpResponse('مكتبة openpyxl غير متوفرة', status=500)
     
-    wb = Workbook()
-    ws = wb.active
-    
-    headers = [
-        'م', 'رقم الناخب', 'الاسم الكامل', 'تاريخ الميلاد', 'اسم الأم',
-        'المحافظة', 'رقم مركز الاقتراع', 'اسم مركز الاقتراع',
-        'رقم المحطة', 'التصنيف', 'رقم الهاتف'
-    ]
-    col_widths = [6, 15, 35, 12, 25, 12, 15, 40, 10, 12, 15]
-    
-    styles = setup_excel_sheet(ws, "تقرير الناخبين", headers, col_widths)
+    if wants_background(request):
+        return enqueue_report_export(request, 'voters', 'xlsx')
     
-    # تحديد عدد الناخبين للتصدير (أول 50000 لتجنب الحجم الكبير)
-    voters = Voter.objects.all()[:50000]
+    writer = StreamingExcelWriter("تقرير الناخبين", VOTER_REPORT_HEADERS, VOTER_REPORT_WIDTHS)
+    writer.write_rows(voter_report_rows(request.GET))
     
-    for row_num, voter in enumerate(voters, 2):
-        data = [
-            row_num - 1,
-            voter.voter_number,
-            voter.full_name,
-            str(voter.date_of_birth) if voter.date_of_birth else '',
-            voter.mother_name or '',
-            voter.governorate,
-            voter.voting_center_number,
-            voter.voting_center_name,
-            voter.station_number or '',
-            voter.get_classification_display(),
-            voter.phone or ''
-        ]
-        
-        for col_num, value in enumerate(data, 1):
-            cell = ws.cell(row=row_num, column=col_num)
-            cell.value = value
-            cell.alignment = styles['data_alignment']
-            cell.border = styles['border']
-    
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="voters_report_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-    wb.save(response)
-    
-    return response
+    return writer.response(request, f'voters_report_{datetime.now().strftime("%Y%m%d")}.xlsx')
 
 
 @login_required
 def export_voters_comprehensive_csv(request):
-    """تصدير تقرير الناخبين إلى CSV"""
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    response['Content-Disposition'] = f'attachment; filename="voters_report_{datetime.now().strftime("%Y%m%d")}.csv"'
-    response.write('\ufeff')
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'م', 'رقم الناخب', 'الاسم الكامل', 'تاريخ الميلاد', 'اسم الأم',
-        'المحافظة', 'رقم مركز الاقتراع', 'اسم مركز الاقتراع',
-        'رقم المحطة', 'التصنيف', 'رقم الهاتف'
-    ])
-    
-    voters = Voter.objects.all()
-    
-    for idx, voter in enumerate(voters, 1):
-        writer.writerow([
-            idx,
-            voter.voter_number,
-            voter.full_name,
-            str(voter.date_of_birth) if voter.date_of_birth else '',
-            voter.mother_name or '',
-            voter.governorate,
-            voter.voting_center_number,
-            voter.voting_center_name,
-            voter.station_number or '',
-            voter.get_classification_display(),
-            voter.phone or ''
-        ])
+    """تصدير تقرير الناخبين إلى CSV (متدفق، مع فلاتر: center, station, classification, introducer و gzip=1)"""
+    if wants_background(request):
+        return enqueue_report_export(request, 'voters', 'csv')
     
-    return response
+    filename = f'voters_report_{datetime.now().strftime("%Y%m%d")}.csv'
+    return streaming_csv_response(
+        request, filename, VOTER_REPORT_HEADERS, voter_report_rows(request.GET), gzip=wants_gzip(request)
+    )
 
 
 # ==================== تقرير المعرفين ====================
@@ -507,52 +515,53 @@ def export_anchors_csv(request):
 
 # ==================== تقرير جرد الأصوات ====================
 
+VOTE_REPORT_HEADERS = [
+    'م', 'رقم المركز', 'اسم المركز', 'رقم المحطة', 'نوع التصويت',
+    'رقم المرشح', 'اسم المرشح', 'عدد الأصوات'
+]
+VOTE_REPORT_WIDTHS = [6, 12, 40, 12, 15, 12, 40, 12]
+
+
+def vote_report_rows(params=None):
+    """صفوف تقرير جرد الأصوات مقروءة على دفعات"""
+    vote_types = dict(VoteCount._meta.get_field('vote_type').choices)
+    votes = VoteCount.objects.order_by(
+        'station__center__center_number', 'station__station_number'
+    ).values_list(
+        'station__center__center_number', 'station__center__name', 'station__station_number',
+        'vote_type', 'candidate__party__serial_number', 'candidate__serial_number',
+        'candidate__full_name', 'vote_count'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    
+    return (
+        [
+            idx,
+            center_number,
+            center_name,
+            station_number,
+            vote_types.get(vote_type, vote_type),
+            f"{party_serial if party_serial is not None else '---'}-{candidate_serial}",
+            candidate_name,
+            vote_count
+        ]
+        for idx, (center_number, center_name, station_number, vote_type, party_serial,
+                  candidate_serial, candidate_name, vote_count) in enumerate(votes, 1)
+    )
+
+
 @login_required
 def export_votes_excel(request):
-    """تصدير تقرير جرد الأصوات إلى Excel"""
+    """تصدير تقرير جرد الأصوات إلى Excel (background=1 للتصدير كمهمة خلفية)"""
     if not EXCEL_AVAILABLE:
         return HttpResponse('مكتبة openpyxl غير متوفرة', status=500)
     
-    wb = Workbook()
-    ws = wb.active
+    if wants_background(request):
+        return enqueue_report_export(request, 'votes', 'xlsx')
     
-    headers = [
-        'م', 'رقم المركز', 'اسم المركز', 'رقم المحطة', 'نوع التصويت',
-        'رقم المرشح', 'اسم المرشح', 'عدد الأصوات'
-    ]
-    col_widths = [6, 12, 40, 12, 15, 12, 40, 12]
-    
-    styles = setup_excel_sheet(ws, "جرد الأصوات", headers, col_widths)
+    writer = StreamingExcelWriter("جرد الأصوات", VOTE_REPORT_HEADERS, VOTE_REPORT_WIDTHS)
+    writer.write_rows(vote_report_rows())
     
-    votes = VoteCount.objects.select_related(
-        'station', 'station__center', 'candidate', 'candidate__party'
-    ).order_by('station__center__center_number', 'station__station_number')
-    
-    for row_num, vote in enumerate(votes, 2):
-        data = [
-            row_num - 1,
-            vote.station.center.center_number,
-            vote.station.center.name,
-            vote.station.station_number,
-            vote.get_vote_type_display(),
-            f"{vote.candidate.party.serial_number if vote.candidate.party else '---'}-{vote.candidate.serial_number}",
-            vote.candidate.full_name,
-            vote.vote_count
-        ]
-        
-        for col_num, value in enumerate(data, 1):
-            cell = ws.cell(row=row_num, column=col_num)
-            cell.value = value
-            cell.alignment = styles['data_alignment']
-            cell.border = styles['border']
-    
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="votes_report_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-    wb.save(response)
-    
-    return response
+    return writer.response(request, f'votes_report_{datetime.now().strftime("%Y%m%d")}.xlsx')
 
 
 @login_required
@@ -1018,3 +1027,25 @@ def export_archive_csv(request):
     
     return response
 
+
+# ==================== التصدير كمهمة خلفية ====================
+
+# التقارير الكبيرة التي يمكن تصديرها كمهمة خلفية (elections/job_handlers.py)
+BACKGROUND_REPORTS = {
+    'voters': {
+        'title': 'تقرير الناخبين',
+        'filename': 'voters_report',
+        'headers': VOTER_REPORT_HEADERS,
+        'widths': VOTER_REPORT_WIDTHS,
+        'rows': voter_report_rows,
+        'count': lambda params: filter_voters(Voter.objects.all(), params).count(),
+    },
+    'votes': {
+        'title': 'جرد الأصوات',
+        'filename': 'votes_report',
+        'headers': VOTE_REPORT_HEADERS,
+        'widths': VOTE_REPORT_WIDTHS,
+        'rows': vote_report_rows,
+        'count': lambda params: VoteCount.objects.count(),
+    },
+}
@@ -9,7 +9,7 @@ from django.utils import timezone
 
 from .models import (
     UserRole, Voter, Candidate, Anchor, Introducer, 
-    CampaignTask, CommunicationLog, PartyCandidate, VoteCount
+    CampaignTask, CommunicationLog, PartyCandidate, VoteCount, HierarchyRollup
 )
 from .decorators import role_required
 
@@ -147,13 +147,13 @@ def candidate_dashboard(request):
             
         context = {
             'candidate': candidate,
-            'anchors_count': candidate.anchors.count(),
-            'introducers_count': Introducer.objects.filter(anchor__candidate=candidate).count(),
-            'voters_count': Voter.objects.filter(introducer__anchor__candidate=candidate).count(),
+            'anchors_count': candidate.get_anchors_count(),
+            'introducers_count': candidate.get_introducers_count(),
+            'voters_count': candidate.get_voters_count(),
             'monitors_count': candidate.monitors.count(),
             
             # Lists
-            'anchors': candidate.anchors.all(),
+            'anchors': HierarchyRollup.attach(candidate.anchors.all(), HierarchyRollup.SCOPE_ANCHOR),
             'monitors': candidate.monitors.all(),
             # For introducers and voters, we might need separate pages if too many, but here is a simple list or summary
             'introducers': Introducer.objects.filter(anchor__candidate=candidate)[:20],
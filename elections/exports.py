@@ -0,0 +1,259 @@
+"""
+تصدير البيانات الكبيرة بشكل متدفق (Streaming)
+الصفوف تُقرأ من قاعدة البيانات على دفعات (cursor من جهة الخادم على PostgreSQL)
+وتُرسل للمتصفح فور تجهيزها، فلا يتجاوز استهلاك الذاكرة حجم دفعة واحدة مهما كان عدد السجلات
+تحت ASGI يقرأ Django المولد المتزامن كاملاً إلى الذاكرة قبل إرساله، فتُحوّل الأجزاء إلى مولد غير متزامن
+"""
+import csv
+import io
+import tempfile
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import NamedStyle, Font, PatternFill, Alignment, Border, Side
+    from openpyxl.utils import get_column_letter
+    EXCEL_AVAILABLE = True
+except ImportError:
+    EXCEL_AVAILABLE = False
+
+from .models import Voter
+
+# عدد الصفوف المقروءة من قاعدة البيانات في كل دفعة
+EXPORT_CHUNK_SIZE = 5000
+
+# عدد الصفوف المجمّعة في كل جزء يُرسل للمتصفح
+ROWS_PER_FLUSH = 1000
+
+# حجم الجزء المقروء من الملف في كل إرسال (تنزيل الملفات تحت ASGI)
+FILE_CHUNK_SIZE = 64 * 1024
+
+CLASSIFICATION_LABELS = dict(Voter.CLASSIFICATION_CHOICES)
+
+
+def filter_voters(queryset, params):
+    """تطبيق فلاتر التصدير من معاملات الطلب (center, station, classification, introducer)"""
+    center = params.get('center', '').strip()
+    if center:
+        queryset = queryset.filter(voting_center_number=center)
+
+    station = params.get('station', '').strip()
+    if station:
+        queryset = queryset.filter(station_number=station)
+
+    classification = params.get('classification', '').strip()
+    if classification:
+        queryset = queryset.filter(classification=classification)
+
+    introducer = params.get('introducer', '').strip()
+    if introducer == 'none':
+        queryset = queryset.filter(introducer__isnull=True)
+    elif introducer.isdigit():
+        queryset = queryset.filter(introducer_id=introducer)
+
+    return queryset
+
+
+def wants_gzip(request):
+    return request.GET.get('gzip') in ('1', 'true', 'yes')
+
+
+def _csv_chunks(header, rows):
+    """تحويل الصفوف إلى أجزاء نصية CSV (كل جزء يحتوي ROWS_PER_FLUSH صف)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    buffer.write('\ufeff')  # UTF-8 BOM
+    writer.writerow(header)
+
+    # إرسال العناوين فوراً قبل انتظار أول دفعة من قاعدة البيانات
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate(0)
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % ROWS_PER_FLUSH == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    tail = buffer.getvalue()
+    if tail:
+        yield tail.encode('utf-8')
+
+
+def _gzip_chunks(chunks):
+    """ضغط الأجزاء بصيغة gzip أثناء الإرسال"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def is_asgi(request):
+    return isinstance(request, ASGIRequest)
+
+
+async def _async_chunks(chunks):
+    """
+    مولد غير متزامن فوق مولد متزامن: كل جزء يُقرأ بـ sync_to_async في خيط الطلب نفسه
+    (نفس اتصال قاعدة البيانات والـ cursor)، ويُغلق المولد المتزامن إن قطع المتصفح الاتصال
+    """
+    iterator = iter(chunks)
+    done = object()
+    step = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await step(iterator, done)
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=True)()
+
+
+def streaming_content(request, chunks):
+    """محتوى StreamingHttpResponse المناسب للخادم: غير متزامن تحت ASGI، والمولد نفسه تحت WSGI"""
+    return _async_chunks(chunks) if is_asgi(request) else chunks
+
+
+def file_response(request, fileobj, **kwargs):
+    """FileResponse يُرسل الملف على أجزاء تحت ASGI أيضاً (العناوين والإغلاق من FileResponse نفسه)"""
+    response = FileResponse(fileobj, **kwargs)
+    if is_asgi(request):
+        response.streaming_content = _async_chunks(iter(lambda: fileobj.read(FILE_CHUNK_SIZE), b''))
+    return response
+
+
+def write_csv_file(fileobj, header, rows, gzip=False):
+    """كتابة CSV (اختيارياً مضغوط gzip) إلى ملف مفتوح بوضع ثنائي، للتصدير عبر المهام الخلفية"""
+    chunks = _csv_chunks(header, rows)
+    if gzip:
+        chunks = _gzip_chunks(chunks)
+    for chunk in chunks:
+        fileobj.write(chunk)
+
+
+def streaming_csv_response(request, filename, header, rows, gzip=False):
+    """استجابة CSV متدفقة (اختيارياً مضغوطة gzip)"""
+    chunks = _csv_chunks(header, rows)
+    if gzip:
+        response = StreamingHttpResponse(streaming_content(request, _gzip_chunks(chunks)),
+                                         content_type='application/gzip')
+        filename = f'{filename}.gz'
+    else:
+        response = StreamingHttpResponse(streaming_content(request, chunks), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def iter_voter_rows(queryset, fields, transform=None, ordering='voter_number'):
+    """قراءة الناخبين كـ tuples على دفعات (بدون إنشاء كائنات Voter)"""
+    rows = queryset.order_by(ordering).values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if transform is None:
+        return rows
+    return (transform(row) for row in rows)
+
+
+# ==================== Write-only Excel ====================
+
+# الحد الأقصى لعدد الصفوف في ورقة Excel واحدة
+EXCEL_MAX_ROWS = 1048576
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def _register_styles(wb, header_color):
+    """أنماط مسماة مشتركة (تُخزن مرة واحدة في الملف بدل كائن تنسيق لكل خلية)"""
+    border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    header = NamedStyle(name='report_header')
+    header.fill = PatternFill(start_color=header_color, end_color=header_color, fill_type='solid')
+    header.font = Font(bold=True, color='FFFFFF', size=11)
+    header.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+    header.border = border
+
+    data = NamedStyle(name='report_data')
+    data.alignment = Alignment(horizontal='center', vertical='center')
+    data.border = border
+
+    wb.add_named_style(header)
+    wb.add_named_style(data)
+
+
+class StreamingExcelWriter:
+    """
+    كاتب Excel بوضع الكتابة فقط (write_only) من openpyxl
+    الصفوف تُكتب مباشرة إلى ملف مؤقت، وعند بلوغ حد الصفوف تُفتح ورقة جديدة تلقائياً
+    """
+
+    def __init__(self, title, headers, col_widths, header_color='1a237e', styled=True):
+        self.title = title
+        self.headers = headers
+        self.col_widths = col_widths
+        self.styled = styled
+        self.workbook = Workbook(write_only=True)
+        _register_styles(self.workbook, header_color)
+        self.sheet = None
+        self.sheet_count = 0
+        self.sheet_rows = 0
+        self.total_rows = 0
+
+    def _sheet_title(self):
+        if self.sheet_count == 1:
+            return self.title[:31]
+        suffix = f' ({self.sheet_count})'
+        return self.title[:31 - len(suffix)] + suffix
+
+    def _new_sheet(self):
+        self.sheet_count += 1
+        ws = self.workbook.create_sheet(title=self._sheet_title())
+        ws.sheet_view.rightToLeft = True
+        # عرض الأعمدة محسوب مسبقاً (يجب ضبطه قبل كتابة أي صف في وضع write_only)
+        for i, width in enumerate(self.col_widths, 1):
+            ws.column_dimensions[get_column_letter(i)].width = width
+        ws.append([self._cell(ws, value, 'report_header') for value in self.headers])
+        self.sheet = ws
+        self.sheet_rows = 1
+
+    def _cell(self, ws, value, style):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
+
+    def write_rows(self, rows):
+        for row in rows:
+            if self.sheet is None or self.sheet_rows >= EXCEL_MAX_ROWS:
+                self._new_sheet()
+            if self.styled:
+                row = [self._cell(self.sheet, value, 'report_data') for value in row]
+            self.sheet.append(row)
+            self.sheet_rows += 1
+            self.total_rows += 1
+        return self
+
+    def save(self, fileobj):
+        if self.sheet is None:
+            self._new_sheet()
+        self.workbook.save(fileobj)
+
+    def response(self, request, filename):
+        """حفظ المصنف في ملف مؤقت وإرساله (يُحذف الملف تلقائياً عند إغلاقه)"""
+        tmp = tempfile.TemporaryFile(suffix='.xlsx')
+        self.save(tmp)
+        tmp.seek(0)
+        return file_response(request, tmp, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
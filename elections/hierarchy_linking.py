@@ -0,0 +1,129 @@
+"""
+ربط الناخبين بمراكز الاقتراع والمحطات ومراكز التسجيل على مستوى قاعدة البيانات
+الربط يتم بجمل UPDATE مجمّعة على نطاقات من المفتاح الأساسي بدل تحميل الناخبين في بايثون:
+UPDATE ... FROM على PostgreSQL، واستعلامات فرعية مترابطة على SQLite
+"""
+import time
+
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from .models import PollingCenter, PollingStation, RegistrationCenter, Voter
+
+# عدد المفاتيح الأساسية في كل نطاق (كل نطاق في معاملة مستقلة)
+LINK_CHUNK_SIZE = 50000
+
+
+def _link_specs():
+    """
+    مواصفات الروابط: (الحقل, جداول البحث, شروط الربط, قيمة الربط)
+    {v} في الشروط تُستبدل بمرجع جدول الناخبين
+    """
+    qn = connection.ops.quote_name
+    voter = {f.name: qn(f.column) for f in Voter._meta.concrete_fields}
+    centers = qn(PollingCenter._meta.db_table)
+    stations = qn(PollingStation._meta.db_table)
+    regs = qn(RegistrationCenter._meta.db_table)
+    center_number = qn(PollingCenter._meta.get_field('center_number').column)
+    station_center = qn(PollingStation._meta.get_field('center').column)
+    station_number = qn(PollingStation._meta.get_field('station_number').column)
+    reg_number = qn(RegistrationCenter._meta.get_field('center_number').column)
+
+    return [
+        (
+            'polling_center',
+            f'{centers} pc',
+            f"pc.{center_number} = {{v}}.{voter['voting_center_number']}",
+            'pc.id',
+        ),
+        (
+            'polling_station',
+            f'{stations} ps JOIN {centers} pc ON pc.id = ps.{station_center}',
+            f"pc.{center_number} = {{v}}.{voter['voting_center_number']} "
+            f"AND CAST(ps.{station_number} AS TEXT) = {{v}}.{voter['station_number']}",
+            'ps.id',
+        ),
+        (
+            'registration_center_fk',
+            f'{regs} rc',
+            f"rc.{reg_number} = {{v}}.{voter['registration_center_number']}",
+            'rc.id',
+        ),
+    ]
+
+
+def _pk_ranges(chunk_size):
+    bounds = Voter.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return
+    for start in range(bounds['low'], bounds['high'] + 1, chunk_size):
+        yield start, start + chunk_size
+
+
+def _diff(cursor, table, column, tables, conditions, value, start, end):
+    """(عدد السجلات التي سيتغير ربطها, منها غير مرتبطة حالياً)"""
+    conditions = conditions.format(v='v')
+    cursor.execute(
+        f'SELECT COUNT(*), COUNT(*) - COUNT(v.{column}) FROM {table} v, {tables} '
+        f'WHERE {conditions} AND v.id >= %s AND v.id < %s '
+        f'AND (v.{column} IS NULL OR v.{column} <> {value})',
+        [start, end]
+    )
+    changed, newly_linked = cursor.fetchone()
+    return changed, newly_linked or 0
+
+
+def _update_postgres(cursor, table, column, tables, conditions, value, start, end):
+    conditions = conditions.format(v='v')
+    cursor.execute(
+        f'UPDATE {table} AS v SET {column} = {value} FROM {tables} '
+        f'WHERE {conditions} AND v.id >= %s AND v.id < %s '
+        f'AND v.{column} IS DISTINCT FROM {value}',
+        [start, end]
+    )
+    return cursor.rowcount
+
+
+def _update_correlated(cursor, table, column, tables, conditions, value, start, end):
+    conditions = conditions.format(v=table)
+    cursor.execute(
+        f'UPDATE {table} SET {column} = (SELECT {value} FROM {tables} WHERE {conditions}) '
+        f'WHERE id >= %s AND id < %s AND EXISTS ('
+        f'SELECT 1 FROM {tables} WHERE {conditions} '
+        f'AND ({table}.{column} IS NULL OR {table}.{column} <> {value}))',
+        [start, end]
+    )
+    return cursor.rowcount
+
+
+def link_voters(chunk_size=LINK_CHUNK_SIZE, dry_run=False, on_chunk=None):
+    """
+    ربط الناخبين بالمراكز والمحطات ومراكز التسجيل حسب الأرقام المخزنة في سجل الناخب
+    يُحدّث فقط من له مطابقة وربطه الحالي فارغ أو مختلف (إعادة التشغيل آمنة وسريعة)
+    يعيد قاموساً لكل رابط: changed (و newly_linked في وضع المعاينة) بالإضافة إلى seconds و chunks
+    """
+    qn = connection.ops.quote_name
+    table = qn(Voter._meta.db_table)
+    update = _update_postgres if connection.vendor == 'postgresql' else _update_correlated
+    specs = _link_specs()
+
+    stats = {name: {'changed': 0, 'newly_linked': 0} for name, *_ in specs}
+    stats['chunks'] = 0
+    start_time = time.time()
+
+    for start, end in _pk_ranges(chunk_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            for name, tables, conditions, value in specs:
+                column = qn(Voter._meta.get_field(name).column)
+                if dry_run:
+                    changed, newly_linked = _diff(cursor, table, column, tables, conditions, value, start, end)
+                    stats[name]['changed'] += changed
+                    stats[name]['newly_linked'] += newly_linked
+                else:
+                    stats[name]['changed'] += update(cursor, table, column, tables, conditions, value, start, end)
+        stats['chunks'] += 1
+        if on_chunk:
+            on_chunk(start, end, stats)
+
+    stats['seconds'] = time.time() - start_time
+    return stats
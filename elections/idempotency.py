@@ -0,0 +1,112 @@
+"""
+مفاتيح الطلبات (Idempotency-Key) لواجهات إدخال الأصوات
+الجهاز يولد مفتاحاً لكل إرسال ويعيده مع كل إعادة محاولة؛ حجز المفتاح وتنفيذ الواجهة وحفظ الرد
+تتم في معاملة واحدة، فإعادة المحاولة بعد انقطاع الشبكة تعيد الرد المحفوظ دون إدخال مكرر،
+والطلب الذي فشل أو انقطع قبل التثبيت لا يترك مفتاحاً فيُنفذ من جديد
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# مدة الاحتفاظ بالرد المحفوظ لكل مفتاح
+IDEMPOTENCY_TTL = timedelta(hours=24)
+
+# الفاصل بين عمليات حذف المفاتيح المنتهية في كل عملية (ثوانٍ)
+PRUNE_INTERVAL = 600
+
+MAX_KEY_LENGTH = 100
+
+_last_prune = 0.0
+
+
+def _prune_expired():
+    global _last_prune
+    if time.monotonic() - _last_prune < PRUNE_INTERVAL:
+        return
+    _last_prune = time.monotonic()
+    IdempotencyKey.objects.filter(expires_at__lt=timezone.now()).delete()
+
+
+def _replay(record):
+    response = JsonResponse(record.response, status=record.status_code, safe=False)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(endpoint, user, key, request_hash):
+    """
+    حجز المفتاح؛ يعيد (السجل المحجوز، None) أو (None، الرد الواجب إرجاعه) إذا سبق استخدامه
+    في PostgreSQL ينتظر الإدراج المتزامن لنفس المفتاح حتى تثبيت الطلب الأول ثم يقرأ رده
+    """
+    now = timezone.now()
+    lookup = {'endpoint': endpoint, 'user': user, 'key': key}
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                **lookup, request_hash=request_hash, expires_at=now + IDEMPOTENCY_TTL
+            ), None
+    except IntegrityError:
+        pass
+
+    existing = IdempotencyKey.objects.select_for_update().get(**lookup)
+    if existing.expires_at < now:
+        existing.delete()
+        return IdempotencyKey.objects.create(
+            **lookup, request_hash=request_hash, expires_at=now + IDEMPOTENCY_TTL
+        ), None
+    if existing.request_hash != request_hash:
+        return None, JsonResponse({
+            'success': False,
+            'error': 'مفتاح الطلب مستخدم مسبقاً لبيانات مختلفة'
+        }, status=422)
+    if existing.status_code is None:
+        return None, JsonResponse({
+            'success': False,
+            'error': 'الطلب نفسه قيد المعالجة، يرجى إعادة المحاولة بعد لحظات'
+        }, status=409)
+    return None, _replay(existing)
+
+
+def idempotent(endpoint):
+    """
+    مُزخرف لواجهات POST التي تعيد JSON: الطلب مع ترويسة Idempotency-Key يُنفذ مرة واحدة فقط
+    الطلبات بدون الترويسة تعمل كما كانت
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = (request.headers.get(IDEMPOTENCY_HEADER) or '').strip()
+            if not key or request.method != 'POST' or not request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return JsonResponse({'success': False, 'error': 'مفتاح الطلب طويل جداً'}, status=400)
+
+            _prune_expired()
+            request_hash = hashlib.sha256(request.body).hexdigest()
+            with transaction.atomic():
+                record, response = _claim(endpoint, request.user, key, request_hash)
+                if response is not None:
+                    return response
+
+                response = view(request, *args, **kwargs)
+                if response.status_code >= 500:
+                    # خطأ في الخادم: لا يُحفظ المفتاح حتى تُنفذ إعادة المحاولة فعلاً
+                    transaction.set_rollback(True)
+                    return response
+
+                record.status_code = response.status_code
+                record.response = json.loads(response.content)
+                record.save(update_fields=['status_code', 'response'])
+            return response
+        return wrapper
+    return decorator
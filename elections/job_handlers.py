@@ -0,0 +1,222 @@
+"""
+الدوال المنفذة للمهام الخلفية (استيراد الناخبين والتصدير الكبير)
+كل دالة تستقبل JobContext وتُسجّل بنوع المهمة عبر jobs.register
+"""
+import datetime
+import io
+import os
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+
+from .exports import EXPORT_CHUNK_SIZE, StreamingExcelWriter, write_csv_file
+from .jobs import JobCancelled, register
+from .models import Voter
+from .rollups import rebuild_rollups
+from .voter_import import import_part
+
+# آخر PK في كل دفعة (للتخطي الذكي للدفعات المستوردة مسبقاً)
+BATCH_LAST_PKS = {
+    "voters_batch_001.json": 1599354, "voters_batch_002.json": 1695272,
+    "voters_batch_003.json": 1633596, "voters_batch_004.json": 1391694,
+    "voters_batch_005.json": 1284534, "voters_batch_006.json": 1362024,
+    "voters_batch_007.json": 1318182, "voters_batch_008.json": 1494498,
+    "voters_batch_009.json": 1544464, "voters_batch_010.json": 1162137,
+    "voters_batch_011.json": 1198579, "voters_batch_012.json": 1102554,
+    "voters_batch_013.json": 1012774, "voters_batch_014.json": 799410,
+    "voters_batch_015.json": 892045, "voters_batch_016.json": 867375,
+    "voters_batch_017.json": 802612, "voters_batch_018.json": 640225,
+    "voters_batch_019.json": 690327, "voters_batch_020.json": 737947,
+    "voters_batch_021.json": 545395, "voters_batch_022.json": 405097,
+    "voters_batch_023.json": 637332, "voters_batch_024.json": 473003,
+    "voters_batch_025.json": 557555, "voters_batch_026.json": 151599,
+    "voters_batch_027.json": 325970, "voters_batch_028.json": 1736232,
+    "voters_batch_029.json": 347296, "voters_batch_030.json": 367576,
+    "voters_batch_031.json": 315777, "voters_batch_032.json": 1795986,
+    "voters_batch_033.json": 200771, "voters_batch_034.json": 296133,
+    "voters_batch_035.json": 1837535, "voters_batch_036.json": 176468,
+    "voters_batch_037.json": 5208, "voters_batch_038.json": 1107
+}
+
+IMPORT_LOG_FILE = 'import_log.txt'
+
+
+def _append_import_log(text):
+    """إضافة نص إلى import_log.txt (يعرضه /tool/import-log/)"""
+    with open(IMPORT_LOG_FILE, 'a', encoding='utf-8') as f:
+        f.write(text)
+
+
+# ==================== الاستيراد ====================
+
+@register('import_batches')
+def import_batches(job, start, end, round=None):
+    """استيراد دفعات الناخبين [start, end) من voter_batches (JSON) أو voters_data_parts (ZIP)"""
+    batch_dir = Path('voter_batches')
+    zip_dir = Path('voters_data_parts')
+
+    if not batch_dir.exists() and not zip_dir.exists():
+        job.log('❌ مجلد voter_batches أو voters_data_parts غير موجود')
+        return {'imported': 0}
+
+    # جمع ملفات الدفعات المطلوبة (JSON أولاً ثم ZIP)
+    batch_files = []
+    for i in range(start, end):
+        json_path = batch_dir / f'voters_batch_{i:03d}.json'
+        zip_path = zip_dir / f'voters_part_{i:03d}.zip'
+        if json_path.exists():
+            batch_files.append((i, json_path))
+        elif zip_path.exists():
+            batch_files.append((i, zip_path))
+
+    if not batch_files:
+        job.log(f'❌ لم يتم العثور على بيانات في النطاق {start}-{end - 1}')
+        return {'imported': 0}
+
+    total = len(batch_files)
+    job.log(f'📦 تم العثور على {total} دفعة')
+    job.progress(0, total)
+    imported = 0
+    with_introducer = 0
+
+    for i, (batch_num, batch_file) in enumerate(batch_files, 1):
+        job.check_cancelled()
+        batch_name = f'voters_batch_{batch_num:03d}.json'
+
+        last_pk = BATCH_LAST_PKS.get(batch_name)
+        if last_pk and Voter.objects.filter(pk=last_pk).exists():
+            job.log(f'⏭️  [{i}/{total}] {batch_name}: تم تخطيها (موجودة مسبقاً)')
+            job.progress(i, total)
+            continue
+
+        job.log(f'🔄 [{i}/{total}] {batch_name}: جارٍ الاستيراد...')
+        try:
+            # قراءة متدفقة وكتابة على دفعات بدل loaddata (الذي يحمّل الملف كاملاً في الذاكرة)
+            stats = import_part(batch_file, on_batch=lambda stats: job.check_cancelled())
+            imported += 1
+            with_introducer += stats['with_introducer']
+            job.log(f"✅ [{i}/{total}] {batch_name}: تم بنجاح ({stats['inserted']:,} سجل جديد، "
+                    f"الإجمالي: {Voter.objects.count():,})")
+        except JobCancelled:
+            raise
+        except Exception as e:
+            job.log(f'❌ [{i}/{total}] {batch_name}: فشل - {e}')
+
+        job.progress(i, total)
+
+    # الإدخال المجمّع لا يرسل إشارات
+    if with_introducer:
+        rebuild_rollups()
+
+    final_count = Voter.objects.count()
+    job.log(f'🎉 اكتملت الجولة! الإجمالي الآن: {final_count:,}')
+    return {'imported': imported, 'voter_count': final_count}
+
+
+@register('import_final_data')
+def import_final_data(job):
+    """الاستيراد النهائي الشامل لكل ملفات voters_data_parts (أمر import_voter_parts)"""
+    call_command('import_voter_parts', job=job, stdout=io.StringIO())
+    return {'voter_count': Voter.objects.count()}
+
+
+@register('import_voters')
+def import_voters(job, name='Voter import', start_batch=None, end_batch=None):
+    """تشغيل أمر import_voters (اختيارياً لنطاق دفعات محدد عبر متغيرات البيئة)"""
+    _append_import_log(f"\n[{datetime.datetime.now()}] --- Starting {name} (job #{job.job.pk}) ---\n")
+    job.log(f'🚀 {name}')
+
+    env_backup = {key: os.environ.get(key) for key in ('IMPORT_START_BATCH', 'IMPORT_END_BATCH')}
+    if start_batch is not None:
+        os.environ['IMPORT_START_BATCH'] = str(start_batch)
+        os.environ['IMPORT_END_BATCH'] = str(end_batch)
+
+    output = io.StringIO()
+    try:
+        with redirect_stdout(output), redirect_stderr(output):
+            call_command('import_voters')
+    finally:
+        for key, value in env_backup.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        _append_import_log(output.getvalue())
+        _append_import_log(f"[{datetime.datetime.now()}] --- {name} ended ---\n")
+
+    for line in output.getvalue().splitlines()[-50:]:
+        if line.strip():
+            job.log(line)
+    return {'voter_count': Voter.objects.count()}
+
+
+# ==================== التصدير ====================
+
+def _tracked_rows(job, rows, total):
+    """تمرير الصفوف مع تحديث التقدم وفحص الإلغاء كل دفعة"""
+    for count, row in enumerate(rows, 1):
+        yield row
+        if count % EXPORT_CHUNK_SIZE == 0:
+            job.check_cancelled()
+            job.progress(count, total)
+    job.progress(total, total)
+
+
+@register('export_report', max_attempts=2)
+def export_report(job, report, format='xlsx', filters=None):
+    """توليد تقرير كبير إلى ملف في التخزين الافتراضي (يُحمّل عبر /api/jobs/<id>/download/)"""
+    from .comprehensive_reports import BACKGROUND_REPORTS
+
+    spec = BACKGROUND_REPORTS[report]
+    filters = filters or {}
+    total = spec['count'](filters)
+    job.progress(0, total, f"جارٍ تصدير {spec['title']} ({total:,} سجل)")
+
+    rows = _tracked_rows(job, spec['rows'](filters), total)
+    filename = f"{spec['filename']}_{datetime.datetime.now().strftime('%Y%m%d')}.{format}"
+
+    with tempfile.TemporaryFile() as tmp:
+        if format == 'csv':
+            gzip = filters.get('gzip') in ('1', 'true', 'yes')
+            if gzip:
+                filename += '.gz'
+            write_csv_file(tmp, spec['headers'], rows, gzip=gzip)
+        else:
+            writer = StreamingExcelWriter(spec['title'], spec['headers'], spec['widths'])
+            writer.write_rows(rows)
+            writer.save(tmp)
+        tmp.seek(0)
+        path = default_storage.save(f'exports/job_{job.job.pk}_{filename}', File(tmp))
+
+    job.log(f'✅ تم تجهيز الملف {filename}')
+    return {'file': path, 'filename': filename, 'rows': total}
+
+
+# ==================== توقع المقاعد ====================
+
+@register('seat_projection')
+def seat_projection(job, **params):
+    """محاكاة مونت كارلو كبيرة لتوقع المقاعد، موزعة على أنوية المعالج"""
+    from .seat_projection import project_seats
+
+    job.progress(0, 1, f"جارٍ تشغيل {params.get('simulations', 0):,} محاكاة")
+    result = project_seats(**params, processes=os.cpu_count() or 1)
+    job.progress(1, 1)
+    job.log(f"✅ {result['stations_reported']}/{result['stations_total']} محطة مُبلغة")
+    return result
+
+
+# ==================== فحص النتائج ====================
+
+@register('anomaly_scan')
+def anomaly_scan(job):
+    """الفحص الإحصائي لنتائج كل المحطات وتحديث جدول الملاحظات"""
+    from .anomalies import run_anomaly_scan
+
+    result = run_anomaly_scan(progress=lambda done, total: job.progress(done, total))
+    job.log(f"✅ {result['findings']} ملاحظة على {result['reported']}/{result['stations']} محطة مُبلغة")
+    return result
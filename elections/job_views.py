@@ -0,0 +1,75 @@
+"""
+واجهة متابعة المهام الخلفية (التقدم / الإلغاء / تحميل الملف الناتج)
+"""
+from django.contrib.auth.decorators import login_required
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+
+from .exports import file_response
+from .jobs import request_cancel
+from .models import BackgroundJob
+
+
+def _get_job(request, job_id):
+    """المهمة إذا كانت للمستخدم نفسه أو كان مسؤولاً"""
+    job = BackgroundJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return None
+    user = request.user
+    if user.is_superuser or user.is_staff or job.created_by_id == user.pk:
+        return job
+    return None
+
+
+@login_required
+def job_status(request, job_id):
+    """حالة المهمة وتقدمها (للاستعلام الدوري من الواجهة)"""
+    job = _get_job(request, job_id)
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'المهمة غير موجودة'}, status=404)
+
+    try:
+        log_limit = min(int(request.GET.get('log', 20)), 500)
+    except ValueError:
+        log_limit = 20
+
+    data = job.to_dict(log_limit=log_limit)
+    data['success'] = True
+    return JsonResponse(data)
+
+
+@login_required
+@require_http_methods(["POST"])
+def job_cancel(request, job_id):
+    """طلب إلغاء المهمة"""
+    job = _get_job(request, job_id)
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'المهمة غير موجودة'}, status=404)
+
+    if not request_cancel(job):
+        return JsonResponse({'success': False, 'error': 'المهمة منتهية بالفعل'}, status=400)
+
+    return JsonResponse({'success': True, 'message': 'تم طلب الإلغاء'})
+
+
+@login_required
+def job_download(request, job_id):
+    """تحميل الملف الناتج عن مهمة تصدير مكتملة"""
+    job = _get_job(request, job_id)
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'المهمة غير موجودة'}, status=404)
+
+    result = job.result or {}
+    if job.status != BackgroundJob.STATUS_SUCCEEDED or not result.get('file'):
+        return JsonResponse({'success': False, 'error': 'الملف غير جاهز بعد'}, status=409)
+
+    if not default_storage.exists(result['file']):
+        return JsonResponse({'success': False, 'error': 'الملف لم يعد متوفراً'}, status=410)
+
+    return file_response(
+        request,
+        default_storage.open(result['file'], 'rb'),
+        as_attachment=True,
+        filename=result.get('filename') or result['file'].rsplit('/', 1)[-1],
+    )
@@ -0,0 +1,267 @@
+"""
+طابور المهام الخلفية المعتمد على قاعدة البيانات
+المهام (استيراد / تصدير كبير) تُسجّل في جدول BackgroundJob وينفذها أمر run_jobs في عملية مستقلة،
+فلا تشغل عمال الويب ولا تضيع حالتها عند إعادة التشغيل، ويقرأ تقدمها أي عامل عبر واجهة JSON
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+# الفاصل بين نبضات المهمة الجارية (ثوانٍ)
+HEARTBEAT_INTERVAL = 10
+
+# مهمة جارية بلا نبضة لهذه المدة تُعتبر متوقفة (توقف العامل أو أعيد تشغيله)
+STALE_AFTER = 120
+
+# التأخير الأساسي قبل إعادة المحاولة (يتضاعف مع كل محاولة)
+RETRY_DELAY = 60
+
+# أقصى عدد أسطر محفوظة في سجل المهمة
+LOG_MAX_LINES = 500
+
+# أقل فاصل بين كتابات التقدم في قاعدة البيانات (ثوانٍ)
+PROGRESS_WRITE_INTERVAL = 1.0
+
+_handlers = {}
+
+
+class JobCancelled(Exception):
+    """تُرفع داخل المهمة عند طلب إلغائها"""
+
+
+def register(kind, max_attempts=1):
+    """
+    تسجيل دالة منفذة لنوع مهمة
+    الدالة تستقبل (job, **params) حيث job كائن JobContext
+    """
+    def decorator(func):
+        _handlers[kind] = (func, max_attempts)
+        return func
+    return decorator
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def enqueue(kind, params=None, user=None, label='', max_attempts=None):
+    """إضافة مهمة إلى الطابور"""
+    if max_attempts is None:
+        max_attempts = _handlers.get(kind, (None, 1))[1]
+    return BackgroundJob.objects.create(
+        kind=kind,
+        label=label,
+        params=params or {},
+        max_attempts=max_attempts,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def active_job(kinds):
+    """آخر مهمة في الانتظار أو قيد التنفيذ من الأنواع المحددة"""
+    return BackgroundJob.objects.filter(
+        kind__in=kinds, status__in=BackgroundJob.ACTIVE_STATUSES
+    ).order_by('-created_at').first()
+
+
+def request_cancel(job):
+    """
+    طلب إلغاء مهمة: المهمة المنتظرة تُلغى فوراً، والجارية تتوقف عند أول نقطة فحص
+    يعيد True إذا كانت المهمة ما تزال نشطة
+    """
+    now = timezone.now()
+    if BackgroundJob.objects.filter(pk=job.pk, status=BackgroundJob.STATUS_QUEUED).update(
+        status=BackgroundJob.STATUS_CANCELLED, cancel_requested=True, finished_at=now,
+        message='تم الإلغاء قبل بدء التنفيذ'
+    ):
+        return True
+    return bool(BackgroundJob.objects.filter(pk=job.pk, status=BackgroundJob.STATUS_RUNNING).update(
+        cancel_requested=True
+    ))
+
+
+class JobContext:
+    """
+    واجهة المهمة الجارية: تسجيل الرسائل، تحديث التقدم، وفحص الإلغاء
+    كل كتابة تحدّث heartbeat_at، وخيط نبضات منفصل يحدّثها ويقرأ طلب الإلغاء حتى أثناء الاستدعاءات الطويلة
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self._lines = job.log_lines()
+        self._cancel_requested = job.cancel_requested
+        self._last_progress_write = 0.0
+        self._stop = threading.Event()
+        self._heartbeat_thread = None
+
+    # ---------- الكتابة في قاعدة البيانات ----------
+
+    def _update(self, **fields):
+        # update() بدل save() حتى لا تُكتب فوق cancel_requested الذي يغيّره طلب آخر
+        fields.setdefault('heartbeat_at', timezone.now())
+        BackgroundJob.objects.filter(pk=self.job.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(self.job, name, value)
+        if self._heartbeat_thread is None:
+            self._refresh_cancel_flag()
+
+    def log(self, message):
+        """إضافة سطر إلى سجل المهمة"""
+        line = f'[{timezone.localtime().strftime("%H:%M:%S")}] {message}'
+        self._lines.append(line)
+        del self._lines[:-LOG_MAX_LINES]
+        self._update(log='\n'.join(self._lines), message=str(message)[:500])
+
+    def progress(self, current, total=None, message=None):
+        """تحديث التقدم (الكتابة مقيدة بفاصل زمني أدنى ما عدا عند الاكتمال)"""
+        fields = {'progress_current': current}
+        if total is not None:
+            fields['progress_total'] = total
+        if message is not None:
+            fields['message'] = str(message)[:500]
+
+        now = time.monotonic()
+        finished = total is not None and current >= total
+        if finished or message is not None or now - self._last_progress_write >= PROGRESS_WRITE_INTERVAL:
+            self._last_progress_write = now
+            self._update(**fields)
+        else:
+            for name, value in fields.items():
+                setattr(self.job, name, value)
+
+    def check_cancelled(self):
+        """نقطة فحص: ترفع JobCancelled إذا طُلب إلغاء المهمة"""
+        if self._cancel_requested:
+            raise JobCancelled()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_requested
+
+    # ---------- النبضات ----------
+
+    def _refresh_cancel_flag(self):
+        self._cancel_requested = BackgroundJob.objects.filter(
+            pk=self.job.pk, cancel_requested=True
+        ).exists()
+
+    def heartbeat(self):
+        BackgroundJob.objects.filter(pk=self.job.pk).update(heartbeat_at=timezone.now())
+        self._refresh_cancel_flag()
+
+    def _heartbeat_loop(self):
+        try:
+            while not self._stop.wait(HEARTBEAT_INTERVAL):
+                try:
+                    self.heartbeat()
+                except Exception:
+                    # فشل نبضة واحدة (قفل مؤقت مثلاً) لا يوقف المهمة
+                    pass
+        finally:
+            connection.close()
+
+    def start_heartbeat(self):
+        # على SQLite يتعارض اتصال ثانٍ يكتب مع مؤشر القراءة المفتوح في المهمة (database is locked)،
+        # لذا تُحدّث النبضة هناك مع كل كتابة تقدم أو سجل بدل الخيط المنفصل
+        if connection.vendor == 'sqlite':
+            return
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self._heartbeat_thread.start()
+
+    def stop_heartbeat(self):
+        self._stop.set()
+        if self._heartbeat_thread:
+            self._heartbeat_thread.join(timeout=HEARTBEAT_INTERVAL)
+
+
+# ==================== Worker ====================
+
+def claim_next(worker_id):
+    """
+    حجز أقدم مهمة منتظرة
+    الحجز تحديث شرطي (status='queued') فلا يحجز عاملان نفس المهمة على PostgreSQL أو SQLite
+    """
+    now = timezone.now()
+    candidates = list(
+        BackgroundJob.objects.filter(status=BackgroundJob.STATUS_QUEUED, run_after__lte=now)
+        .order_by('run_after', 'pk').values_list('pk', flat=True)[:10]
+    )
+    for pk in candidates:
+        claimed = BackgroundJob.objects.filter(pk=pk, status=BackgroundJob.STATUS_QUEUED).update(
+            status=BackgroundJob.STATUS_RUNNING,
+            worker=worker_id[:100],
+            attempts=F('attempts') + 1,
+            heartbeat_at=now,
+            started_at=now,
+            finished_at=None,
+        )
+        if claimed:
+            return BackgroundJob.objects.get(pk=pk)
+    return None
+
+
+def requeue_stale(stale_after=STALE_AFTER):
+    """
+    معالجة المهام الجارية التي توقفت نبضاتها (توقف العامل أثناء التنفيذ)
+    تُعاد للطابور إن بقيت لها محاولات، وإلا تُعلّم كفاشلة
+    """
+    now = timezone.now()
+    stale = BackgroundJob.objects.filter(
+        status=BackgroundJob.STATUS_RUNNING,
+        heartbeat_at__lt=now - timedelta(seconds=stale_after),
+    )
+    cancelled = stale.filter(cancel_requested=True).update(
+        status=BackgroundJob.STATUS_CANCELLED, finished_at=now, message='تم الإلغاء'
+    )
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status=BackgroundJob.STATUS_QUEUED, worker='', run_after=now,
+        message='أعيدت إلى الطابور بعد توقف العامل'
+    )
+    failed = stale.update(
+        status=BackgroundJob.STATUS_FAILED, finished_at=now,
+        error='توقف العامل أثناء التنفيذ', message='فشلت: توقف العامل أثناء التنفيذ'
+    )
+    return {'cancelled': cancelled, 'requeued': requeued, 'failed': failed}
+
+
+def run_job(job):
+    """تنفيذ مهمة محجوزة وتسجيل نتيجتها"""
+    ctx = JobContext(job)
+    entry = _handlers.get(job.kind)
+    if entry is None:
+        ctx._update(status=BackgroundJob.STATUS_FAILED, finished_at=timezone.now(),
+                    error=f'نوع مهمة غير معروف: {job.kind}')
+        return job
+
+    handler = entry[0]
+    ctx.start_heartbeat()
+    try:
+        result = handler(ctx, **job.params)
+    except JobCancelled:
+        ctx.log('⏸️ تم إيقاف المهمة بناءً على الطلب')
+        ctx._update(status=BackgroundJob.STATUS_CANCELLED, finished_at=timezone.now())
+    except Exception as e:
+        ctx.log(f'❌ خطأ: {e}')
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts and not ctx.cancel_requested:
+            delay = RETRY_DELAY * (2 ** (job.attempts - 1))
+            ctx._update(status=BackgroundJob.STATUS_QUEUED, worker='', error=error,
+                        run_after=timezone.now() + timedelta(seconds=delay),
+                        message=f'ستُعاد المحاولة بعد {delay} ثانية')
+        else:
+            ctx._update(status=BackgroundJob.STATUS_FAILED, finished_at=timezone.now(), error=error)
+    else:
+        ctx._update(status=BackgroundJob.STATUS_SUCCEEDED, finished_at=timezone.now(), result=result)
+    finally:
+        ctx.stop_heartbeat()
+        close_old_connections()
+    return job
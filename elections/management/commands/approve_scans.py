@@ -0,0 +1,82 @@
+"""
+Approve and process validated barcode scans in bulk (add their votes to VoteCount).
+
+Each batch is one transaction: candidate ids are resolved once, all VoteCount rows
+are upserted with a single statement and the scans/stations are updated in bulk.
+
+Usage:
+    python manage.py approve_scans --all
+    python manage.py approve_scans --session SCAN-20251110093000
+    python manage.py approve_scans --center 123456 --user supervisor
+    python manage.py approve_scans --ids 10 11 12
+    python manage.py approve_scans --all --dry-run    # list what would be approved
+"""
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from elections.models import BarcodeScanRecord
+from elections.scan_approval import APPROVAL_BATCH, approve_scans
+
+
+class Command(BaseCommand):
+    help = 'Approve validated barcode scans in batches and write their votes to VoteCount'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Every validated scan')
+        parser.add_argument('--session', action='append', default=[], help='Scan session code (repeatable)')
+        parser.add_argument('--center', action='append', default=[], help='Center number (repeatable)')
+        parser.add_argument('--ids', nargs='+', type=int, default=[], help='Scan ids')
+        parser.add_argument('--user', help='Username recorded as the approver')
+        parser.add_argument('--batch-size', type=int, default=APPROVAL_BATCH,
+                            help=f'Scans per transaction (default {APPROVAL_BATCH})')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be approved')
+
+    def handle(self, *args, **options):
+        if not (options['all'] or options['session'] or options['center'] or options['ids']):
+            raise CommandError('Select scans with --all, --session, --center or --ids')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'Unknown user: {options["user"]}')
+
+        scans = BarcodeScanRecord.objects.filter(status='validated')
+        if options['session']:
+            scans = scans.filter(session__session_code__in=options['session'])
+        if options['center']:
+            scans = scans.filter(center_number__in=options['center'])
+        if options['ids']:
+            scans = scans.filter(pk__in=options['ids'])
+        scan_ids = list(scans.order_by('scanned_at', 'pk').values_list('pk', flat=True))
+
+        if not scan_ids:
+            self.stdout.write('No validated scans match the selection')
+            return
+        if options['dry_run']:
+            unlinked = scans.filter(polling_station__isnull=True).count()
+            self.stdout.write(f'{len(scan_ids):,} validated scan(s) selected, {unlinked:,} without a linked station')
+            return
+
+        start = time.time()
+
+        def progress(done, total):
+            self.stdout.write(f'  {done:,}/{total:,} scans')
+
+        summary = approve_scans(scan_ids, user, batch_size=options['batch_size'], progress=progress)
+        for pk, reason in sorted(summary['skipped'].items())[:50]:
+            self.stdout.write(self.style.WARNING(f'scan {pk}: {reason}'))
+        if len(summary['skipped']) > 50:
+            self.stdout.write(f'... and {len(summary["skipped"]) - 50} more skipped')
+        if summary['unknown_candidates']:
+            self.stdout.write(self.style.WARNING(
+                f'Ignored {summary["unknown_candidates"]:,} vote entries with unknown candidates or invalid counts'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Approved {len(summary["approved"]):,} scan(s): {summary["created"]:,} vote rows created, '
+            f'{summary["updated"]:,} updated, {summary["unchanged"]:,} unchanged in {time.time() - start:.1f}s'
+        ))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from elections.models import Voter
+from elections.search import build_voter_search_text
 from faker import Faker
 import random
 from datetime import datetime, timedelta
@@ -52,6 +53,7 @@ class Command(BaseCommand):
                 status=random.choice(statuses)
             )
             
+            voter.search_text = build_voter_search_text(voter)
             voters_batch.append(voter)
             
             if len(voters_batch) >= 1000:
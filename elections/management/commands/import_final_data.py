@@ -10,20 +10,16 @@ from elections.models import Voter
 class Command(BaseCommand):
     help = 'Imports final voter data from split zip files'
 
+    # تمريره عند التشغيل كمهمة خلفية (elections/job_handlers.py) لعرض التقدم في الواجهة
+    stealth_options = ('job',)
+
     def handle(self, *args, **kwargs):
-        # Import status tracker from views if it exists to allow real-time UI updates
-        status = None
-        try:
-            from elections.views_import_tool import import_status
-            status = import_status
-        except ImportError:
-            pass
+        job = kwargs.get('job')
 
         def log(msg):
             self.stdout.write(msg)
-            if status:
-                status['log'].append(msg)
-                status['imported_count'] = Voter.objects.count()
+            if job:
+                job.log(msg)
 
         log('🚀 Starting Final Data Import...')
         
@@ -71,6 +67,9 @@ class Command(BaseCommand):
         temp_dir.mkdir(exist_ok=True)
         
         for i, zip_file in enumerate(zip_files, 1):
+            if job:
+                job.check_cancelled()
+                job.progress(i - 1, total_files)
             batch_num = zip_file.name.replace('voters_part_', '').replace('.zip', '')
             batch_json_name = f'voters_batch_{batch_num}.json'
             
@@ -109,6 +108,9 @@ class Command(BaseCommand):
                 
             except Exception as e:
                 log(f'❌ [{i}/{total_files}] Part {batch_num}: Failed - {str(e)}')
+
+        if job:
+            job.progress(total_files, total_files)
         
         # Cleanup temp dir
         try:
@@ -2,6 +2,7 @@ import sqlite3
 import sys
 from django.core.management.base import BaseCommand
 from elections.models import Voter
+from elections.search import build_voter_search_text
 from django.db import transaction
 
 class Command(BaseCommand):
@@ -117,6 +118,7 @@ class Command(BaseCommand):
                         else:
                             # Create new
                             voter = Voter(**voter_data)
+                            voter.search_text = build_voter_search_text(voter)
                             voters_batch.append(voter)
                             created_count += 1
                         
@@ -5,11 +5,14 @@ import os
 import openpyxl
 from django.core.management.base import BaseCommand
 from elections.models import PollingCenter, PollingStation, Area, RegistrationCenter
+from elections.polling_directory import directory_bulk_update
 
 
 class Command(BaseCommand):
     help = 'استيراد مراكز الاقتراع الخاص من ملف Excel'
 
+    # دليل المراكز والمحطات في الذاكرة يُلغى مرة واحدة بعد الاستيراد بدل كل صف
+    @directory_bulk_update()
     def handle(self, *args, **options):
         excel_file = 'مراكز الاقتراع الخاص.xlsx'
         
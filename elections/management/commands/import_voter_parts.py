@@ -0,0 +1,139 @@
+"""
+Fast parallel import of the voter register archives (voters_data_parts/voters_part_*.zip).
+
+Each part is streamed record by record out of its zip (no json.load of the
+whole document) and written in batches: bulk_create on SQLite, COPY FROM
+STDIN into a staging table + INSERT ... ON CONFLICT DO NOTHING on PostgreSQL.
+Parts are spread over a process pool on PostgreSQL; SQLite allows a single
+writer so parts run sequentially there. Rows already present are skipped,
+so the command can be re-run safely after an interruption.
+
+Usage:
+    python manage.py import_voter_parts
+    python manage.py import_voter_parts --parts 1-10,15 --workers 4
+    python manage.py import_voter_parts --dir voter_batches --pattern "voters_batch_*.json"
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from elections.models import Voter
+from elections.rollups import rebuild_rollups
+from elections.voter_import import (
+    IMPORT_BATCH_SIZE, import_part_worker, init_import_worker, import_part, part_number, reset_voter_sequence
+)
+
+
+def parse_parts(value):
+    """'1-10,15' -> {1, ..., 10, 15}"""
+    parts = set()
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if '-' in item:
+            start, end = item.split('-', 1)
+            parts.update(range(int(start), int(end) + 1))
+        else:
+            parts.add(int(item))
+    return parts
+
+
+class Command(BaseCommand):
+    help = 'Stream voter archives into the database in parallel (bulk_create / COPY)'
+
+    # تمريره عند التشغيل كمهمة خلفية (elections/job_handlers.py) لعرض التقدم في الواجهة
+    stealth_options = ('job',)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default='voters_data_parts', help='Directory containing the parts')
+        parser.add_argument('--pattern', default='voters_part_*.zip', help='Glob pattern of part files')
+        parser.add_argument('--parts', default='', help='Part numbers to import, e.g. "1-10,15" (default: all)')
+        parser.add_argument('--workers', type=int, default=min(os.cpu_count() or 1, 4),
+                            help='Worker processes (PostgreSQL only; SQLite always uses 1)')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Rows per write batch')
+
+    def handle(self, *args, **options):
+        job = options.get('job')
+
+        def log(msg, style=None):
+            self.stdout.write(style(msg) if style else msg)
+            if job:
+                job.log(msg)
+
+        data_dir = Path(options['dir'])
+        if not data_dir.exists():
+            raise CommandError(f'Directory "{data_dir}" not found')
+
+        files = sorted(data_dir.glob(options['pattern']))
+        if options['parts']:
+            wanted = parse_parts(options['parts'])
+            files = [f for f in files if part_number(f) in wanted]
+        if not files:
+            raise CommandError('No part files to import')
+
+        workers = max(1, options['workers'])
+        if connection.vendor != 'postgresql':
+            workers = 1
+
+        batch_size = options['batch_size']
+        log(f'📦 {len(files)} parts, {workers} worker(s), backend: {connection.vendor}')
+        if job:
+            job.progress(0, len(files))
+
+        start = time.time()
+        totals = {'read': 0, 'inserted': 0, 'with_introducer': 0}
+        failed = []
+
+        def report(done, stats):
+            for key in totals:
+                totals[key] += stats[key]
+            rate = stats['read'] / stats['seconds'] if stats['seconds'] else 0
+            log(f"✅ [{done}/{len(files)}] Part {stats['part']:03d}: {stats['read']:,} read, "
+                f"{stats['inserted']:,} inserted in {stats['seconds']:.1f}s ({rate:,.0f} rows/s)")
+            if job:
+                job.progress(done, len(files))
+
+        if workers == 1:
+            for done, path in enumerate(files, 1):
+                if job:
+                    job.check_cancelled()
+                try:
+                    report(done, import_part(path, batch_size))
+                except Exception as e:
+                    failed.append(path.name)
+                    log(f'❌ {path.name}: {e}', self.style.ERROR)
+        else:
+            # الاتصالات المفتوحة لا تُورّث للعمليات الفرعية
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_import_worker) as pool:
+                futures = {pool.submit(import_part_worker, str(path), batch_size): path for path in files}
+                for done, future in enumerate(as_completed(futures), 1):
+                    path = futures[future]
+                    try:
+                        report(done, future.result())
+                    except Exception as e:
+                        failed.append(path.name)
+                        log(f'❌ {path.name}: {e}', self.style.ERROR)
+                    if job and job.cancel_requested:
+                        for pending in futures:
+                            pending.cancel()
+                        job.check_cancelled()
+
+        reset_voter_sequence()
+
+        # الإدخال المجمّع لا يرسل إشارات، لذا تُعاد بناء الإحصائيات المجمّعة إن وُجد ناخبون مرتبطون بمعرفين
+        if totals['with_introducer']:
+            rebuild_rollups()
+
+        elapsed = time.time() - start
+        rate = totals['read'] / elapsed if elapsed else 0
+        log(f"🎉 Done: {totals['read']:,} read, {totals['inserted']:,} inserted in {elapsed:.1f}s "
+            f"({rate:,.0f} rows/s). Total voters: {Voter.objects.count():,}", self.style.SUCCESS)
+
+        if failed:
+            raise CommandError(f"{len(failed)} part(s) failed: {', '.join(failed)}")
@@ -2,24 +2,55 @@
 Management command to import voters from legacy SQLite database to PostgreSQL
 This command reads from the local legacy database and imports to the production database.
 
+Rows are paged by key (per_id > last key) rather than OFFSET, so every batch is
+an index range scan no matter how deep into the table the run is. The last
+committed per_id is stored in an ImportCheckpoint row in the same transaction
+as the batch, so an interrupted run resumes exactly where it stopped.
+Existing voters are updated with a native upsert (INSERT ... ON CONFLICT DO
+UPDATE via bulk_create(update_conflicts=True)) instead of one UPDATE per row.
+
 Usage:
     # First, set the DATABASE_URL environment variable to your Railway PostgreSQL URL
     # Then run:
     python manage.py import_voters_to_postgres --batch-size=5000 --limit=100000
 
-    # To import all voters (may take hours):
+    # To import all voters (may take hours; re-running resumes from the checkpoint):
     python manage.py import_voters_to_postgres --batch-size=5000
+
+    # Refresh voters that already exist, starting over from the first per_id:
+    python manage.py import_voters_to_postgres --update-existing --restart
 """
-import os
 import time
+from datetime import datetime
+
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
-from elections.models import Voter
+from django.utils import timezone
+
+from elections.models import ImportCheckpoint, Voter
 from elections.models_legacy import PersonHD, PCHd, VrcHD, GovernorateHD
+from elections.search import build_voter_search_text
+
+LEGACY_DB = 'legacy_voters_db'
+
+# الحقول المأخوذة من السجل القديم (تُحدّث عند --update-existing، وباقي الحقول كالمعرف والتصنيف لا تُمس)
+LEGACY_FIELDS = [
+    'full_name', 'date_of_birth', 'voting_center_number', 'voting_center_name',
+    'station_number', 'family_number', 'registration_center_number',
+    'registration_center_name', 'governorate', 'status', 'search_text',
+]
+
+PERSON_COLUMNS = [
+    'per_id', 'per_first', 'per_father', 'per_grand', 'per_dob',
+    'pcno', 'psno', 'per_famno', 'per_vrc_id', 'per_gov_id',
+]
+
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d']
 
 
 class Command(BaseCommand):
-    help = 'Import voters from legacy SQLite database to PostgreSQL'
+    help = 'Import voters from legacy SQLite database to PostgreSQL (keyset paging, resumable, upserts)'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -32,13 +63,24 @@ class Command(BaseCommand):
             '--limit',
             type=int,
             default=None,
-            help='Maximum number of records to import (default: all)',
+            help='Maximum number of records to process in this run (default: all)',
         )
         parser.add_argument(
-            '--offset',
+            '--start-after',
             type=int,
-            default=0,
-            help='Start from this offset (default: 0)',
+            default=None,
+            help='Start after this per_id instead of the saved checkpoint',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore and reset the saved checkpoint, starting from the first per_id',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            default=None,
+            help='Checkpoint name (default: derived from --governorate)',
         )
         parser.add_argument(
             '--dry-run',
@@ -60,7 +102,6 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         batch_size = options['batch_size']
         limit = options['limit']
-        offset = options['offset']
         dry_run = options['dry_run']
         governorate_filter = options['governorate']
         update_existing = options['update_existing']
@@ -70,8 +111,7 @@ class Command(BaseCommand):
         self.stdout.write(self.style.NOTICE('=' * 60))
 
         # Check if legacy database is available
-        from django.conf import settings
-        if 'legacy_voters_db' not in settings.DATABASES:
+        if LEGACY_DB not in settings.DATABASES:
             raise CommandError(
                 'قاعدة بيانات legacy_voters_db غير معرفة في الإعدادات.\n'
                 'تأكد من وجود تعريف قاعدة البيانات في settings.py'
@@ -79,190 +119,186 @@ class Command(BaseCommand):
 
         # Build cache for centers, VRCs, and governorates
         self.stdout.write('جاري تحميل بيانات المراكز والمحافظات...')
-        
-        centers_cache = {}
-        for center in PCHd.objects.using('legacy_voters_db').all():
-            centers_cache[center.pcno] = center.pc_name
-
-        vrc_cache = {}
-        for vrc in VrcHD.objects.using('legacy_voters_db').all():
-            vrc_cache[vrc.vrc_id] = vrc.vrc_name_ar
-
-        gov_cache = {}
-        for gov in GovernorateHD.objects.using('legacy_voters_db').all():
-            gov_cache[str(gov.gov_no)] = gov.gov_name
-
+        centers_cache = dict(PCHd.objects.using(LEGACY_DB).values_list('pcno', 'pc_name'))
+        vrc_cache = dict(VrcHD.objects.using(LEGACY_DB).values_list('vrc_id', 'vrc_name_ar'))
+        gov_cache = {
+            str(gov_no): gov_name
+            for gov_no, gov_name in GovernorateHD.objects.using(LEGACY_DB).values_list('gov_no', 'gov_name')
+        }
         self.stdout.write(self.style.SUCCESS(
             f'تم تحميل: {len(centers_cache)} مركز, '
             f'{len(vrc_cache)} مركز تسجيل, '
             f'{len(gov_cache)} محافظة'
         ))
 
-        # Count total records
-        queryset = PersonHD.objects.using('legacy_voters_db')
+        queryset = PersonHD.objects.using(LEGACY_DB)
         if governorate_filter:
             queryset = queryset.filter(per_gov_id=governorate_filter)
-        
-        total_count = queryset.count()
-        self.stdout.write(f'إجمالي السجلات المتوفرة: {total_count:,}')
 
-        if limit:
-            records_to_process = min(limit, total_count - offset)
+        # Checkpoint (resume point)
+        checkpoint_name = options['checkpoint'] or (
+            f'legacy_voters:gov{governorate_filter}' if governorate_filter else 'legacy_voters'
+        )
+        checkpoint = None
+        last_key = options['start_after']
+        if not dry_run:
+            checkpoint, _ = ImportCheckpoint.objects.get_or_create(name=checkpoint_name)
+            if options['restart']:
+                checkpoint.last_key = None
+                checkpoint.processed = checkpoint.created = checkpoint.updated = checkpoint.batches = 0
+                checkpoint.finished_at = None
+                checkpoint.save()
+            if last_key is None:
+                last_key = checkpoint.last_key
+
+        if last_key is not None:
+            self.stdout.write(f'الاستئناف بعد per_id = {last_key} (نقطة الاستئناف: {checkpoint_name})')
+            remaining_qs = queryset.filter(per_id__gt=last_key)
         else:
-            records_to_process = total_count - offset
+            remaining_qs = queryset
 
-        self.stdout.write(f'السجلات المطلوب استيرادها: {records_to_process:,}')
+        records_to_process = remaining_qs.count()
+        if limit:
+            records_to_process = min(limit, records_to_process)
+
+        self.stdout.write(f'السجلات المطلوب معالجتها: {records_to_process:,}')
         self.stdout.write(f'حجم الدفعة: {batch_size:,}')
-        
+
         if dry_run:
             self.stdout.write(self.style.WARNING('وضع المعاينة - لن يتم حفظ أي بيانات'))
 
         # Process in batches
-        imported_count = 0
-        updated_count = 0
-        skipped_count = 0
-        error_count = 0
+        processed = created_count = updated_count = skipped_count = 0
         start_time = time.time()
-
-        current_offset = offset
         batch_num = 0
 
-        while imported_count + skipped_count + error_count < records_to_process:
+        while processed < records_to_process:
             batch_num += 1
             batch_start = time.time()
 
-            # Fetch batch
-            persons = queryset.order_by('per_id')[current_offset:current_offset + batch_size]
-            persons_list = list(persons)
-
-            if not persons_list:
+            # Keyset page: WHERE per_id > last_key ORDER BY per_id LIMIT n (index range scan, no OFFSET)
+            page = queryset
+            if last_key is not None:
+                page = page.filter(per_id__gt=last_key)
+            size = min(batch_size, records_to_process - processed)
+            persons = list(page.order_by('per_id').values_list(*PERSON_COLUMNS)[:size])
+            if not persons:
                 break
 
-            # Get existing voter numbers in this batch
-            voter_numbers = [p.per_id for p in persons_list]
-            existing_voters = set(
-                Voter.objects.filter(voter_number__in=voter_numbers)
+            voters = [
+                self._build_voter(person, centers_cache, vrc_cache, gov_cache)
+                for person in persons
+            ]
+            batch_last_key = persons[-1][0]
+
+            existing = set(
+                Voter.objects.filter(voter_number__in=[v.voter_number for v in voters])
                 .values_list('voter_number', flat=True)
             )
+            new_count = len(voters) - len(existing)
+            changed_count = len(existing) if update_existing else 0
+            skipped = 0 if update_existing else len(existing)
 
-            voters_to_create = []
-            voters_to_update = []
-
-            for person in persons_list:
-                voter_number = str(person.per_id)
-
-                # Build full name
-                name_parts = filter(None, [person.per_first, person.per_father, person.per_grand])
-                full_name = ' '.join(name_parts)
-
-                # Get related data from cache
-                center_name = centers_cache.get(person.pcno, '')
-                reg_center_name = vrc_cache.get(person.per_vrc_id, '')
-                gov_name = gov_cache.get(str(person.per_gov_id), '')
-
-                voter_data = {
-                    'voter_number': voter_number,
-                    'full_name': full_name,
-                    'date_of_birth': self._parse_date(person.per_dob),
-                    'voting_center_number': str(person.pcno) if person.pcno else '',
-                    'voting_center_name': center_name,
-                    'station_number': str(person.psno) if person.psno else '',
-                    'family_number': str(person.per_famno) if person.per_famno else '',
-                    'registration_center_number': str(person.per_vrc_id) if person.per_vrc_id else '',
-                    'registration_center_name': reg_center_name,
-                    'governorate': gov_name,
-                    'status': 'active',
-                }
-
-                if voter_number in existing_voters:
-                    if update_existing:
-                        voters_to_update.append((voter_number, voter_data))
-                    else:
-                        skipped_count += 1
-                else:
-                    voters_to_create.append(Voter(**voter_data))
-
-            # Bulk create new voters
-            if voters_to_create and not dry_run:
+            if not dry_run:
                 try:
                     with transaction.atomic():
-                        Voter.objects.bulk_create(
-                            voters_to_create,
-                            batch_size=1000,
-                            ignore_conflicts=True
-                        )
-                    imported_count += len(voters_to_create)
+                        if update_existing:
+                            Voter.objects.bulk_create(
+                                voters,
+                                batch_size=1000,
+                                update_conflicts=True,
+                                unique_fields=['voter_number'],
+                                update_fields=LEGACY_FIELDS + ['updated_at'],
+                            )
+                        else:
+                            Voter.objects.bulk_create(
+                                [v for v in voters if v.voter_number not in existing],
+                                batch_size=1000,
+                                ignore_conflicts=True,
+                            )
+                        # The checkpoint commits with the batch, so a crash never skips or repeats rows
+                        checkpoint.last_key = batch_last_key
+                        checkpoint.processed += len(persons)
+                        checkpoint.created += new_count
+                        checkpoint.updated += changed_count
+                        checkpoint.batches += 1
+                        checkpoint.save()
                 except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(f'خطأ في الدفعة {batch_num}: {e}')
-                    )
-                    error_count += len(voters_to_create)
-            elif dry_run:
-                imported_count += len(voters_to_create)
-
-            # Update existing voters
-            if voters_to_update and not dry_run:
-                for voter_number, data in voters_to_update:
-                    try:
-                        Voter.objects.filter(voter_number=voter_number).update(**data)
-                        updated_count += 1
-                    except Exception as e:
-                        self.stdout.write(
-                            self.style.ERROR(f'خطأ في تحديث {voter_number}: {e}')
-                        )
-                        error_count += 1
-            elif dry_run:
-                updated_count += len(voters_to_update)
-
-            current_offset += batch_size
+                    raise CommandError(
+                        f'خطأ في الدفعة {batch_num}: {e}\n'
+                        f'توقف الاستيراد. أعد التشغيل للاستئناف بعد per_id = {last_key}'
+                    ) from e
+
+            last_key = batch_last_key
+            processed += len(persons)
+            created_count += new_count
+            updated_count += changed_count
+            skipped_count += skipped
+
+            # Per-batch throughput
             batch_time = time.time() - batch_start
-            
-            # Progress report
-            total_processed = imported_count + updated_count + skipped_count + error_count
-            progress = (total_processed / records_to_process) * 100 if records_to_process > 0 else 0
-            
+            batch_rate = len(persons) / batch_time if batch_time > 0 else 0
             elapsed = time.time() - start_time
-            rate = total_processed / elapsed if elapsed > 0 else 0
-            remaining = (records_to_process - total_processed) / rate if rate > 0 else 0
+            rate = processed / elapsed if elapsed > 0 else 0
+            remaining = (records_to_process - processed) / rate if rate > 0 else 0
+            progress = processed / records_to_process * 100 if records_to_process else 100
 
             self.stdout.write(
                 f'الدفعة {batch_num}: '
-                f'{total_processed:,}/{records_to_process:,} ({progress:.1f}%) - '
-                f'جديد: {imported_count:,}, تحديث: {updated_count:,}, '
-                f'تخطي: {skipped_count:,}, أخطاء: {error_count} - '
-                f'{batch_time:.1f}ث - المتبقي: {remaining/60:.0f} دقيقة'
+                f'{processed:,}/{records_to_process:,} ({progress:.1f}%) - '
+                f'جديد: {new_count:,}, تحديث: {changed_count:,}, تخطي: {skipped:,} - '
+                f'{batch_time:.1f}ث ({batch_rate:,.0f} سجل/ث، المعدل: {rate:,.0f} سجل/ث) - '
+                f'آخر per_id: {last_key} - المتبقي: {remaining/60:.0f} دقيقة'
             )
 
-            # Check if we've reached the limit
-            if limit and total_processed >= limit:
-                break
+        # Mark the checkpoint finished only when the whole source range has been consumed
+        if checkpoint is not None and not queryset.filter(per_id__gt=last_key or 0).exists():
+            checkpoint.finished_at = timezone.now()
+            checkpoint.save(update_fields=['finished_at', 'updated_at'])
 
         # Final report
         total_time = time.time() - start_time
-        
+        rate = processed / total_time if total_time > 0 else 0
+
         self.stdout.write(self.style.NOTICE('=' * 60))
         self.stdout.write(self.style.SUCCESS('اكتمل الاستيراد!'))
-        self.stdout.write(f'الوقت الإجمالي: {total_time/60:.1f} دقيقة')
-        self.stdout.write(f'سجلات جديدة: {imported_count:,}')
+        self.stdout.write(f'الوقت الإجمالي: {total_time/60:.1f} دقيقة ({rate:,.0f} سجل/ث)')
+        self.stdout.write(f'سجلات جديدة: {created_count:,}')
         self.stdout.write(f'سجلات محدثة: {updated_count:,}')
         self.stdout.write(f'سجلات متخطاة: {skipped_count:,}')
-        self.stdout.write(f'أخطاء: {error_count}')
+        if last_key is not None:
+            self.stdout.write(f'آخر per_id: {last_key}')
         self.stdout.write(self.style.NOTICE('=' * 60))
 
+    def _build_voter(self, person, centers_cache, vrc_cache, gov_cache):
+        """Build an unsaved Voter from a PersonHD values row (PERSON_COLUMNS order)"""
+        per_id, first, father, grand, dob, pcno, psno, famno, vrc_id, gov_id = person
+
+        voter_data = {
+            'voter_number': str(per_id),
+            'full_name': ' '.join(filter(None, [first, father, grand])),
+            'date_of_birth': self._parse_date(dob),
+            'voting_center_number': str(pcno) if pcno else '',
+            'voting_center_name': centers_cache.get(pcno) or '',
+            'station_number': str(psno) if psno else '',
+            'family_number': str(famno) if famno else '',
+            'registration_center_number': str(vrc_id) if vrc_id else '',
+            'registration_center_name': vrc_cache.get(vrc_id) or '',
+            'governorate': gov_cache.get(str(gov_id)) or '',
+            'status': 'active',
+        }
+        voter_data['search_text'] = build_voter_search_text(voter_data)
+        return Voter(**voter_data)
+
     def _parse_date(self, date_str):
         """Parse date string from legacy database"""
         if not date_str:
             return None
-        
-        try:
-            # Try common formats
-            from datetime import datetime
-            for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d']:
-                try:
-                    return datetime.strptime(str(date_str), fmt).date()
-                except ValueError:
-                    continue
-        except:
-            pass
-        
+
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(str(date_str), fmt).date()
+            except ValueError:
+                continue
+
         return None
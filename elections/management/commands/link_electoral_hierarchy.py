@@ -1,109 +1,120 @@
+"""
+Links voters, stations, and centers into a proper hierarchy.
+
+Registration centers are created in bulk from polling centers and voter
+records, then voters are linked to their polling center, station and
+registration center with set-based UPDATEs over primary-key ranges
+(UPDATE ... FROM on PostgreSQL, correlated subqueries on SQLite), so
+re-linking after a center import does not load voters into Python.
+Only voters whose link is missing or different are written.
+
+Usage:
+    python manage.py link_electoral_hierarchy
+    python manage.py link_electoral_hierarchy --dry-run      # report what would change
+    python manage.py link_electoral_hierarchy --chunk-size 100000
+"""
+import time
+
 from django.core.management.base import BaseCommand
-from elections.models import Voter, PollingCenter, PollingStation, RegistrationCenter
 from django.db import transaction
-from django.db.models import Q
+
+from elections.hierarchy_linking import LINK_CHUNK_SIZE, link_voters
+from elections.models import Voter, PollingCenter, RegistrationCenter
+
 
 class Command(BaseCommand):
     help = 'Links voters, stations, and centers into a proper hierarchy'
 
     def add_arguments(self, parser):
-        parser.add_argument('--limit', type=int, default=0, help='Limit number of voters to process (0 for all)')
-        parser.add_argument('--batch-size', type=int, default=1000, help='Batch size for updates')
+        parser.add_argument('--chunk-size', type=int, default=LINK_CHUNK_SIZE,
+                            help='Voter primary keys per UPDATE range (default: %(default)s)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be created and linked without writing')
 
     def handle(self, *args, **options):
-        self.stdout.write("Starting electoral hierarchy linking...")
+        dry_run = options['dry_run']
+        start = time.time()
+        self.stdout.write("Starting electoral hierarchy linking..." + (" (dry run)" if dry_run else ""))
 
         # 1. Create RegistrationCenters from PollingCenters
         self.stdout.write("\n[1/3] Creating RegistrationCenters and linking PollingCenters...")
-        centers = PollingCenter.objects.all()
-        for pc in centers:
-            if pc.registration_center_number:
-                rc, created = RegistrationCenter.objects.get_or_create(
-                    center_number=pc.registration_center_number,
-                    defaults={'name': pc.registration_center_name or f"مركز تسجيل {pc.registration_center_number}"}
-                )
-                if pc.registration_center != rc:
-                    pc.registration_center = rc
-                    pc.save()
-                    if created:
-                        self.stdout.write(self.style.SUCCESS(f"Created RegistrationCenter: {rc.name}"))
-        
+        step_start = time.time()
+        centers = PollingCenter.objects.exclude(registration_center_number='').values_list(
+            'registration_center_number', 'registration_center_name'
+        )
+        created = self._create_registration_centers(centers, dry_run)
+        linked = 0
+        if not dry_run:
+            regs = dict(RegistrationCenter.objects.values_list('center_number', 'pk'))
+            to_link = []
+            for pc in PollingCenter.objects.exclude(registration_center_number='').only(
+                'pk', 'registration_center_number', 'registration_center_id'
+            ):
+                rc_id = regs.get(pc.registration_center_number)
+                if rc_id and pc.registration_center_id != rc_id:
+                    pc.registration_center_id = rc_id
+                    to_link.append(pc)
+            PollingCenter.objects.bulk_update(to_link, ['registration_center'], batch_size=1000)
+            linked = len(to_link)
+        self.stdout.write(
+            f"RegistrationCenters {'to create' if dry_run else 'created'}: {created}, "
+            f"PollingCenters linked: {linked} ({time.time() - step_start:.2f}s)"
+        )
+
         # 2. Add missing RegistrationCenters from Voters (for centers that don't have a PollingCenter yet)
         self.stdout.write("\n[2/3] Checking for RegistrationCenters in Voter records...")
-        voter_regs = Voter.objects.values('registration_center_number', 'registration_center_name').distinct()
-        for vr in voter_regs:
-            num = vr['registration_center_number']
-            if num:
-                rc, created = RegistrationCenter.objects.get_or_create(
-                    center_number=num,
-                    defaults={'name': vr['registration_center_name'] or f"مركز تسجيل {num}"}
-                )
-                if created:
-                    self.stdout.write(self.style.SUCCESS(f"Created RegistrationCenter from Voter: {rc.name}"))
+        step_start = time.time()
+        voter_regs = Voter.objects.exclude(registration_center_number='').values_list(
+            'registration_center_number', 'registration_center_name'
+        ).distinct()
+        created = self._create_registration_centers(voter_regs, dry_run)
+        self.stdout.write(
+            f"RegistrationCenters from voters {'to create' if dry_run else 'created'}: {created} "
+            f"({time.time() - step_start:.2f}s)"
+        )
 
         # 3. Link Voters to Centers and Stations
         self.stdout.write("\n[3/3] Linking Voters to PollingCenters and PollingStations...")
-        limit = options['limit']
-        batch_size = options['batch_size']
-        
-        # We only process voters who haven't been linked yet
-        voters_to_link = Voter.objects.filter(
-            Q(polling_center__isnull=True) | Q(polling_station__isnull=True) | Q(registration_center_fk__isnull=True)
-        )
-        
-        if limit > 0:
-            voters_to_link = voters_to_link[:limit]
-            
-        total = voters_to_link.count()
-        self.stdout.write(f"Voters needing linking: {total}")
-        
-        if total == 0:
-            self.stdout.write("All voters are already linked.")
-            return
-
-        processed = 0
-        
-        # Pre-fetch centers and stations to avoid N+1
-        all_centers = {c.center_number: c for c in PollingCenter.objects.all()}
-        # For stations, we use a composite key: (center_number, station_number)
-        all_stations = {}
-        for s in PollingStation.objects.select_related('center').all():
-            all_stations[(s.center.center_number, str(s.station_number))] = s
-        
-        all_regs = {r.center_number: r for r in RegistrationCenter.objects.all()}
-
-        count = 0
-        batch = []
-        
-        # Iterate in chunks manually for performance
-        voter_iter = voters_to_link.iterator(chunk_size=batch_size)
-        
-        for voter in voter_iter:
-            # Link Center
-            if voter.voting_center_number in all_centers:
-                voter.polling_center = all_centers[voter.voting_center_number]
-            
-            # Link Station
-            station_key = (voter.voting_center_number, str(voter.station_number))
-            if station_key in all_stations:
-                voter.polling_station = all_stations[station_key]
-            
-            # Link Reg Center
-            if voter.registration_center_number in all_regs:
-                voter.registration_center_fk = all_regs[voter.registration_center_number]
-                
-            batch.append(voter)
-            count += 1
-            
-            if len(batch) >= batch_size:
-                Voter.objects.bulk_update(batch, ['polling_center', 'polling_station', 'registration_center_fk'])
-                processed += len(batch)
-                self.stdout.write(f"Processed {processed}/{total} voters...")
-                batch = []
-        
-        if batch:
-            Voter.objects.bulk_update(batch, ['polling_center', 'polling_station', 'registration_center_fk'])
-            processed += len(batch)
-            self.stdout.write(f"Processed {processed}/{total} voters...")
-
-        self.stdout.write(self.style.SUCCESS(f"\nSuccessfully linked {processed} records."))
+
+        def report(range_start, range_end, stats):
+            changed = sum(stats[name]['changed'] for name in ('polling_center', 'polling_station',
+                                                               'registration_center_fk'))
+            self.stdout.write(f"Chunk {stats['chunks']} (id {range_start}-{range_end - 1}): "
+                              f"{changed} link changes so far")
+
+        stats = link_voters(options['chunk_size'], dry_run=dry_run, on_chunk=report)
+
+        self.stdout.write("")
+        for name, label in (('polling_center', 'PollingCenter'), ('polling_station', 'PollingStation'),
+                            ('registration_center_fk', 'RegistrationCenter')):
+            if dry_run:
+                self.stdout.write(
+                    f"{label}: {stats[name]['changed']} voters would change "
+                    f"({stats[name]['newly_linked']} currently unlinked, "
+                    f"{stats[name]['changed'] - stats[name]['newly_linked']} relinked)"
+                )
+            else:
+                self.stdout.write(f"{label}: {stats[name]['changed']} voters linked")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{'Dry run finished' if dry_run else 'Linking finished'}: {stats['chunks']} chunks, "
+            f"voters in {stats['seconds']:.2f}s, total {time.time() - start:.2f}s"
+        ))
+
+    def _create_registration_centers(self, rows, dry_run):
+        """Create missing RegistrationCenters from (number, name) pairs; returns how many are new"""
+        existing = set(RegistrationCenter.objects.values_list('center_number', flat=True))
+        missing = {}
+        for number, name in rows:
+            if number and number not in existing and number not in missing:
+                missing[number] = name or f"مركز تسجيل {number}"
+
+        if missing and not dry_run:
+            with transaction.atomic():
+                RegistrationCenter.objects.bulk_create(
+                    [RegistrationCenter(center_number=number, name=name) for number, name in missing.items()],
+                    batch_size=1000, ignore_conflicts=True,
+                )
+            for name in list(missing.values())[:20]:
+                self.stdout.write(self.style.SUCCESS(f"Created RegistrationCenter: {name}"))
+        return len(missing)
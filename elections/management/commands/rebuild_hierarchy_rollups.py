@@ -0,0 +1,22 @@
+"""
+Rebuild the materialized hierarchy counts (HierarchyRollup).
+
+The table is maintained incrementally by signals; run this after bulk imports,
+raw SQL changes or queryset.update() calls that bypass model signals.
+
+Usage:
+    python manage.py rebuild_hierarchy_rollups
+"""
+import time
+from django.core.management.base import BaseCommand
+from elections.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-candidate / anchor / introducer / room rollup counts'
+
+    def handle(self, *args, **options):
+        start = time.time()
+        self.stdout.write('Rebuilding hierarchy rollups...')
+        rows = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Done: {rows:,} rollup rows in {time.time() - start:.1f}s'))
@@ -0,0 +1,44 @@
+"""
+Rebuild the normalized voter search column and its search index.
+
+Usage:
+    # Fill search_text only for voters imported without it (bulk imports)
+    python manage.py rebuild_voter_search --only-missing
+
+    # Recompute everything (e.g. after changing the normalization rules)
+    python manage.py rebuild_voter_search
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from elections.models import Voter
+from elections.search import install_search_backend, refresh_voter_search_text
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the normalized voter search column and FTS/trigram index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Voters per batch (default: 5000)')
+        parser.add_argument('--only-missing', action='store_true',
+                            help='Only fill voters with an empty search column')
+
+    def handle(self, *args, **options):
+        start = time.time()
+
+        self.stdout.write('Updating search_text column...')
+        updated = refresh_voter_search_text(
+            Voter.objects.all(),
+            batch_size=options['batch_size'],
+            only_missing=options['only_missing'],
+        )
+        self.stdout.write(f'Updated {updated:,} voters')
+
+        # Re-create triggers (table rebuilds on SQLite drop them) and resync the index
+        self.stdout.write(f'Rebuilding {connection.vendor} search index...')
+        if not install_search_backend(connection, rebuild=True):
+            self.stdout.write(self.style.WARNING(
+                'This SQLite build has no FTS5 trigram support; search falls back to LIKE on search_text'
+            ))
+
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.time() - start:.1f}s'))
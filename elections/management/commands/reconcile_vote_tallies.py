@@ -0,0 +1,52 @@
+"""
+Reconcile the materialized vote totals (VoteTally) with the VoteCount table.
+
+The tallies are maintained transactionally by signals and by the bulk entry
+paths; run this after raw SQL changes, queryset.update() calls or restores
+that bypass them. Mismatched rows are reported and corrected.
+
+Usage:
+    python manage.py reconcile_vote_tallies
+    python manage.py reconcile_vote_tallies --check     # report only, exit 1 on mismatch
+    python manage.py reconcile_vote_tallies --rebuild   # drop and rebuild every row
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from elections.tallies import rebuild_tallies, reconcile_tallies
+
+
+class Command(BaseCommand):
+    help = 'Compare per-candidate / party / center / station vote tallies with VoteCount and fix drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report mismatches (exit with an error if any are found)')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Rebuild the whole tally table instead of fixing individual rows')
+
+    def handle(self, *args, **options):
+        start = time.time()
+
+        if options['rebuild']:
+            self.stdout.write('Rebuilding vote tallies...')
+            rows = rebuild_tallies()
+            self.stdout.write(self.style.SUCCESS(f'Done: {rows:,} tally rows in {time.time() - start:.1f}s'))
+            return
+
+        mismatches = reconcile_tallies(fix=not options['check'])
+        for scope, object_id, stored, expected in sorted(mismatches, key=lambda m: (m[0], m[1]))[:50]:
+            diff = ', '.join(
+                f'{field} {stored[field]} -> {expected[field]}'
+                for field in expected if stored[field] != expected[field]
+            )
+            self.stdout.write(self.style.WARNING(f'{scope}:{object_id}: {diff}'))
+        if len(mismatches) > 50:
+            self.stdout.write(f'... and {len(mismatches) - 50} more')
+
+        elapsed = time.time() - start
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(f'Vote tallies are consistent ({elapsed:.1f}s)'))
+        elif options['check']:
+            raise CommandError(f'{len(mismatches)} tally row(s) out of sync')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(mismatches)} tally row(s) in {elapsed:.1f}s'))
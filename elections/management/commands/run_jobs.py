@@ -0,0 +1,61 @@
+"""
+Background job worker for the database-backed queue (BackgroundJob).
+
+Claims queued jobs one at a time, runs them with a heartbeat thread, and
+requeues (or fails) jobs whose worker stopped heartbeating. Run one or more
+workers next to the web process; jobs survive restarts of either.
+
+Usage:
+    python manage.py run_jobs
+    python manage.py run_jobs --once          # process the queue and exit
+    python manage.py run_jobs --sleep 5 --worker-id import-1
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from elections.jobs import STALE_AFTER, claim_next, default_worker_id, requeue_stale, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs (imports, large exports) from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when the queue is empty instead of polling')
+        parser.add_argument('--sleep', type=float, default=2.0,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--worker-id', default=None,
+                            help='Worker name stored on claimed jobs (default: host:pid)')
+        parser.add_argument('--stale-after', type=int, default=STALE_AFTER,
+                            help='Seconds without heartbeat before a running job is considered dead')
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or default_worker_id()
+        self.stdout.write(f'Job worker {worker_id} started')
+
+        try:
+            while True:
+                close_old_connections()
+
+                recovered = requeue_stale(options['stale_after'])
+                if any(recovered.values()):
+                    self.stdout.write(self.style.WARNING(
+                        f"Stale jobs: {recovered['requeued']} requeued, "
+                        f"{recovered['failed']} failed, {recovered['cancelled']} cancelled"
+                    ))
+
+                job = claim_next(worker_id)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+
+                self.stdout.write(f'Running job #{job.pk} ({job.kind}) attempt {job.attempts}/{job.max_attempts}')
+                start = time.time()
+                run_job(job)
+                job.refresh_from_db()
+                style = self.style.SUCCESS if job.status == job.STATUS_SUCCEEDED else self.style.WARNING
+                self.stdout.write(style(f'Job #{job.pk}: {job.get_status_display()} in {time.time() - start:.1f}s'))
+        except KeyboardInterrupt:
+            self.stdout.write('Job worker stopped')
@@ -0,0 +1,128 @@
+# Normalized voter search column + backend search index (FTS5 on SQLite, pg_trgm on PostgreSQL)
+
+import re
+
+from django.db import DatabaseError, migrations, models, transaction
+
+# تطبيع نص البحث كما كان وقت هذا الترحيل: أرقام لاتينية، توحيد أشكال الحروف، حذف التشكيل
+TRANSLATION = str.maketrans({
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+    '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4',
+    '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    'ئ': 'ي', 'ى': 'ي', 'ی': 'ي',
+    'ة': 'ه',
+    'ک': 'ك',
+})
+DIACRITICS_RE = re.compile('[\u0640\u064B-\u065F\u0670\u06D6-\u06ED]')
+SPACES_RE = re.compile(r'\s+')
+
+FILL_BATCH_SIZE = 5000
+
+FTS_TABLE = 'elections_voter_fts'
+
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        search_text, content='elections_voter', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON elections_voter BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON elections_voter BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_text ON elections_voter BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRES_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS voter_search_trgm_idx ON elections_voter "
+    "USING gin (search_text gin_trgm_ops)",
+]
+
+POSTGRES_DROP_SQL = [
+    "DROP INDEX IF EXISTS voter_search_trgm_idx",
+]
+
+# مقسّم tokenize='trigram' في FTS5 متاح منذ SQLite 3.34
+MIN_SQLITE_TRIGRAM = (3, 34, 0)
+
+
+def search_text(*parts):
+    text = ' '.join(str(part) for part in parts if part)
+    text = DIACRITICS_RE.sub('', text).translate(TRANSLATION).lower()
+    return SPACES_RE.sub(' ', text).strip()
+
+
+def fill_search_text(apps, schema_editor):
+    """ملء عمود البحث للناخبين الموجودين على دفعات"""
+    Voter = apps.get_model('elections', 'Voter')
+    last_pk = 0
+    while True:
+        rows = list(
+            Voter.objects.filter(pk__gt=last_pk).order_by('pk')
+            .only('pk', 'voter_number', 'full_name', 'phone')[:FILL_BATCH_SIZE]
+        )
+        if not rows:
+            break
+        for voter in rows:
+            voter.search_text = search_text(voter.voter_number, voter.full_name, voter.phone)
+        Voter.objects.bulk_update(rows, ['search_text'], batch_size=1000)
+        last_pk = rows[-1].pk
+
+
+def install_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for sql in POSTGRES_SQL:
+                cursor.execute(sql)
+        elif connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= MIN_SQLITE_TRIGRAM:
+            try:
+                with transaction.atomic(using=connection.alias):
+                    for sql in SQLITE_FTS_SQL:
+                        cursor.execute(sql)
+            except DatabaseError:
+                # SQLite مبني دون FTS5: البحث يبقى على search_text بـ LIKE
+                pass
+
+
+def remove_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    statements = {
+        'sqlite': SQLITE_DROP_SQL,
+        'postgresql': POSTGRES_DROP_SQL,
+    }.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0033_add_party_candidate_to_anchor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voter',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='نص البحث المطبّع'),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(install_search_index, remove_search_index),
+    ]
@@ -0,0 +1,25 @@
+# Per-introducer voter code counter (replaces count() + 1 code generation)
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0034_voter_search_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntroducerVoterCounter',
+            fields=[
+                ('introducer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='voter_counter', serialize=False, to='elections.introducer', verbose_name='المعرف')),
+                ('last_value', models.PositiveIntegerField(default=0, verbose_name='آخر رقم مستخدم')),
+            ],
+            options={
+                'verbose_name': 'عداد أكواد الناخبين',
+                'verbose_name_plural': 'عدادات أكواد الناخبين',
+            },
+        ),
+    ]
@@ -0,0 +1,113 @@
+# Materialized hierarchy counts (candidate / anchor / introducer / room), filled from existing data
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+
+COUNT_FIELDS = ('voters', 'supporters', 'neutral', 'opponents', 'unknown',
+                'introducers', 'anchors', 'directors', 'agents')
+
+CLASSIFICATION_FIELDS = {
+    'supporter': 'supporters',
+    'neutral': 'neutral',
+    'opponent': 'opponents',
+    'unknown': 'unknown',
+}
+
+
+def build_rollups(apps, schema_editor):
+    """الإحصائيات الأولية باستعلامات تجميع (GROUP BY) على كل جدول"""
+    Voter = apps.get_model('elections', 'Voter')
+    Introducer = apps.get_model('elections', 'Introducer')
+    Anchor = apps.get_model('elections', 'Anchor')
+    CenterDirector = apps.get_model('elections', 'CenterDirector')
+    PoliticalEntityAgent = apps.get_model('elections', 'PoliticalEntityAgent')
+    HierarchyRollup = apps.get_model('elections', 'HierarchyRollup')
+
+    totals = defaultdict(lambda: dict.fromkeys(COUNT_FIELDS, 0))
+    anchors = {a['id']: a for a in Anchor.objects.values('id', 'candidate_id', 'party_candidate_id', 'sub_room_id')}
+    introducers = {i['id']: i for i in Introducer.objects.values('id', 'anchor_id', 'sub_room_id')}
+
+    def introducer_scopes(introducer_id):
+        introducer = introducers.get(introducer_id)
+        if not introducer:
+            return []
+        keys = [('introducer', introducer_id)]
+        if introducer['sub_room_id']:
+            keys.append(('room', introducer['sub_room_id']))
+        anchor = anchors.get(introducer['anchor_id'])
+        if anchor:
+            keys.append(('anchor', anchor['id']))
+            if anchor['candidate_id']:
+                keys.append(('candidate', anchor['candidate_id']))
+            if anchor['party_candidate_id']:
+                keys.append(('party_candidate', anchor['party_candidate_id']))
+        return keys
+
+    voter_rows = (
+        Voter.objects.filter(introducer__isnull=False)
+        .values('introducer_id', 'classification').annotate(n=Count('id')).order_by()
+    )
+    for row in voter_rows:
+        field = CLASSIFICATION_FIELDS.get(row['classification'], 'unknown')
+        for key in introducer_scopes(row['introducer_id']):
+            totals[key]['voters'] += row['n']
+            totals[key][field] += row['n']
+
+    for introducer_id in introducers:
+        for key in introducer_scopes(introducer_id):
+            if key[0] != 'introducer':
+                totals[key]['introducers'] += 1
+
+    for anchor in anchors.values():
+        if anchor['candidate_id']:
+            totals[('candidate', anchor['candidate_id'])]['anchors'] += 1
+        if anchor['party_candidate_id']:
+            totals[('party_candidate', anchor['party_candidate_id'])]['anchors'] += 1
+        if anchor['sub_room_id']:
+            totals[('room', anchor['sub_room_id'])]['anchors'] += 1
+
+    for model, field in ((CenterDirector, 'directors'), (PoliticalEntityAgent, 'agents')):
+        rows = model.objects.filter(sub_room__isnull=False).values('sub_room_id').annotate(n=Count('id')).order_by()
+        for row in rows:
+            totals[('room', row['sub_room_id'])][field] += row['n']
+
+    HierarchyRollup.objects.bulk_create(
+        [HierarchyRollup(scope=scope, object_id=object_id, **values) for (scope, object_id), values in totals.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0035_introducervotercounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HierarchyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('candidate', 'مرشح'), ('party_candidate', 'مرشح (جديد)'), ('anchor', 'مرتكز'), ('introducer', 'معرف'), ('room', 'غرفة عمليات')], max_length=20, verbose_name='النوع')),
+                ('object_id', models.PositiveIntegerField(verbose_name='المعرّف')),
+                ('voters', models.PositiveIntegerField(default=0, verbose_name='الناخبين')),
+                ('supporters', models.PositiveIntegerField(default=0, verbose_name='مؤيد')),
+                ('neutral', models.PositiveIntegerField(default=0, verbose_name='محايد')),
+                ('opponents', models.PositiveIntegerField(default=0, verbose_name='معارض')),
+                ('unknown', models.PositiveIntegerField(default=0, verbose_name='غير محدد')),
+                ('introducers', models.PositiveIntegerField(default=0, verbose_name='المعرفين')),
+                ('anchors', models.PositiveIntegerField(default=0, verbose_name='المرتكزات')),
+                ('directors', models.PositiveIntegerField(default=0, verbose_name='مدراء المراكز')),
+                ('agents', models.PositiveIntegerField(default=0, verbose_name='وكلاء الكيان')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'إحصائية مجمّعة',
+                'verbose_name_plural': 'الإحصائيات المجمّعة',
+                'unique_together': {('scope', 'object_id')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Database-backed background job queue (imports / large exports)
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0036_hierarchyrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(db_index=True, max_length=50, verbose_name='نوع المهمة')),
+                ('label', models.CharField(blank=True, max_length=200, verbose_name='الوصف')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='المعاملات')),
+                ('status', models.CharField(choices=[('queued', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('succeeded', 'مكتملة'), ('failed', 'فشلت'), ('cancelled', 'ملغاة')], default='queued', max_length=20, verbose_name='الحالة')),
+                ('progress_current', models.PositiveIntegerField(default=0, verbose_name='المنجز')),
+                ('progress_total', models.PositiveIntegerField(default=0, verbose_name='الإجمالي')),
+                ('message', models.CharField(blank=True, max_length=500, verbose_name='آخر رسالة')),
+                ('log', models.TextField(blank=True, verbose_name='السجل')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='النتيجة')),
+                ('error', models.TextField(blank=True, verbose_name='الخطأ')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='عدد المحاولات')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=1, verbose_name='الحد الأقصى للمحاولات')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='التنفيذ بعد')),
+                ('cancel_requested', models.BooleanField(default=False, verbose_name='طُلب الإلغاء')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='العامل')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='آخر نبضة')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='بدء التنفيذ')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='انتهاء التنفيذ')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='background_jobs', to=settings.AUTH_USER_MODEL, verbose_name='أنشأها')),
+            ],
+            options={
+                'verbose_name': 'مهمة خلفية',
+                'verbose_name_plural': 'المهام الخلفية',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='elections_b_status_440241_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Resumable checkpoints for long-running imports (legacy PersonHD migration)
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0037_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='اسم عملية الاستيراد')),
+                ('last_key', models.BigIntegerField(blank=True, null=True, verbose_name='آخر مفتاح مُثبت')),
+                ('processed', models.BigIntegerField(default=0, verbose_name='السجلات المعالجة')),
+                ('created', models.BigIntegerField(default=0, verbose_name='السجلات الجديدة')),
+                ('updated', models.BigIntegerField(default=0, verbose_name='السجلات المحدثة')),
+                ('batches', models.IntegerField(default=0, verbose_name='عدد الدفعات')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='بدء الاستيراد')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر تحديث')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='اكتمال الاستيراد')),
+            ],
+            options={
+                'verbose_name': 'نقطة استئناف استيراد',
+                'verbose_name_plural': 'نقاط استئناف الاستيراد',
+            },
+        ),
+    ]
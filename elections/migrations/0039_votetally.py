@@ -0,0 +1,70 @@
+# Incrementally maintained vote totals (candidate / party / center / station / overall), filled from existing counts
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_tallies(apps, schema_editor):
+    """المجاميع الأولية من VoteCount باستعلام GROUP BY لكل مستوى"""
+    VoteCount = apps.get_model('elections', 'VoteCount')
+    VoteTally = apps.get_model('elections', 'VoteTally')
+    vote_type_fields = {
+        'general': ('general_votes', 'general_entries'),
+        'special': ('special_votes', 'special_entries'),
+    }
+    groupings = [
+        ('candidate', 'candidate_id'),
+        ('party', 'candidate__party_id'),
+        ('station', 'station_id'),
+        ('center', 'station__center_id'),
+        ('total', None),
+    ]
+    totals = {}
+    for scope, key in groupings:
+        group_by = [key, 'vote_type'] if key else ['vote_type']
+        rows = VoteCount.objects.values(*group_by).annotate(
+            votes=Sum('vote_count'), entries=Count('id')
+        ).order_by()
+        for row in rows:
+            fields = vote_type_fields.get(row['vote_type'])
+            object_id = row[key] if key else 0
+            if fields is None or object_id is None:
+                continue
+            values = totals.setdefault((scope, object_id), {
+                'general_votes': 0, 'special_votes': 0, 'general_entries': 0, 'special_entries': 0,
+            })
+            values[fields[0]] += row['votes'] or 0
+            values[fields[1]] += row['entries']
+    VoteTally.objects.bulk_create(
+        [VoteTally(scope=scope, object_id=object_id, **values) for (scope, object_id), values in totals.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0038_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('candidate', 'مرشح'), ('party', 'حزب'), ('center', 'مركز اقتراع'), ('station', 'محطة'), ('total', 'الإجمالي')], max_length=20, verbose_name='النوع')),
+                ('object_id', models.PositiveIntegerField(verbose_name='المعرّف')),
+                ('general_votes', models.BigIntegerField(default=0, verbose_name='أصوات التصويت العام')),
+                ('special_votes', models.BigIntegerField(default=0, verbose_name='أصوات التصويت الخاص')),
+                ('general_entries', models.IntegerField(default=0, verbose_name='سجلات التصويت العام')),
+                ('special_entries', models.IntegerField(default=0, verbose_name='سجلات التصويت الخاص')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'مجموع أصوات',
+                'verbose_name_plural': 'مجاميع الأصوات',
+                'unique_together': {('scope', 'object_id')},
+            },
+        ),
+        migrations.RunPython(build_tallies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Change log of vote tallies, streamed to live results screens
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0039_votetally'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteTallyEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('changes', models.JSONField(default=list, verbose_name='التغييرات')),
+                ('reset', models.BooleanField(default=False, verbose_name='إعادة تحميل كاملة')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'تغيير مجاميع الأصوات',
+                'verbose_name_plural': 'تغييرات مجاميع الأصوات',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Retry-safe vote submission: idempotency keys and VoteCount row versions
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0040_votetallyevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='votecount',
+            name='version',
+            field=models.PositiveIntegerField(default=1, verbose_name='رقم النسخة'),
+        ),
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=100, verbose_name='الواجهة')),
+                ('key', models.CharField(max_length=100, verbose_name='مفتاح الطلب')),
+                ('request_hash', models.CharField(max_length=64, verbose_name='بصمة الطلب')),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='رمز الرد')),
+                ('response', models.JSONField(blank=True, null=True, verbose_name='الرد المحفوظ')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='ينتهي في')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'مفتاح طلب',
+                'verbose_name_plural': 'مفاتيح الطلبات',
+                'unique_together': {('endpoint', 'user', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Findings table for the statistical anomaly scan over station results
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0041_votecount_version_idempotencykey'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StationAnomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('check_type', models.CharField(choices=[('turnout', 'مشاركة تتجاوز المسجلين'), ('totals', 'عدم تطابق المجاميع'), ('outlier', 'قيمة شاذة مقارنة بمحطات المركز'), ('last_digit', 'توزيع غير طبيعي للرقم الأخير')], db_index=True, max_length=20, verbose_name='الفحص')),
+                ('severity', models.CharField(choices=[('warning', 'تحذير'), ('critical', 'حرج')], max_length=10, verbose_name='الخطورة')),
+                ('score', models.FloatField(default=0, verbose_name='الدرجة')),
+                ('message', models.CharField(max_length=255, verbose_name='الوصف')),
+                ('details', models.JSONField(blank=True, default=dict, verbose_name='التفاصيل')),
+                ('status', models.CharField(choices=[('open', 'بانتظار المراجعة'), ('confirmed', 'مؤكدة'), ('dismissed', 'مستبعدة')], db_index=True, default='open', max_length=10, verbose_name='حالة المراجعة')),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True, verbose_name='تاريخ المراجعة')),
+                ('review_notes', models.TextField(blank=True, verbose_name='ملاحظات المراجعة')),
+                ('detected_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الاكتشاف')),
+                ('last_seen_at', models.DateTimeField(verbose_name='آخر فحص ظهرت فيه')),
+                ('candidate', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='elections.partycandidate', verbose_name='المرشح')),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviewed_anomalies', to=settings.AUTH_USER_MODEL, verbose_name='راجعها')),
+                ('station', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='elections.pollingstation', verbose_name='المحطة')),
+            ],
+            options={
+                'verbose_name': 'ملاحظة فحص النتائج',
+                'verbose_name_plural': 'ملاحظات فحص النتائج',
+                'ordering': ['-score'],
+            },
+        ),
+    ]
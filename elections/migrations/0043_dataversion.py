@@ -0,0 +1,26 @@
+# Version counters for per-process in-memory directories
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0042_stationanomaly'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='الاسم')),
+                ('version', models.BigIntegerField(default=0, verbose_name='النسخة')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر تحديث')),
+            ],
+            options={
+                'verbose_name': 'نسخة بيانات',
+                'verbose_name_plural': 'نسخ البيانات',
+            },
+        ),
+    ]
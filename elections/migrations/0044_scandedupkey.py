@@ -0,0 +1,61 @@
+# Station scan dedup keys (unique per center/station/vote type) backfilled from validated scans
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# الأرقام العربية والفارسية -> اللاتينية
+DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '01234567890123456789')
+
+
+def scan_key(center_number, station_number, vote_type):
+    """المفتاح المطبّع: أرقام لاتينية، ورقم المحطة دون أصفار بادئة"""
+    center = ('' if center_number is None else str(center_number)).translate(DIGITS).strip()
+    station = ('' if station_number is None else str(station_number)).translate(DIGITS).strip()
+    if station.isdigit():
+        station = str(int(station))
+    return center, station, vote_type or 'general'
+
+
+def backfill_dedup_keys(apps, schema_editor):
+    """أقدم مسح تم التحقق منه أو معالجته لكل محطة يحجز مفتاحها"""
+    BarcodeScanRecord = apps.get_model('elections', 'BarcodeScanRecord')
+    ScanDedupKey = apps.get_model('elections', 'ScanDedupKey')
+
+    scans = BarcodeScanRecord.objects.filter(status__in=['validated', 'processed']).values_list(
+        'pk', 'polling_center__center_number', 'center_number', 'station_number', 'vote_type'
+    ).order_by('scanned_at', 'pk')
+    claimed = {}
+    for pk, linked_center, center_number, station_number, vote_type in scans.iterator():
+        claimed.setdefault(scan_key(linked_center or center_number, station_number, vote_type), pk)
+    ScanDedupKey.objects.bulk_create(
+        [ScanDedupKey(center_number=key[0], station_number=key[1], vote_type=key[2], scan_id=pk)
+         for key, pk in claimed.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0043_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanDedupKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('center_number', models.CharField(max_length=50, verbose_name='رقم المركز')),
+                ('station_number', models.CharField(max_length=50, verbose_name='رقم المحطة')),
+                ('vote_type', models.CharField(max_length=20, verbose_name='نوع التصويت')),
+                ('claimed_at', models.DateTimeField(auto_now_add=True, verbose_name='وقت الحجز')),
+                ('scan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dedup_key', to='elections.barcodescanrecord', verbose_name='المسح')),
+            ],
+            options={
+                'verbose_name': 'مفتاح مسح محطة',
+                'verbose_name_plural': 'مفاتيح مسح المحطات',
+                'constraints': [models.UniqueConstraint(fields=('center_number', 'station_number', 'vote_type'), name='unique_scan_dedup_key')],
+            },
+        ),
+        migrations.RunPython(backfill_dedup_keys, migrations.RunPython.noop),
+    ]
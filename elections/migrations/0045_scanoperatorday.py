@@ -0,0 +1,69 @@
+# Per-operator daily barcode scan counters backfilled from session counters and processed scans
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+COUNTERS = ('total_scans', 'successful_scans', 'failed_scans', 'duplicate_scans')
+
+
+def backfill_operator_days(apps, schema_editor):
+    """عدادات الجلسات تُجمع بيوم بدايتها، والمسحات المعالجة بيوم معالجتها"""
+    BarcodeScanSession = apps.get_model('elections', 'BarcodeScanSession')
+    BarcodeScanRecord = apps.get_model('elections', 'BarcodeScanRecord')
+    ScanOperatorDay = apps.get_model('elections', 'ScanOperatorDay')
+
+    days = {}
+    sessions = BarcodeScanSession.objects.filter(operator__isnull=False).annotate(
+        day=TruncDate('started_at')
+    ).values('operator_id', 'day').annotate(sessions=Count('id'), **{field: Sum(field) for field in COUNTERS})
+    for row in sessions:
+        day = days.setdefault((row['operator_id'], row['day']), {})
+        day.update({field: row[field] or 0 for field in ('sessions',) + COUNTERS})
+
+    processed = BarcodeScanRecord.objects.filter(
+        status='processed', operator__isnull=False, processed_at__isnull=False
+    ).annotate(day=TruncDate('processed_at')).values('operator_id', 'day').annotate(processed=Count('id'))
+    for row in processed:
+        days.setdefault((row['operator_id'], row['day']), {})['processed_scans'] = row['processed']
+
+    ScanOperatorDay.objects.bulk_create(
+        [ScanOperatorDay(operator_id=operator_id, date=date, **counters)
+         for (operator_id, date), counters in days.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0044_scandedupkey'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanOperatorDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='اليوم')),
+                ('sessions', models.IntegerField(default=0, verbose_name='عدد الجلسات')),
+                ('total_scans', models.IntegerField(default=0, verbose_name='عدد المسحات')),
+                ('successful_scans', models.IntegerField(default=0, verbose_name='مسحات ناجحة')),
+                ('failed_scans', models.IntegerField(default=0, verbose_name='مسحات فاشلة')),
+                ('duplicate_scans', models.IntegerField(default=0, verbose_name='مسحات مكررة')),
+                ('processed_scans', models.IntegerField(default=0, verbose_name='مسحات تمت معالجتها')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر تحديث')),
+                ('operator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scan_days', to=settings.AUTH_USER_MODEL, verbose_name='المُشغِّل')),
+            ],
+            options={
+                'verbose_name': 'إحصائية مسح يومية',
+                'verbose_name_plural': 'إحصائيات المسح اليومية',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('operator', 'date'), name='unique_scan_operator_day')],
+            },
+        ),
+        migrations.RunPython(backfill_operator_days, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.db.models.signals import post_save
@@ -233,14 +234,25 @@ class Voter(models.Model):
                                      verbose_name="التصنيف")
     notes = models.TextField(blank=True, verbose_name="ملاحظات")
     
+    # Normalized search column (maintained on save, indexed by FTS5 / pg_trgm)
+    search_text = models.TextField(blank=True, default='', editable=False,
+                                   verbose_name="نص البحث المطبّع")
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
+        from .search import VOTER_SEARCH_FIELDS, build_voter_search_text
+
         # Generate voter code if assigned to introducer
         if self.introducer and not self.voter_code:
-            count = Voter.objects.filter(introducer=self.introducer).count() + 1
-            self.voter_code = f"{self.introducer.introducer_code}-VOT-{count:03d}"
+            self.voter_code = IntroducerVoterCounter.allocate(self.introducer)[0]
+
+        # Keep the normalized search column in sync
+        self.search_text = build_voter_search_text(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(VOTER_SEARCH_FIELDS):
+            kwargs['update_fields'] = set(update_fields) | {'search_text'}
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -301,13 +313,13 @@ class Candidate(models.Model):
         super().save(*args, **kwargs)
 
     def get_anchors_count(self):
-        return self.anchors.count()
+        return HierarchyRollup.for_instance(self, HierarchyRollup.SCOPE_CANDIDATE).anchors
 
     def get_introducers_count(self):
-        return Introducer.objects.filter(anchor__candidate=self).count()
+        return HierarchyRollup.for_instance(self, HierarchyRollup.SCOPE_CANDIDATE).introducers
 
     def get_voters_count(self):
-        return Voter.objects.filter(introducer__anchor__candidate=self).count()
+        return HierarchyRollup.for_instance(self, HierarchyRollup.SCOPE_CANDIDATE).voters
 
     def get_monitors_count(self):
         return self.monitors.count()
@@ -381,10 +393,10 @@ class Anchor(models.Model):
         super().save(*args, **kwargs)
 
     def get_introducers_count(self):
-        return self.introducers.count()
+        return HierarchyRollup.for_instance(self, HierarchyRollup.SCOPE_ANCHOR).introducers
 
     def get_voters_count(self):
-        return Voter.objects.filter(introducer__anchor=self).count()
+        return HierarchyRollup.for_instance(self, HierarchyRollup.SCOPE_ANCHOR).voters
 
     def __str__(self):
         return f"{self.full_name} ({self.anchor_code})"
@@ -448,7 +460,7 @@ class Introducer(models.Model):
         super().save(*args, **kwargs)
 
     def get_voters_count(self):
-        return self.voters.count()
+        return HierarchyRollup.for_instance(self, HierarchyRollup.SCOPE_INTRODUCER).voters
 
     def __str__(self):
         return f"{self.full_name} ({self.introducer_code})"
@@ -459,6 +471,53 @@ class Introducer(models.Model):
         ordering = ['-created_at']
 
 
+class IntroducerVoterCounter(models.Model):
+    """عداد أكواد الناخبين لكل معرف (يُحجز بالدفعات بشكل ذري بدل count() + 1)"""
+    introducer = models.OneToOneField(Introducer, on_delete=models.CASCADE, primary_key=True,
+                                      related_name='voter_counter', verbose_name="المعرف")
+    last_value = models.PositiveIntegerField(default=0, verbose_name="آخر رقم مستخدم")
+
+    @staticmethod
+    def format_code(introducer, number):
+        return f"{introducer.introducer_code}-VOT-{number:03d}"
+
+    @classmethod
+    def _seed_value(cls, introducer):
+        """أعلى رقم مستخدم حالياً في أكواد ناخبي المعرف (عند إنشاء العداد لأول مرة)"""
+        prefix = f"{introducer.introducer_code}-VOT-"
+        highest = 0
+        codes = Voter.objects.filter(voter_code__startswith=prefix).values_list('voter_code', flat=True)
+        for code in codes:
+            suffix = code[len(prefix):]
+            if suffix.isdigit():
+                highest = max(highest, int(suffix))
+        return highest
+
+    @classmethod
+    def allocate(cls, introducer, count=1):
+        """حجز count كود متتالي للمعرف باستعلام UPDATE واحد، وإرجاع قائمة الأكواد"""
+        if count <= 0:
+            return []
+        with transaction.atomic():
+            if not cls.objects.filter(pk=introducer.pk).exists():
+                cls.objects.get_or_create(
+                    introducer=introducer,
+                    defaults={'last_value': cls._seed_value(introducer)},
+                )
+            # UPDATE يقفل صف العداد حتى نهاية المعاملة، فلا تتداخل الحجوزات المتزامنة
+            cls.objects.filter(pk=introducer.pk).update(last_value=F('last_value') + count)
+            last_value = cls.objects.filter(pk=introducer.pk).values_list('last_value', flat=True).get()
+        first = last_value - count + 1
+        return [cls.format_code(introducer, n) for n in range(first, last_value + 1)]
+
+    def __str__(self):
+        return f"{self.introducer_id}: {self.last_value}"
+
+    class Meta:
+        verbose_name = "عداد أكواد الناخبين"
+        verbose_name_plural = "عدادات أكواد الناخبين"
+
+
 class CandidateMonitor(models.Model):
     """مراقبي/وكلاء المرشحين"""
     STATUS_CHOICES = [
@@ -947,23 +1006,23 @@ class SubOperationRoom(models.Model):
     
     def get_introducers_count(self):
         """عدد المعرفين في الغرفة"""
-        return self.introducers.count()
+        return HierarchyRollup.for_instance(self, HierarchyRollup.SCOPE_ROOM).introducers
     
     def get_voters_count(self):
         """عدد الناخبين في الغرفة"""
-        return Voter.objects.filter(introducer__sub_room=self).count()
+        return HierarchyRollup.for_instance(self, HierarchyRollup.SCOPE_ROOM).voters
     
     def get_anchors_count(self):
         """عدد المرتكزات في الغرفة"""
-        return self.anchors.count()
+        return HierarchyRollup.for_instance(self, HierarchyRollup.SCOPE_ROOM).anchors
     
     def get_directors_count(self):
         """عدد مدراء المراكز في الغرفة"""
-        return self.directors.count()
+        return HierarchyRollup.for_instance(self, HierarchyRollup.SCOPE_ROOM).directors
     
     def get_agents_count(self):
         """عدد وكلاء الكيان في الغرفة"""
-        return self.agents.count()
+        return HierarchyRollup.for_instance(self, HierarchyRollup.SCOPE_ROOM).agents
     
     def get_total_people_count(self):
         """العدد الإجمالي للأشخاص في الغرفة"""
@@ -981,6 +1040,83 @@ class SubOperationRoom(models.Model):
         ordering = ['room_code']
 
 
+class HierarchyRollup(models.Model):
+    """
+    إحصائيات مجمّعة للتسلسل الهرمي (مرشح / مرتكز / معرف / غرفة عمليات)
+    تُحدّث تلقائياً عبر الإشارات (elections/rollups.py) وتُعاد بناؤها بأمر rebuild_hierarchy_rollups
+    """
+    SCOPE_CANDIDATE = 'candidate'
+    SCOPE_PARTY_CANDIDATE = 'party_candidate'
+    SCOPE_ANCHOR = 'anchor'
+    SCOPE_INTRODUCER = 'introducer'
+    SCOPE_ROOM = 'room'
+    SCOPE_CHOICES = [
+        (SCOPE_CANDIDATE, 'مرشح'),
+        (SCOPE_PARTY_CANDIDATE, 'مرشح (جديد)'),
+        (SCOPE_ANCHOR, 'مرتكز'),
+        (SCOPE_INTRODUCER, 'معرف'),
+        (SCOPE_ROOM, 'غرفة عمليات'),
+    ]
+
+    # تصنيف الناخب -> حقل العداد
+    CLASSIFICATION_FIELDS = {
+        'supporter': 'supporters',
+        'neutral': 'neutral',
+        'opponent': 'opponents',
+        'unknown': 'unknown',
+    }
+
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES, verbose_name="النوع")
+    object_id = models.PositiveIntegerField(verbose_name="المعرّف")
+
+    voters = models.PositiveIntegerField(default=0, verbose_name="الناخبين")
+    supporters = models.PositiveIntegerField(default=0, verbose_name="مؤيد")
+    neutral = models.PositiveIntegerField(default=0, verbose_name="محايد")
+    opponents = models.PositiveIntegerField(default=0, verbose_name="معارض")
+    unknown = models.PositiveIntegerField(default=0, verbose_name="غير محدد")
+    introducers = models.PositiveIntegerField(default=0, verbose_name="المعرفين")
+    anchors = models.PositiveIntegerField(default=0, verbose_name="المرتكزات")
+    directors = models.PositiveIntegerField(default=0, verbose_name="مدراء المراكز")
+    agents = models.PositiveIntegerField(default=0, verbose_name="وكلاء الكيان")
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def classification_field(cls, classification):
+        return cls.CLASSIFICATION_FIELDS.get(classification, 'unknown')
+
+    @classmethod
+    def for_instance(cls, instance, scope):
+        """إحصائيات الكائن (قراءة واحدة بالفهرس، مخزنة على الكائن)"""
+        cached = getattr(instance, '_hierarchy_rollup', None)
+        if cached is None:
+            cached = cls.objects.filter(scope=scope, object_id=instance.pk).first() or cls(
+                scope=scope, object_id=instance.pk
+            )
+            instance._hierarchy_rollup = cached
+        return cached
+
+    @classmethod
+    def attach(cls, instances, scope):
+        """تحميل إحصائيات قائمة كائنات باستعلام واحد (لصفحات القوائم)"""
+        instances = list(instances)
+        rollups = {
+            r.object_id: r
+            for r in cls.objects.filter(scope=scope, object_id__in=[i.pk for i in instances])
+        }
+        for instance in instances:
+            instance._hierarchy_rollup = rollups.get(instance.pk) or cls(scope=scope, object_id=instance.pk)
+        return instances
+
+    def __str__(self):
+        return f"{self.scope}:{self.object_id}"
+
+    class Meta:
+        verbose_name = "إحصائية مجمّعة"
+        verbose_name_plural = "الإحصائيات المجمّعة"
+        unique_together = ('scope', 'object_id')
+
+
 # ==================== Communication & Tasks ====================
 
 # CommunicationLog model has been moved to the end of file and updated to support Generic Relations for the Unified Communication System.
@@ -1049,9 +1185,7 @@ class PoliticalParty(models.Model):
     
     def get_total_votes(self):
         """حساب إجمالي أصوات الحزب"""
-        return VoteCount.objects.filter(candidate__party=self).aggregate(
-            total=models.Sum('vote_count')
-        )['total'] or 0
+        return VoteTally.get_for(VoteTally.SCOPE_PARTY, self.pk).total_votes
     
     def get_candidates_count(self):
         """عدد المرشحين"""
@@ -1152,21 +1286,15 @@ class PartyCandidate(models.Model):
     
     def get_total_votes(self):
         """حساب إجمالي أصوات المرشح"""
-        return VoteCount.objects.filter(candidate=self).aggregate(
-            total=models.Sum('vote_count')
-        )['total'] or 0
+        return VoteTally.get_for(VoteTally.SCOPE_CANDIDATE, self.pk).total_votes
     
     def get_general_votes(self):
         """حساب أصوات التصويت العام"""
-        return VoteCount.objects.filter(candidate=self, vote_type='general').aggregate(
-            total=models.Sum('vote_count')
-        )['total'] or 0
+        return VoteTally.get_for(VoteTally.SCOPE_CANDIDATE, self.pk).general_votes
     
     def get_special_votes(self):
         """حساب أصوات التصويت الخاص"""
-        return VoteCount.objects.filter(candidate=self, vote_type='special').aggregate(
-            total=models.Sum('vote_count')
-        )['total'] or 0
+        return VoteTally.get_for(VoteTally.SCOPE_CANDIDATE, self.pk).special_votes
     
     def get_stations_voted_count(self):
         """عدد المحطات التي صوّت فيها"""
@@ -1179,22 +1307,15 @@ class PartyCandidate(models.Model):
     # أساليب لإدارة التسلسل الهرمي الانتخابي (المرتكزات، المعرفين، الناخبين، المراقبين)
     def get_anchors_count(self):
         """عدد المرتكزات للمرشح"""
-        return self.anchors.count() if hasattr(self, 'anchors') else 0
+        return HierarchyRollup.for_instance(self, HierarchyRollup.SCOPE_PARTY_CANDIDATE).anchors
     
     def get_introducers_count(self):
         """عدد المعرفين للمرشح عبر جميع المرتكزات"""
-        try:
-            from django.db.models import Count
-            return Introducer.objects.filter(anchor__candidate=self).count()
-        except:
-            return 0
+        return HierarchyRollup.for_instance(self, HierarchyRollup.SCOPE_PARTY_CANDIDATE).introducers
     
     def get_voters_count(self):
         """عدد الناخبين للمرشح عبر جميع المعرفين"""
-        try:
-            return Voter.objects.filter(introducer__anchor__candidate=self).count()
-        except:
-            return 0
+        return HierarchyRollup.for_instance(self, HierarchyRollup.SCOPE_PARTY_CANDIDATE).voters
     
     def get_monitors_count(self):
         """عدد المراقبين للمرشح"""
@@ -1281,9 +1402,7 @@ class PollingCenter(models.Model):
     
     def get_total_votes(self):
         """إجمالي الأصوات في المركز"""
-        return VoteCount.objects.filter(station__center=self).aggregate(
-            total=models.Sum('vote_count')
-        )['total'] or 0
+        return VoteTally.get_for(VoteTally.SCOPE_CENTER, self.pk).total_votes
     
     def __str__(self):
         return f"{self.center_number} - {self.name}"
@@ -1331,9 +1450,7 @@ class PollingStation(models.Model):
     
     def get_total_votes(self):
         """إجمالي الأصوات المسجلة"""
-        return VoteCount.objects.filter(station=self).aggregate(
-            total=models.Sum('vote_count')
-        )['total'] or 0
+        return VoteTally.get_for(VoteTally.SCOPE_STATION, self.pk).total_votes
     
     def __str__(self):
         return f"{self.full_number} - {self.center.name}"
@@ -1367,9 +1484,21 @@ class VoteCount(models.Model):
     entered_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ ووقت الإدخال")
     updated_at = models.DateTimeField(auto_now=True)
     notes = models.TextField(blank=True, verbose_name="ملاحظات")
-    
+    # رقم النسخة للتحكم المتفائل بالتزامن: كل تعديل يزيده، والتعديل بنسخة قديمة يُرفض
+    version = models.PositiveIntegerField(default=1, verbose_name="رقم النسخة")
+
+    class StaleVersion(Exception):
+        """تُرفع عند تعديل سجل عدّله مستخدم آخر بعد قراءته؛ args[0] قائمة معرفات المرشحين المتعارضة"""
+
     def __str__(self):
         return f"{self.station.full_number} - {self.candidate.full_name}: {self.vote_count} ({self.get_vote_type_display()})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version = (self.version or 0) + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
     
     class Meta:
         verbose_name = "جرد أصوات"
@@ -1378,6 +1507,149 @@ class VoteCount(models.Model):
         unique_together = ['station', 'candidate', 'vote_type']
 
 
+class VoteTally(models.Model):
+    """
+    مجاميع الأصوات المحسوبة مسبقاً (مرشح / حزب / مركز / محطة / الإجمالي) مقسمة حسب نوع التصويت
+    تُحدّث في نفس معاملة أي تغيير على VoteCount (elections/tallies.py) ويطابقها أمر reconcile_vote_tallies
+    """
+    SCOPE_CANDIDATE = 'candidate'
+    SCOPE_PARTY = 'party'
+    SCOPE_CENTER = 'center'
+    SCOPE_STATION = 'station'
+    SCOPE_TOTAL = 'total'
+    SCOPE_CHOICES = [
+        (SCOPE_CANDIDATE, 'مرشح'),
+        (SCOPE_PARTY, 'حزب'),
+        (SCOPE_CENTER, 'مركز اقتراع'),
+        (SCOPE_STATION, 'محطة'),
+        (SCOPE_TOTAL, 'الإجمالي'),
+    ]
+
+    # نوع التصويت -> (حقل الأصوات, حقل عدد السجلات)
+    VOTE_TYPE_FIELDS = {
+        'general': ('general_votes', 'general_entries'),
+        'special': ('special_votes', 'special_entries'),
+    }
+
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES, verbose_name="النوع")
+    object_id = models.PositiveIntegerField(verbose_name="المعرّف")  # 0 لصف الإجمالي
+
+    general_votes = models.BigIntegerField(default=0, verbose_name="أصوات التصويت العام")
+    special_votes = models.BigIntegerField(default=0, verbose_name="أصوات التصويت الخاص")
+    general_entries = models.IntegerField(default=0, verbose_name="سجلات التصويت العام")
+    special_entries = models.IntegerField(default=0, verbose_name="سجلات التصويت الخاص")
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def total_votes(self):
+        return self.general_votes + self.special_votes
+
+    @classmethod
+    def get_for(cls, scope, object_id=0):
+        """صف المجاميع (أو صف فارغ غير محفوظ إن لم توجد أصوات بعد)"""
+        return cls.objects.filter(scope=scope, object_id=object_id).first() or cls(
+            scope=scope, object_id=object_id
+        )
+
+    @classmethod
+    def totals(cls):
+        return cls.get_for(cls.SCOPE_TOTAL)
+
+    def __str__(self):
+        return f"{self.scope}:{self.object_id} ({self.total_votes})"
+
+    class Meta:
+        verbose_name = "مجموع أصوات"
+        verbose_name_plural = "مجاميع الأصوات"
+        unique_together = ('scope', 'object_id')
+
+
+class VoteTallyEvent(models.Model):
+    """
+    سجل تغييرات مجاميع الأصوات (يُكتب في نفس معاملة التغيير)
+    يقرؤه منتج واحد في كل عملية ويبثه لشاشات النتائج المتصلة (elections/tally_stream.py)
+    """
+    id = models.BigAutoField(primary_key=True)
+    # [{'scope': ..., 'id': ..., 'general_votes': +n, ...}] أو فارغة مع reset=True بعد إعادة البناء
+    changes = models.JSONField(default=list, verbose_name="التغييرات")
+    reset = models.BooleanField(default=False, verbose_name="إعادة تحميل كاملة")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def to_dict(self):
+        return {'id': self.pk, 'changes': self.changes, 'reset': self.reset}
+
+    def __str__(self):
+        return f"#{self.pk} ({'reset' if self.reset else len(self.changes)})"
+
+    class Meta:
+        verbose_name = "تغيير مجاميع الأصوات"
+        verbose_name_plural = "تغييرات مجاميع الأصوات"
+        ordering = ['id']
+
+
+class StationAnomaly(models.Model):
+    """
+    نتيجة فحص إحصائي لنتائج محطة (elections/anomalies.py)
+    المفتاح key يجمع (الفحص، المحطة، المرشح) فإعادة الفحص تُحدّث نفس السجل ولا تمس حالة المراجعة
+    """
+    CHECK_TURNOUT = 'turnout'
+    CHECK_TOTALS = 'totals'
+    CHECK_OUTLIER = 'outlier'
+    CHECK_LAST_DIGIT = 'last_digit'
+    CHECK_CHOICES = [
+        (CHECK_TURNOUT, 'مشاركة تتجاوز المسجلين'),
+        (CHECK_TOTALS, 'عدم تطابق المجاميع'),
+        (CHECK_OUTLIER, 'قيمة شاذة مقارنة بمحطات المركز'),
+        (CHECK_LAST_DIGIT, 'توزيع غير طبيعي للرقم الأخير'),
+    ]
+
+    SEVERITY_WARNING = 'warning'
+    SEVERITY_CRITICAL = 'critical'
+    SEVERITY_CHOICES = [
+        (SEVERITY_WARNING, 'تحذير'),
+        (SEVERITY_CRITICAL, 'حرج'),
+    ]
+
+    STATUS_OPEN = 'open'
+    STATUS_CONFIRMED = 'confirmed'
+    STATUS_DISMISSED = 'dismissed'
+    STATUS_CHOICES = [
+        (STATUS_OPEN, 'بانتظار المراجعة'),
+        (STATUS_CONFIRMED, 'مؤكدة'),
+        (STATUS_DISMISSED, 'مستبعدة'),
+    ]
+
+    key = models.CharField(max_length=100, unique=True)
+    check_type = models.CharField(max_length=20, choices=CHECK_CHOICES, db_index=True, verbose_name="الفحص")
+    severity = models.CharField(max_length=10, choices=SEVERITY_CHOICES, verbose_name="الخطورة")
+    station = models.ForeignKey(PollingStation, on_delete=models.CASCADE,
+                                related_name='anomalies', verbose_name="المحطة")
+    candidate = models.ForeignKey(PartyCandidate, on_delete=models.CASCADE, null=True, blank=True,
+                                  related_name='anomalies', verbose_name="المرشح")
+    score = models.FloatField(default=0, verbose_name="الدرجة")
+    message = models.CharField(max_length=255, verbose_name="الوصف")
+    details = models.JSONField(default=dict, blank=True, verbose_name="التفاصيل")
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_OPEN,
+                              db_index=True, verbose_name="حالة المراجعة")
+    reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='reviewed_anomalies', verbose_name="راجعها")
+    reviewed_at = models.DateTimeField(null=True, blank=True, verbose_name="تاريخ المراجعة")
+    review_notes = models.TextField(blank=True, verbose_name="ملاحظات المراجعة")
+
+    detected_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الاكتشاف")
+    last_seen_at = models.DateTimeField(verbose_name="آخر فحص ظهرت فيه")
+
+    def __str__(self):
+        return f"{self.get_check_type_display()} - {self.station_id}"
+
+    class Meta:
+        verbose_name = "ملاحظة فحص النتائج"
+        verbose_name_plural = "ملاحظات فحص النتائج"
+        ordering = ['-score']
+
+
 # ==================== Electoral Public Registration (المرتكزات) ====================
 # Based on Video 1: 16-52-51.mp4
 
@@ -1832,6 +2104,58 @@ class BarcodeScanRecord(models.Model):
         ]
 
 
+class ScanDedupKey(models.Model):
+    """
+    مفتاح منع تكرار مسح المحطة (elections/scan_dedup.py): صف واحد لكل (مركز، محطة، نوع تصويت)
+    يحجزه أول مسح يتم التحقق منه، ويُحذف مع المسح أو عند رفضه
+    """
+    center_number = models.CharField(max_length=50, verbose_name="رقم المركز")
+    station_number = models.CharField(max_length=50, verbose_name="رقم المحطة")
+    vote_type = models.CharField(max_length=20, verbose_name="نوع التصويت")
+    scan = models.OneToOneField(BarcodeScanRecord, on_delete=models.CASCADE, related_name='dedup_key',
+                                verbose_name="المسح")
+    claimed_at = models.DateTimeField(auto_now_add=True, verbose_name="وقت الحجز")
+
+    def __str__(self):
+        return f"{self.center_number}-{self.station_number} ({self.vote_type})"
+
+    class Meta:
+        verbose_name = "مفتاح مسح محطة"
+        verbose_name_plural = "مفاتيح مسح المحطات"
+        constraints = [
+            models.UniqueConstraint(fields=['center_number', 'station_number', 'vote_type'],
+                                    name='unique_scan_dedup_key'),
+        ]
+
+
+class ScanOperatorDay(models.Model):
+    """
+    عدادات مسح الباركود اليومية لكل مُشغِّل (elections/scan_stats.py)
+    تُزاد بتعبيرات F() في معاملة كل مسح، فإحصائيات صفحة الماسح لا تعدّ سجلات المسح
+    """
+    operator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scan_days',
+                                 verbose_name="المُشغِّل")
+    date = models.DateField(verbose_name="اليوم")
+    sessions = models.IntegerField(default=0, verbose_name="عدد الجلسات")
+    total_scans = models.IntegerField(default=0, verbose_name="عدد المسحات")
+    successful_scans = models.IntegerField(default=0, verbose_name="مسحات ناجحة")
+    failed_scans = models.IntegerField(default=0, verbose_name="مسحات فاشلة")
+    duplicate_scans = models.IntegerField(default=0, verbose_name="مسحات مكررة")
+    processed_scans = models.IntegerField(default=0, verbose_name="مسحات تمت معالجتها")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="آخر تحديث")
+
+    def __str__(self):
+        return f"{self.operator} - {self.date}"
+
+    class Meta:
+        verbose_name = "إحصائية مسح يومية"
+        verbose_name_plural = "إحصائيات المسح اليومية"
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['operator', 'date'], name='unique_scan_operator_day'),
+        ]
+
+
 # ==================== Attendance and Login Tracking ====================
 
 class AttendanceRecord(models.Model):
@@ -1984,3 +2308,183 @@ class CommunicationLog(models.Model):
             models.Index(fields=['content_type', 'object_id']),
             models.Index(fields=['created_at']),
         ]
+
+
+# ==================== Background Jobs ====================
+
+class BackgroundJob(models.Model):
+    """
+    مهمة خلفية طويلة (استيراد / تصدير كبير) مخزنة في قاعدة البيانات
+    تُنفذ بواسطة أمر run_jobs خارج عمليات الويب، لذا تبقى حالتها بعد إعادة التشغيل ويراها كل العمال
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'في الانتظار'),
+        (STATUS_RUNNING, 'قيد التنفيذ'),
+        (STATUS_SUCCEEDED, 'مكتملة'),
+        (STATUS_FAILED, 'فشلت'),
+        (STATUS_CANCELLED, 'ملغاة'),
+    ]
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    kind = models.CharField(max_length=50, db_index=True, verbose_name="نوع المهمة")
+    label = models.CharField(max_length=200, blank=True, verbose_name="الوصف")
+    params = models.JSONField(default=dict, blank=True, verbose_name="المعاملات")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED,
+                              verbose_name="الحالة")
+
+    # التقدم
+    progress_current = models.PositiveIntegerField(default=0, verbose_name="المنجز")
+    progress_total = models.PositiveIntegerField(default=0, verbose_name="الإجمالي")
+    message = models.CharField(max_length=500, blank=True, verbose_name="آخر رسالة")
+    log = models.TextField(blank=True, verbose_name="السجل")
+    result = models.JSONField(null=True, blank=True, verbose_name="النتيجة")
+    error = models.TextField(blank=True, verbose_name="الخطأ")
+
+    # التنفيذ وإعادة المحاولة
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="عدد المحاولات")
+    max_attempts = models.PositiveSmallIntegerField(default=1, verbose_name="الحد الأقصى للمحاولات")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="التنفيذ بعد")
+    cancel_requested = models.BooleanField(default=False, verbose_name="طُلب الإلغاء")
+    worker = models.CharField(max_length=100, blank=True, verbose_name="العامل")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="آخر نبضة")
+
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='background_jobs', verbose_name="أنشأها")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="بدء التنفيذ")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="انتهاء التنفيذ")
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+    @property
+    def percentage(self):
+        if not self.progress_total:
+            return 100 if self.status == self.STATUS_SUCCEEDED else 0
+        return round(min(self.progress_current, self.progress_total) / self.progress_total * 100, 1)
+
+    def log_lines(self, limit=None):
+        lines = self.log.splitlines()
+        return lines[-limit:] if limit else lines
+
+    def to_dict(self, log_limit=20):
+        """تمثيل JSON لواجهة متابعة التقدم"""
+        return {
+            'id': self.pk,
+            'kind': self.kind,
+            'label': self.label,
+            'status': self.status,
+            'status_display': self.get_status_display(),
+            'is_active': self.is_active,
+            'progress_current': self.progress_current,
+            'progress_total': self.progress_total,
+            'percentage': self.percentage,
+            'message': self.message,
+            'log': self.log_lines(log_limit),
+            'result': self.result,
+            'error': self.error,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'cancel_requested': self.cancel_requested,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __str__(self):
+        return f"#{self.pk} {self.label or self.kind} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "مهمة خلفية"
+        verbose_name_plural = "المهام الخلفية"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+
+# ==================== Import Checkpoints ====================
+
+class ImportCheckpoint(models.Model):
+    """
+    نقطة استئناف لعمليات الاستيراد الطويلة (مثل ترحيل PersonHD إلى جدول الناخبين)
+    آخر مفتاح يُحفظ في نفس المعاملة التي تكتب الدفعة، فالتشغيل المتقطع يُستأنف من حيث توقف بالضبط
+    """
+    name = models.CharField(max_length=100, unique=True, verbose_name="اسم عملية الاستيراد")
+    last_key = models.BigIntegerField(null=True, blank=True, verbose_name="آخر مفتاح مُثبت")
+    processed = models.BigIntegerField(default=0, verbose_name="السجلات المعالجة")
+    created = models.BigIntegerField(default=0, verbose_name="السجلات الجديدة")
+    updated = models.BigIntegerField(default=0, verbose_name="السجلات المحدثة")
+    batches = models.IntegerField(default=0, verbose_name="عدد الدفعات")
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name="بدء الاستيراد")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="آخر تحديث")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="اكتمال الاستيراد")
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_key} ({self.processed:,})"
+
+    class Meta:
+        verbose_name = "نقطة استئناف استيراد"
+        verbose_name_plural = "نقاط استئناف الاستيراد"
+
+
+# ==================== Data Versions ====================
+
+class DataVersion(models.Model):
+    """
+    عدادات نسخ للبيانات المحفوظة في ذاكرة كل عملية (مثل دليل المراكز والمحطات)
+    كل عملية تقارن نسختها المحملة بالعداد وتعيد التحميل عند تغيره
+    """
+    name = models.CharField(max_length=50, unique=True, verbose_name="الاسم")
+    version = models.BigIntegerField(default=0, verbose_name="النسخة")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="آخر تحديث")
+
+    @classmethod
+    def current(cls, name):
+        return cls.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, name):
+        """زيادة العداد (ينشئه عند أول استخدام)"""
+        if not cls.objects.filter(name=name).update(version=F('version') + 1, updated_at=timezone.now()):
+            cls.objects.get_or_create(name=name, defaults={'version': 1})
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+    class Meta:
+        verbose_name = "نسخة بيانات"
+        verbose_name_plural = "نسخ البيانات"
+
+
+# ==================== Idempotency Keys ====================
+
+class IdempotencyKey(models.Model):
+    """
+    مفاتيح الطلبات المكررة لواجهات إدخال الأصوات (elections/idempotency.py)
+    الجهاز يرسل نفس المفتاح عند إعادة المحاولة فيُعاد الرد المحفوظ بدل تنفيذ الإدخال مرة أخرى
+    """
+    endpoint = models.CharField(max_length=100, verbose_name="الواجهة")
+    key = models.CharField(max_length=100, verbose_name="مفتاح الطلب")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys',
+                             verbose_name="المستخدم")
+    request_hash = models.CharField(max_length=64, verbose_name="بصمة الطلب")
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="رمز الرد")
+    response = models.JSONField(null=True, blank=True, verbose_name="الرد المحفوظ")
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True, verbose_name="ينتهي في")
+
+    def __str__(self):
+        return f"{self.endpoint}:{self.key} ({self.status_code})"
+
+    class Meta:
+        verbose_name = "مفتاح طلب"
+        verbose_name_plural = "مفاتيح الطلبات"
+        unique_together = ['endpoint', 'user', 'key']
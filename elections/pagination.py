@@ -0,0 +1,150 @@
+"""
+ترقيم الصفحات بالمفتاح (Keyset / Seek) والعدّ التقديري للجداول الكبيرة
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import connections
+
+
+# ==================== Keyset Pagination ====================
+
+class KeysetPage:
+    """صفحة واحدة من نتائج الترقيم بالمفتاح"""
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    ترقيم بالمفتاح على حقل فريد (مثل voter_number)
+    كلفة كل صفحة ثابتة مهما كان عمقها لأنها تستخدم WHERE key > last بدلاً من OFFSET
+    """
+    salt = 'elections.keyset-cursor'
+
+    def __init__(self, queryset, per_page, key='voter_number'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.key = key
+
+    def encode_cursor(self, value, direction):
+        """رمز مؤشر معتم (موقّع) للصفحة التالية/السابقة"""
+        return signing.dumps({'k': value, 'd': direction}, salt=self.salt)
+
+    def decode_cursor(self, token):
+        if not token:
+            return None, 'next'
+        try:
+            data = signing.loads(token, salt=self.salt)
+            return data['k'], data['d']
+        except (signing.BadSignature, KeyError, TypeError):
+            # مؤشر تالف أو قديم -> الصفحة الأولى
+            return None, 'next'
+
+    def page(self, cursor=None):
+        value, direction = self.decode_cursor(cursor)
+        queryset = self.queryset
+        key = self.key
+
+        if direction == 'prev' and value is not None:
+            rows = list(
+                queryset.filter(**{f'{key}__lt': value}).order_by(f'-{key}')[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            if value is not None:
+                queryset = queryset.filter(**{f'{key}__gt': value})
+            rows = list(queryset.order_by(key)[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = value is not None
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_next:
+                next_cursor = self.encode_cursor(getattr(rows[-1], key), 'next')
+            if has_previous:
+                previous_cursor = self.encode_cursor(getattr(rows[0], key), 'prev')
+
+        return KeysetPage(rows, has_next, has_previous, next_cursor, previous_cursor)
+
+
+# ==================== Estimated Counts ====================
+
+# تحت هذا الحد يكون العدّ الدقيق رخيصاً بما يكفي
+EXACT_COUNT_THRESHOLD = 10000
+
+
+def _cache_key(queryset):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(
+        json.dumps([queryset.db, sql, [str(p) for p in params]]).encode('utf-8')
+    ).hexdigest()
+    return f'estimated_count:{digest}'
+
+
+def _postgres_estimate(queryset):
+    """تقدير عدد الصفوف من إحصائيات مخطط PostgreSQL"""
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            return int(row[0]) if row else -1
+
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimated_count(queryset, timeout=None):
+    """
+    عدد تقريبي لنتائج queryset دون مسح كامل للجدول:
+    - PostgreSQL: إحصائيات المخطط (reltuples / EXPLAIN)
+    - SQLite وغيرها: عدّ دقيق مخزّن مؤقتاً
+    """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+
+    if connection.vendor == 'postgresql':
+        try:
+            estimate = _postgres_estimate(queryset)
+        except Exception:
+            estimate = -1
+        if estimate >= EXACT_COUNT_THRESHOLD:
+            return estimate
+
+    if timeout is None:
+        timeout = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+
+    key = _cache_key(queryset)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
@@ -0,0 +1,195 @@
+"""
+دليل مراكز ومحطات الاقتراع في ذاكرة كل عملية (بضعة آلاف صف)
+ربط المسحات وإدخال الأصوات يبحث فيه عن المركز برقمه (مع قاعدة الرمز ذي 8 أرقام) ثم عن المحطة برقمها
+دون أي استعلام. الصلاحية تُعرف بعداد DataVersion يُزاد عند حفظ مركز أو محطة (إشارات) وفي أوامر الاستيراد،
+وكل عملية تقارن نسختها بالعداد مرة كل VERSION_CHECK_INTERVAL ثانية
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Area, DataVersion, Neighborhood, PollingCenter, PollingStation
+from .search import normalize_digits
+
+VERSION_NAME = 'polling_directory'
+
+# الفاصل بين مقارنات النسخة بالعداد (ثوانٍ)؛ العملية التي عدّلت البيانات تعيد التحميل فوراً
+VERSION_CHECK_INTERVAL = 5
+
+# أقل فاصل لمقارنة النسخة بسبب رقم غير معروف (يمنع استعلاماً مع كل باركود خاطئ)
+MISS_CHECK_AFTER = 1
+
+CENTER_FIELDS = (
+    'id', 'name', 'center_number', 'voting_type', 'governorate', 'area_id', 'neighborhood_id',
+    'location', 'address', 'station_count',
+)
+STATION_FIELDS = ('id', 'center_id', 'station_number', 'full_number')
+
+# الحقول التي يتأثر بها الدليل؛ حفظ محطة يغير حالة الجرد أو الأصوات فقط لا يلغيه
+_DIRECTORY_FIELDS = {PollingCenter: CENTER_FIELDS, PollingStation: STATION_FIELDS,
+                     Area: ('id', 'name'), Neighborhood: ('id', 'name')}
+
+
+def normalize_number(value):
+    """رقم المركز أو المحطة كما أُدخل أو قُرئ من الباركود: أرقام لاتينية دون مسافات"""
+    return normalize_digits('' if value is None else str(value))
+
+
+class PollingDirectory:
+    """رقم المركز -> المركز، و(المركز، رقم المحطة) -> المحطة"""
+
+    def __init__(self):
+        self._data = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        areas = dict(Area.objects.values_list('id', 'name'))
+        neighborhoods = dict(Neighborhood.objects.values_list('id', 'name'))
+        centers = {row[0]: row for row in PollingCenter.objects.values_list(*CENTER_FIELDS)}
+        stations, by_center = {}, {}
+        for row in PollingStation.objects.values_list(*STATION_FIELDS).order_by('center_id', 'station_number'):
+            stations[(row[1], row[2])] = row
+            by_center.setdefault(row[1], []).append(row)
+        return {
+            'version': DataVersion.current(VERSION_NAME),
+            'areas': areas,
+            'neighborhoods': neighborhoods,
+            'centers': centers,
+            'by_number': {row[2]: row[0] for row in centers.values()},
+            'stations': stations,
+            'by_center': by_center,
+        }
+
+    def _current(self, max_age=VERSION_CHECK_INTERVAL):
+        now = time.monotonic()
+        if self._data is not None and now - self._checked_at <= max_age:
+            return self._data
+        with self._lock:
+            if self._data is None:
+                self._data = self._load()
+            elif time.monotonic() - self._checked_at > max_age:
+                if DataVersion.current(VERSION_NAME) != self._data['version']:
+                    self._data = self._load()
+            self._checked_at = time.monotonic()
+            return self._data
+
+    def warm(self):
+        self._current()
+
+    def clear(self):
+        with self._lock:
+            self._data = None
+
+    # ---------- بناء الكائنات ----------
+
+    def _center(self, data, center_id):
+        """نسخة جديدة من المركز لكل طلب (الحقول غير المحملة تُقرأ عند الحاجة كما في only())"""
+        row = data['centers'][center_id]
+        center = PollingCenter.from_db('default', CENTER_FIELDS, row)
+        area_id, neighborhood_id = row[5], row[6]
+        center.area = Area.from_db('default', ('id', 'name'), (area_id, data['areas'][area_id])) \
+            if area_id in data['areas'] else None
+        center.neighborhood = Neighborhood.from_db(
+            'default', ('id', 'name'), (neighborhood_id, data['neighborhoods'][neighborhood_id])
+        ) if neighborhood_id in data['neighborhoods'] else None
+        return center
+
+    @staticmethod
+    def _station(row, center):
+        station = PollingStation.from_db('default', STATION_FIELDS, row)
+        station.center = center
+        return station
+
+    # ---------- البحث ----------
+
+    @staticmethod
+    def _center_id(data, number):
+        center_id = data['by_number'].get(number)
+        # رموز QR ذات 8 أرقام تبدأ برقم المركز ذي 6 أرقام
+        if center_id is None and len(number) == 8:
+            center_id = data['by_number'].get(number[:6])
+        return center_id
+
+    def find_center(self, center_number):
+        """المركز برقمه (مع قاعدة الـ 8 أرقام) أو None"""
+        number = normalize_number(center_number)
+        if not number:
+            return None
+        data = self._current()
+        center_id = self._center_id(data, number)
+        if center_id is None:
+            # مركز أضيف في عملية أخرى منذ آخر مقارنة للنسخة
+            data = self._current(max_age=MISS_CHECK_AFTER)
+            center_id = self._center_id(data, number)
+        return self._center(data, center_id) if center_id is not None else None
+
+    def find_station(self, center_number, station_number):
+        """(المركز، المحطة)؛ أي منهما None إن لم يوجد"""
+        center = self.find_center(center_number)
+        number = normalize_number(station_number)
+        if center is None or not number.isdigit():
+            return center, None
+        key = (center.pk, int(number))
+        row = self._current()['stations'].get(key)
+        if row is None:
+            row = self._current(max_age=MISS_CHECK_AFTER)['stations'].get(key)
+        return center, self._station(row, center) if row else None
+
+    def center_stations(self, center):
+        """محطات المركز مرتبة برقمها"""
+        return [self._station(row, center) for row in self._current()['by_center'].get(center.pk, [])]
+
+    def affected_by(self, instance):
+        """هل يغير حفظ هذا الكائن ما في الدليل (أو لا يُعرف لأن الدليل غير محمل)"""
+        data = self._data
+        if data is None:
+            return True
+        fields = _DIRECTORY_FIELDS[type(instance)]
+        values = tuple(getattr(instance, field) for field in fields)
+        if isinstance(instance, PollingCenter):
+            return data['centers'].get(instance.pk) != values
+        if isinstance(instance, PollingStation):
+            return data['stations'].get((instance.center_id, instance.station_number)) != values
+        names = data['areas'] if isinstance(instance, Area) else data['neighborhoods']
+        return names.get(instance.pk) != values[1]
+
+
+polling_directory = PollingDirectory()
+
+
+# ==================== الإلغاء ====================
+
+_bulk = threading.local()
+
+
+def bump_directory_version():
+    """زيادة نسخة الدليل لكل العمليات، وإلغاء نسخة هذه العملية بعد تثبيت المعاملة"""
+    DataVersion.bump(VERSION_NAME)
+    transaction.on_commit(polling_directory.clear)
+
+
+@contextmanager
+def directory_bulk_update():
+    """لأوامر الاستيراد: لا تُزاد النسخة مع كل صف بل مرة واحدة في النهاية"""
+    _bulk.active = True
+    try:
+        yield
+    finally:
+        _bulk.active = False
+        bump_directory_version()
+
+
+@receiver([post_save, post_delete], sender=PollingCenter)
+@receiver([post_save, post_delete], sender=PollingStation)
+@receiver([post_save, post_delete], sender=Area)
+@receiver([post_save, post_delete], sender=Neighborhood)
+def directory_changed(sender, instance, **kwargs):
+    if getattr(_bulk, 'active', False):
+        return
+    if kwargs.get('signal') is post_delete or polling_directory.affected_by(instance):
+        bump_directory_version()
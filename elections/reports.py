@@ -35,43 +35,43 @@ from .models import (
     Voter, Candidate, Anchor, Introducer, CommunicationLog, CampaignTask,
     PartyCandidate, PoliticalParty, PollingCenter, VoteCount
 )
+from .exports import (
+    CLASSIFICATION_LABELS, StreamingExcelWriter,
+    filter_voters, iter_voter_rows, streaming_csv_response, wants_gzip
+)
 
 
 # ==================== CSV Export ====================
 
 @login_required
 def export_voters_csv(request):
-    """تصدير الناخبين إلى CSV"""
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    response['Content-Disposition'] = 'attachment; filename="voters.csv"'
-    response.write('\ufeff')  # UTF-8 BOM
-    
-    writer = csv.writer(response)
-    writer.writerow([
+    """تصدير الناخبين إلى CSV (متدفق، مع فلاتر: center, station, classification, introducer و gzip=1)"""
+    header = [
         'رقم الناخب', 'الاسم الكامل', 'تاريخ الميلاد', 'اسم الأم',
         'رقم الهاتف', 'المحافظة', 'مركز الاقتراع', 'رقم المركز',
         'رقم المحطة', 'التصنيف', 'المعرّف', 'الحالة'
-    ])
-    
-    voters = Voter.objects.select_related('introducer').all()
-    
-    for voter in voters:
-        writer.writerow([
-            voter.voter_number,
-            voter.full_name,
-            voter.date_of_birth or '',
-            voter.mother_name or '',
-            voter.phone or '',
-            voter.governorate,
-            voter.voting_center_name,
-            voter.voting_center_number,
-            voter.station_number or '',
-            voter.get_classification_display(),
-            voter.introducer.full_name if voter.introducer else '',
-            voter.status or ''
-        ])
+    ]
+    fields = [
+        'voter_number', 'full_name', 'date_of_birth', 'mother_name',
+        'phone', 'governorate', 'voting_center_name', 'voting_center_number',
+        'station_number', 'classification', 'introducer__full_name', 'status'
+    ]
     
-    return response
+    def transform(row):
+        row = list(row)
+        row[2] = row[2] or ''
+        row[3] = row[3] or ''
+        row[4] = row[4] or ''
+        row[8] = row[8] or ''
+        row[9] = CLASSIFICATION_LABELS.get(row[9], row[9])
+        row[10] = row[10] or ''
+        row[11] = row[11] or ''
+        return row
+    
+    voters = filter_voters(Voter.objects.all(), request.GET)
+    return streaming_csv_response(
+        request, 'voters.csv', header, iter_voter_rows(voters, fields, transform), gzip=wants_gzip(request)
+    )
 
 
 @login_required
@@ -109,68 +109,36 @@ def export_voters_excel(request):
     if not EXCEL_AVAILABLE:
         return HttpResponse('مكتبة openpyxl غير متوفرة', status=500)
     
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "الناخبين"
-    ws.right_to_left = True
-    
-    # تنسيق العنوان
-    header_fill = PatternFill(start_color="667eea", end_color="667eea", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    
     # العناوين
     headers = [
         'رقم الناخب', 'الاسم الكامل', 'تاريخ الميلاد', 'اسم الأم',
         'رقم الهاتف', 'المحافظة', 'مركز الاقتراع', 'رقم المركز',
         'رقم المحطة', 'التصنيف', 'المعرّف', 'الحالة'
     ]
+    # عرض الأعمدة حسب أطوال الحقول (بدل المرور على كل خلية بعد الكتابة)
+    col_widths = [15, 35, 12, 25, 15, 12, 40, 12, 10, 12, 30, 12]
+    fields = [
+        'voter_number', 'full_name', 'date_of_birth', 'mother_name',
+        'phone', 'governorate', 'voting_center_name', 'voting_center_number',
+        'station_number', 'classification', 'introducer__full_name', 'status'
+    ]
     
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.value = header
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_alignment
-    
-    # البيانات
-    voters = Voter.objects.select_related('introducer').all()
-    
-    for row_num, voter in enumerate(voters, 2):
-        ws.cell(row=row_num, column=1).value = voter.voter_number
-        ws.cell(row=row_num, column=2).value = voter.full_name
-        ws.cell(row=row_num, column=3).value = str(voter.date_of_birth) if voter.date_of_birth else ''
-        ws.cell(row=row_num, column=4).value = voter.mother_name or ''
-        ws.cell(row=row_num, column=5).value = voter.phone or ''
-        ws.cell(row=row_num, column=6).value = voter.governorate
-        ws.cell(row=row_num, column=7).value = voter.voting_center_name
-        ws.cell(row=row_num, column=8).value = voter.voting_center_number
-        ws.cell(row=row_num, column=9).value = voter.station_number or ''
-        ws.cell(row=row_num, column=10).value = voter.get_classification_display()
-        ws.cell(row=row_num, column=11).value = voter.introducer.full_name if voter.introducer else ''
-        ws.cell(row=row_num, column=12).value = voter.status or ''
-    
-    # ضبط عرض الأعمدة
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-    
-    # الاستجابة
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = 'attachment; filename="voters.xlsx"'
-    wb.save(response)
-    
-    return response
+    def transform(row):
+        row = list(row)
+        row[2] = str(row[2]) if row[2] else ''
+        row[3] = row[3] or ''
+        row[4] = row[4] or ''
+        row[8] = row[8] or ''
+        row[9] = CLASSIFICATION_LABELS.get(row[9], row[9])
+        row[10] = row[10] or ''
+        row[11] = row[11] or ''
+        return row
+    
+    voters = filter_voters(Voter.objects.all(), request.GET)
+    writer = StreamingExcelWriter("الناخبين", headers, col_widths, header_color="667eea", styled=False)
+    writer.write_rows(iter_voter_rows(voters, fields, transform))
+    
+    return writer.response(request, 'voters.xlsx')
 
 
 @login_required
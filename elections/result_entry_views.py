@@ -1,9 +1,12 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.http import JsonResponse
 from django.utils import timezone
 from .models import VoteCount, PollingStation, PartyCandidate, UserRole, PollingCenter
+from .vote_sheets import parse_sheet_counts, parse_sheet_versions, save_station_sheet, summarize_diff
 from django import forms
+import json
 
 def is_result_entry_user(user):
     return user.is_authenticated and (
@@ -83,3 +86,108 @@ def result_entry_add(request):
         form = ResultEntryForm()
 
     return render(request, 'elections/result_entry/add_form.html', {'form': form})
+
+
+@login_required
+@user_passes_test(is_result_entry_user)
+def result_entry_sheet(request):
+    """
+    إدخال ورقة نتائج محطة كاملة: أصوات كل المرشحين لنوع تصويت واحد تُحفظ دفعة واحدة
+    الحقل الفارغ لا يغير شيئاً، والرقم (حتى الصفر) يحدّث السجل الموجود.
+    نسخة كل سجل كما عُرضت تُرسل مع الورقة، فإذا عدّله مستخدم آخر في الأثناء تُرفض الورقة (409) دون حفظ.
+    طلب JSON: {"station": id, "vote_type": "general", "counts": {"<candidate id or code>": count},
+               "versions": {"<candidate id or code>": version or null}}
+    """
+    is_json = request.content_type == 'application/json'
+    data = request.GET
+    if request.method == 'POST':
+        if is_json:
+            try:
+                data = json.loads(request.body)
+            except json.JSONDecodeError:
+                return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+            if not isinstance(data, dict):
+                return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+        else:
+            data = request.POST
+
+    station = None
+    station_error = None
+    station_id = data.get('station')
+    if station_id not in (None, ''):
+        if str(station_id).isdigit():
+            station = get_object_or_404(PollingStation.objects.select_related('center'), pk=station_id)
+        else:
+            station_error = 'رقم المحطة غير صالح'
+            if is_json:
+                return JsonResponse({'success': False, 'errors': [station_error]}, status=400)
+            if request.method != 'POST':
+                messages.error(request, station_error)
+    vote_type = data.get('vote_type') or 'general'
+    if vote_type not in dict(VoteCount.VOTE_TYPE_CHOICES):
+        vote_type = 'general'
+
+    diff = None
+    if request.method == 'POST':
+        if is_json:
+            values = data.get('counts') or {}
+            raw_versions = data.get('versions') or {}
+            if not isinstance(values, dict) or not isinstance(raw_versions, dict):
+                return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+            versions = parse_sheet_versions(raw_versions)
+        else:
+            values = {key[len('candidate_'):]: value for key, value in data.items() if key.startswith('candidate_')}
+            versions = parse_sheet_versions(
+                {key[len('version_'):]: value for key, value in data.items() if key.startswith('version_')}
+            )
+        counts, errors = parse_sheet_counts(values) if station else ({}, [station_error or 'يرجى اختيار المحطة'])
+        if errors:
+            if is_json:
+                return JsonResponse({'success': False, 'errors': errors}, status=400)
+            for error in errors[:10]:
+                messages.error(request, error)
+        else:
+            try:
+                diff = save_station_sheet(station, vote_type, counts, request.user, expected_versions=versions)
+            except VoteCount.StaleVersion as e:
+                if is_json:
+                    return JsonResponse({'success': False, 'conflicts': e.args[0],
+                                         'error': 'تم تعديل بعض النتائج من مستخدم آخر، يرجى إعادة التحميل'}, status=409)
+                messages.error(request, f'⚠️ تم تعديل {len(e.args[0])} نتيجة من مستخدم آخر أثناء الإدخال. '
+                                        f'تم عرض القيم الحالية، يرجى المراجعة وإعادة الحفظ.')
+        if diff is not None:
+            summary = summarize_diff(diff)
+            if is_json:
+                return JsonResponse({'success': True, 'station': station.full_number, 'vote_type': vote_type,
+                                     'summary': summary, 'diff': diff})
+            messages.success(
+                request,
+                f'✅ تم حفظ ورقة المحطة {station.full_number}: '
+                f'{summary["created"]} جديد، {summary["updated"]} معدّل، {summary["unchanged"]} دون تغيير'
+            )
+
+    rows = []
+    if station:
+        current = {
+            candidate_id: (count, version)
+            for candidate_id, count, version in VoteCount.objects.filter(
+                station=station, vote_type=vote_type
+            ).values_list('candidate_id', 'vote_count', 'version')
+        }
+        changes = {row['candidate_id']: row for row in diff or []}
+        for candidate in PartyCandidate.objects.select_related('party').order_by('party__serial_number', 'serial_number'):
+            rows.append({
+                'candidate': candidate,
+                'value': current.get(candidate.pk, (None, None))[0],
+                'version': current.get(candidate.pk, (None, None))[1],
+                'change': changes.get(candidate.pk),
+            })
+
+    return render(request, 'elections/result_entry/sheet_form.html', {
+        'stations': PollingStation.objects.select_related('center').order_by('center__center_number', 'station_number'),
+        'station': station,
+        'vote_type': vote_type,
+        'vote_type_choices': VoteCount.VOTE_TYPE_CHOICES,
+        'rows': rows,
+        'summary': summarize_diff(diff) if diff is not None else None,
+    })
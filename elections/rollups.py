@@ -0,0 +1,360 @@
+"""
+صيانة جدول الإحصائيات المجمّعة للتسلسل الهرمي (HierarchyRollup)
+- تغييرات الناخبين (الأكثر تكراراً): زيادة/إنقاص ذري بـ F() على صفوف المعرف والمرتكز والمرشح والغرفة
+- تغييرات المعرفين والمرتكزات والمدراء والوكلاء (نادرة): إعادة حساب الصفوف المتأثرة فقط
+- إعادة البناء الكاملة: rebuild_rollups() / أمر rebuild_hierarchy_rollups
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import (
+    Voter, Introducer, Anchor, CenterDirector, PoliticalEntityAgent, HierarchyRollup,
+)
+
+_state = threading.local()
+
+COUNT_FIELDS = ('voters', 'supporters', 'neutral', 'opponents', 'unknown',
+                'introducers', 'anchors', 'directors', 'agents')
+
+
+@contextmanager
+def rollups_suspended():
+    """إيقاف التحديث التلقائي مؤقتاً (للعمليات الجماعية التي تعيد البناء بعدها)"""
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def _suspended():
+    return getattr(_state, 'suspended', False)
+
+
+# ==================== Targets ====================
+
+def introducer_targets(introducer_id):
+    """صفوف الإحصائيات التي يؤثر فيها ناخبو معرف معين"""
+    row = Introducer.objects.filter(pk=introducer_id).values(
+        'anchor_id', 'sub_room_id', 'anchor__candidate_id', 'anchor__party_candidate_id'
+    ).first()
+    if not row:
+        return []
+    targets = [(HierarchyRollup.SCOPE_INTRODUCER, introducer_id)]
+    if row['anchor_id']:
+        targets.append((HierarchyRollup.SCOPE_ANCHOR, row['anchor_id']))
+    if row['anchor__candidate_id']:
+        targets.append((HierarchyRollup.SCOPE_CANDIDATE, row['anchor__candidate_id']))
+    if row['anchor__party_candidate_id']:
+        targets.append((HierarchyRollup.SCOPE_PARTY_CANDIDATE, row['anchor__party_candidate_id']))
+    if row['sub_room_id']:
+        targets.append((HierarchyRollup.SCOPE_ROOM, row['sub_room_id']))
+    return targets
+
+
+def _targets_filter(targets):
+    condition = Q()
+    for scope, object_id in targets:
+        condition |= Q(scope=scope, object_id=object_id)
+    return condition
+
+
+def apply_voter_delta(introducer_id, classification, delta):
+    """تعديل عدادات الناخبين (+1 / -1) على المعرف وجميع مستوياته الأعلى باستعلام UPDATE واحد"""
+    targets = introducer_targets(introducer_id)
+    if not targets:
+        return
+    field = HierarchyRollup.classification_field(classification)
+    with transaction.atomic():
+        HierarchyRollup.objects.bulk_create(
+            [HierarchyRollup(scope=scope, object_id=object_id) for scope, object_id in targets],
+            ignore_conflicts=True,
+        )
+        HierarchyRollup.objects.filter(_targets_filter(targets)).update(
+            voters=F('voters') + delta,
+            **{field: F(field) + delta},
+        )
+
+
+# ==================== Targeted Recompute ====================
+
+def _voter_counts(queryset):
+    counts = {'voters': 0, 'supporters': 0, 'neutral': 0, 'opponents': 0, 'unknown': 0}
+    for row in queryset.values('classification').annotate(n=Count('id')).order_by():
+        counts['voters'] += row['n']
+        counts[HierarchyRollup.classification_field(row['classification'])] += row['n']
+    return counts
+
+
+def compute_rollup(scope, object_id):
+    """حساب إحصائيات كائن واحد من الجداول الأصلية"""
+    if scope == HierarchyRollup.SCOPE_INTRODUCER:
+        return _voter_counts(Voter.objects.filter(introducer_id=object_id))
+
+    if scope == HierarchyRollup.SCOPE_ANCHOR:
+        counts = _voter_counts(Voter.objects.filter(introducer__anchor_id=object_id))
+        counts['introducers'] = Introducer.objects.filter(anchor_id=object_id).count()
+        return counts
+
+    if scope in (HierarchyRollup.SCOPE_CANDIDATE, HierarchyRollup.SCOPE_PARTY_CANDIDATE):
+        field = 'candidate_id' if scope == HierarchyRollup.SCOPE_CANDIDATE else 'party_candidate_id'
+        counts = _voter_counts(Voter.objects.filter(**{f'introducer__anchor__{field}': object_id}))
+        counts['introducers'] = Introducer.objects.filter(**{f'anchor__{field}': object_id}).count()
+        counts['anchors'] = Anchor.objects.filter(**{field: object_id}).count()
+        return counts
+
+    if scope == HierarchyRollup.SCOPE_ROOM:
+        counts = _voter_counts(Voter.objects.filter(introducer__sub_room_id=object_id))
+        counts['introducers'] = Introducer.objects.filter(sub_room_id=object_id).count()
+        counts['anchors'] = Anchor.objects.filter(sub_room_id=object_id).count()
+        counts['directors'] = CenterDirector.objects.filter(sub_room_id=object_id).count()
+        counts['agents'] = PoliticalEntityAgent.objects.filter(sub_room_id=object_id).count()
+        return counts
+
+    raise ValueError(f'Unknown rollup scope: {scope}')
+
+
+def refresh_rollups(targets):
+    """إعادة حساب صفوف محددة [(scope, object_id), ...]"""
+    for scope, object_id in set(t for t in targets if t[1]):
+        values = dict.fromkeys(COUNT_FIELDS, 0)
+        values.update(compute_rollup(scope, object_id))
+        HierarchyRollup.objects.update_or_create(scope=scope, object_id=object_id, defaults=values)
+
+
+def refresh_for_introducers(introducer_ids):
+    """إعادة حساب إحصائيات معرفين ومستوياتهم الأعلى (بعد الربط الجماعي)"""
+    targets = []
+    for introducer_id in set(i for i in introducer_ids if i):
+        targets.extend(introducer_targets(introducer_id))
+    refresh_rollups(targets)
+
+
+# ==================== Full Rebuild ====================
+
+def rebuild_rollups():
+    """إعادة بناء جدول الإحصائيات بالكامل باستعلامات تجميع (GROUP BY) على كل جدول"""
+    totals = defaultdict(lambda: dict.fromkeys(COUNT_FIELDS, 0))
+
+    anchors = {
+        a['id']: a for a in Anchor.objects.values('id', 'candidate_id', 'party_candidate_id', 'sub_room_id')
+    }
+    introducers = {
+        i['id']: i for i in Introducer.objects.values('id', 'anchor_id', 'sub_room_id')
+    }
+
+    def introducer_scopes(introducer_id):
+        introducer = introducers.get(introducer_id)
+        if not introducer:
+            return []
+        keys = [(HierarchyRollup.SCOPE_INTRODUCER, introducer_id)]
+        if introducer['sub_room_id']:
+            keys.append((HierarchyRollup.SCOPE_ROOM, introducer['sub_room_id']))
+        anchor = anchors.get(introducer['anchor_id'])
+        if anchor:
+            keys.append((HierarchyRollup.SCOPE_ANCHOR, anchor['id']))
+            if anchor['candidate_id']:
+                keys.append((HierarchyRollup.SCOPE_CANDIDATE, anchor['candidate_id']))
+            if anchor['party_candidate_id']:
+                keys.append((HierarchyRollup.SCOPE_PARTY_CANDIDATE, anchor['party_candidate_id']))
+        return keys
+
+    # الناخبون: تجميع واحد حسب المعرف والتصنيف
+    voter_rows = (
+        Voter.objects.filter(introducer__isnull=False)
+        .values('introducer_id', 'classification').annotate(n=Count('id')).order_by()
+    )
+    for row in voter_rows:
+        field = HierarchyRollup.classification_field(row['classification'])
+        for key in introducer_scopes(row['introducer_id']):
+            totals[key]['voters'] += row['n']
+            totals[key][field] += row['n']
+
+    # المعرفون
+    for introducer_id in introducers:
+        for key in introducer_scopes(introducer_id):
+            if key[0] != HierarchyRollup.SCOPE_INTRODUCER:
+                totals[key]['introducers'] += 1
+
+    # المرتكزات
+    for anchor in anchors.values():
+        if anchor['candidate_id']:
+            totals[(HierarchyRollup.SCOPE_CANDIDATE, anchor['candidate_id'])]['anchors'] += 1
+        if anchor['party_candidate_id']:
+            totals[(HierarchyRollup.SCOPE_PARTY_CANDIDATE, anchor['party_candidate_id'])]['anchors'] += 1
+        if anchor['sub_room_id']:
+            totals[(HierarchyRollup.SCOPE_ROOM, anchor['sub_room_id'])]['anchors'] += 1
+
+    # مدراء المراكز ووكلاء الكيان
+    for model, field in ((CenterDirector, 'directors'), (PoliticalEntityAgent, 'agents')):
+        rows = model.objects.filter(sub_room__isnull=False).values('sub_room_id').annotate(n=Count('id')).order_by()
+        for row in rows:
+            totals[(HierarchyRollup.SCOPE_ROOM, row['sub_room_id'])][field] += row['n']
+
+    with transaction.atomic():
+        HierarchyRollup.objects.all().delete()
+        HierarchyRollup.objects.bulk_create(
+            [HierarchyRollup(scope=scope, object_id=object_id, **values)
+             for (scope, object_id), values in totals.items()],
+            batch_size=1000,
+        )
+    return len(totals)
+
+
+# ==================== Signals ====================
+
+def _previous_values(sender, instance, fields):
+    if not instance.pk:
+        return None
+    return sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+@receiver(pre_save, sender=Voter)
+def voter_rollup_pre_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or _suspended():
+        return
+    if update_fields is not None and not {'introducer', 'classification'} & set(update_fields):
+        instance._rollup_previous = False
+        return
+    instance._rollup_previous = _previous_values(sender, instance, ('introducer_id', 'classification'))
+
+
+@receiver(post_save, sender=Voter)
+def voter_rollup_post_save(sender, instance, raw=False, **kwargs):
+    if raw or _suspended():
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous is False:
+        return
+    current = {'introducer_id': instance.introducer_id, 'classification': instance.classification}
+    if previous == current:
+        return
+    if previous and previous['introducer_id']:
+        apply_voter_delta(previous['introducer_id'], previous['classification'], -1)
+    if current['introducer_id']:
+        apply_voter_delta(current['introducer_id'], current['classification'], 1)
+
+
+@receiver(post_delete, sender=Voter)
+def voter_rollup_post_delete(sender, instance, **kwargs):
+    if _suspended() or not instance.introducer_id:
+        return
+    apply_voter_delta(instance.introducer_id, instance.classification, -1)
+
+
+@receiver(pre_save, sender=Introducer)
+def introducer_rollup_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or _suspended():
+        return
+    instance._rollup_previous = _previous_values(sender, instance, ('anchor_id', 'sub_room_id'))
+
+
+@receiver(post_save, sender=Introducer)
+def introducer_rollup_post_save(sender, instance, raw=False, created=False, **kwargs):
+    if raw or _suspended():
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    if not created and previous == {'anchor_id': instance.anchor_id, 'sub_room_id': instance.sub_room_id}:
+        return
+    targets = introducer_targets(instance.pk)
+    if previous:
+        targets += _anchor_targets(previous['anchor_id'])
+        targets.append((HierarchyRollup.SCOPE_ROOM, previous['sub_room_id']))
+    refresh_rollups(targets)
+
+
+@receiver(post_delete, sender=Introducer)
+def introducer_rollup_post_delete(sender, instance, **kwargs):
+    if _suspended():
+        return
+    HierarchyRollup.objects.filter(scope=HierarchyRollup.SCOPE_INTRODUCER, object_id=instance.pk).delete()
+    targets = _anchor_targets(instance.anchor_id)
+    targets.append((HierarchyRollup.SCOPE_ROOM, instance.sub_room_id))
+    refresh_rollups(targets)
+
+
+def _anchor_targets(anchor_id, values=None):
+    """المرتكز ومرشحه وغرفته"""
+    if values is None:
+        values = Anchor.objects.filter(pk=anchor_id).values(
+            'candidate_id', 'party_candidate_id', 'sub_room_id'
+        ).first()
+    if not anchor_id or not values:
+        return []
+    return [
+        (HierarchyRollup.SCOPE_ANCHOR, anchor_id),
+        (HierarchyRollup.SCOPE_CANDIDATE, values['candidate_id']),
+        (HierarchyRollup.SCOPE_PARTY_CANDIDATE, values['party_candidate_id']),
+        (HierarchyRollup.SCOPE_ROOM, values['sub_room_id']),
+    ]
+
+
+_ANCHOR_FIELDS = ('candidate_id', 'party_candidate_id', 'sub_room_id')
+
+
+@receiver(pre_save, sender=Anchor)
+def anchor_rollup_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or _suspended():
+        return
+    instance._rollup_previous = _previous_values(sender, instance, _ANCHOR_FIELDS)
+
+
+@receiver(post_save, sender=Anchor)
+def anchor_rollup_post_save(sender, instance, raw=False, created=False, **kwargs):
+    if raw or _suspended():
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    current = {field: getattr(instance, field) for field in _ANCHOR_FIELDS}
+    if not created and previous == current:
+        return
+    targets = _anchor_targets(instance.pk, current)
+    if previous:
+        targets += _anchor_targets(instance.pk, previous)
+    refresh_rollups(targets)
+
+
+@receiver(post_delete, sender=Anchor)
+def anchor_rollup_post_delete(sender, instance, **kwargs):
+    if _suspended():
+        return
+    HierarchyRollup.objects.filter(scope=HierarchyRollup.SCOPE_ANCHOR, object_id=instance.pk).delete()
+    current = {field: getattr(instance, field) for field in _ANCHOR_FIELDS}
+    refresh_rollups(t for t in _anchor_targets(instance.pk, current) if t[0] != HierarchyRollup.SCOPE_ANCHOR)
+
+
+@receiver(pre_save, sender=CenterDirector)
+@receiver(pre_save, sender=PoliticalEntityAgent)
+def room_member_rollup_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or _suspended():
+        return
+    previous = _previous_values(sender, instance, ('sub_room_id',))
+    instance._rollup_previous_room = previous['sub_room_id'] if previous else None
+
+
+@receiver(post_save, sender=CenterDirector)
+@receiver(post_save, sender=PoliticalEntityAgent)
+def room_member_rollup_post_save(sender, instance, raw=False, created=False, **kwargs):
+    if raw or _suspended():
+        return
+    previous_room = getattr(instance, '_rollup_previous_room', None)
+    if not created and previous_room == instance.sub_room_id:
+        return
+    refresh_rollups([
+        (HierarchyRollup.SCOPE_ROOM, previous_room),
+        (HierarchyRollup.SCOPE_ROOM, instance.sub_room_id),
+    ])
+
+
+@receiver(post_delete, sender=CenterDirector)
+@receiver(post_delete, sender=PoliticalEntityAgent)
+def room_member_rollup_post_delete(sender, instance, **kwargs):
+    if _suspended():
+        return
+    refresh_rollups([(HierarchyRollup.SCOPE_ROOM, instance.sub_room_id)])
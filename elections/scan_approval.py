@@ -0,0 +1,131 @@
+"""
+الموافقة على مسحات الباركود المتحقق منها ومعالجتها دفعات (صفحة الجلسة وأمر approve_scans)
+لكل دفعة في معاملة واحدة: قفل المسحات، حل معرفات المرشحين من الخريطة في الذاكرة مرة واحدة،
+قراءة الأصوات الحالية لمحطاتها، ثم جملة upsert واحدة لـ VoteCount وتحديث المجاميع بالفروقات،
+وجملة واحدة لحالات المسحات وأخرى لمحطاتها
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .candidate_resolver import candidate_resolver
+from .models import BarcodeScanRecord, PollingStation, VoteCount
+from .scan_stats import count_processed
+from .search import normalize_digits
+from .tallies import apply_tally_deltas
+
+# عدد المسحات في كل معاملة
+APPROVAL_BATCH = 200
+
+SKIP_MISSING = 'المسح غير موجود'
+SKIP_NOT_VALIDATED = 'لا يمكن معالجة هذا المسح. يجب أن تكون الحالة "تم التحقق"'
+SKIP_NO_STATION = 'لا يمكن المعالجة. المحطة غير مربوطة في قاعدة البيانات'
+
+
+def approve_scans(scan_ids, user=None, batch_size=APPROVAL_BATCH, progress=None):
+    """
+    معالجة المسحات المتحقق منها من بين scan_ids؛ progress(done, total) اختيارية
+    يعيد {'approved': [ids], 'skipped': {id: السبب}, 'created', 'updated', 'unchanged', 'unknown_candidates'}
+    """
+    scan_ids = list(dict.fromkeys(int(pk) for pk in scan_ids))
+    summary = {'approved': [], 'skipped': {}, 'created': 0, 'updated': 0, 'unchanged': 0, 'unknown_candidates': 0}
+    for start in range(0, len(scan_ids), batch_size):
+        _approve_batch(scan_ids[start:start + batch_size], user, summary)
+        if progress:
+            progress(min(start + batch_size, len(scan_ids)), len(scan_ids))
+    return summary
+
+
+def _sheet_rows(scans, summary):
+    """{(المحطة، المرشح، نوع التصويت): (العدد، المسح)}؛ عند تكرار المحطة في الدفعة يُعتمد آخر مسح"""
+    resolved = candidate_resolver.resolve_many(
+        key for scan in scans for key in (scan.vote_data or {})
+    )
+    rows = {}
+    for scan in scans:
+        for key, value in (scan.vote_data or {}).items():
+            candidate_id = resolved.get(normalize_digits(str(key)))
+            try:
+                count = int(value)
+            except (TypeError, ValueError):
+                count = -1
+            if candidate_id is None or count < 0:
+                summary['unknown_candidates'] += 1
+                continue
+            rows[(scan.polling_station_id, candidate_id, scan.vote_type or scan.session.vote_type)] = (count, scan)
+    return rows
+
+
+def _approve_batch(ids, user, summary):
+    now = timezone.now()
+    with transaction.atomic():
+        scans = list(
+            BarcodeScanRecord.objects.select_for_update(of=('self',)).select_related('session')
+            .filter(pk__in=ids).order_by('scanned_at', 'pk')
+        )
+        found = {scan.pk for scan in scans}
+        summary['skipped'].update({pk: SKIP_MISSING for pk in ids if pk not in found})
+        ready = []
+        for scan in scans:
+            if scan.status != 'validated':
+                summary['skipped'][scan.pk] = SKIP_NOT_VALIDATED
+            elif not scan.polling_station_id:
+                summary['skipped'][scan.pk] = SKIP_NO_STATION
+            else:
+                ready.append(scan)
+        if not ready:
+            return
+
+        # قفل المحطات يمنع إدخالاً متزامناً لنفس المحطة من حساب الفروقات على نفس القيم القديمة
+        stations = {
+            station.pk: station for station in PollingStation.objects.select_for_update().filter(
+                pk__in={scan.polling_station_id for scan in ready}
+            ).only('pk', 'counting_status', 'valid_votes', 'invalid_votes').order_by('pk')
+        }
+        sheet = _sheet_rows(ready, summary)
+        existing = {
+            (station_id, candidate_id, vote_type): (count, version)
+            for station_id, candidate_id, vote_type, count, version in VoteCount.objects.filter(
+                station_id__in=stations, candidate_id__in={key[1] for key in sheet}
+            ).values_list('station_id', 'candidate_id', 'vote_type', 'vote_count', 'version')
+        }
+
+        rows, deltas = [], []
+        for (station_id, candidate_id, vote_type), (new, scan) in sheet.items():
+            old, version = existing.get((station_id, candidate_id, vote_type), (None, 0))
+            if old is None and new == 0:
+                continue
+            if old == new:
+                summary['unchanged'] += 1
+                continue
+            rows.append(VoteCount(
+                station_id=station_id, candidate_id=candidate_id, vote_type=vote_type, vote_count=new,
+                entered_by=user, version=version + 1,
+                notes=f'تم الإدخال عبر مسح الباركود - جلسة: {scan.session.session_code}',
+            ))
+            deltas.append((station_id, candidate_id, vote_type, new - (old or 0), 0 if old is not None else 1))
+            summary['created' if old is None else 'updated'] += 1
+
+        if rows:
+            VoteCount.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['station', 'candidate', 'vote_type'],
+                update_fields=['vote_count', 'entered_by', 'notes', 'updated_at', 'version'],
+                batch_size=500,
+            )
+            apply_tally_deltas(deltas)
+
+        for scan in ready:
+            station = stations[scan.polling_station_id]
+            station.counting_status = 'completed'
+            station.valid_votes = scan.valid_votes or 0
+            station.invalid_votes = scan.invalid_votes or 0
+            station.updated_at = now
+        PollingStation.objects.bulk_update(
+            stations.values(), ['counting_status', 'valid_votes', 'invalid_votes', 'updated_at']
+        )
+        BarcodeScanRecord.objects.filter(pk__in=[scan.pk for scan in ready]).update(
+            status='processed', is_processed=True, processed_at=now, processed_by=user
+        )
+        count_processed(ready)
+    summary['approved'].extend(scan.pk for scan in ready)
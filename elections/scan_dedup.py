@@ -0,0 +1,108 @@
+"""
+منع تكرار مسح المحطة بجدول مفاتيح ScanDedupKey: صف واحد لكل (رقم المركز، رقم المحطة، نوع التصويت) بفهرس فريد
+المسح الذي يتم التحقق منه يحجز مفتاح محطته بإدراج واحد، وتعارض الإدراج يعني أن المحطة مُسحت مسبقاً؛
+فلا يبحث الكشف في سجلات المسح، ولا يستطيع ماسحان متزامنان تسجيل نفس المحطة مرتين
+"""
+from django.db import IntegrityError, transaction
+
+from .models import ScanDedupKey
+from .polling_directory import normalize_number, polling_directory
+
+
+class DuplicateScan(Exception):
+    """المحطة محجوزة لمسح آخر؛ claim هو مفتاح ذلك المسح"""
+
+    def __init__(self, claim):
+        super().__init__(str(claim))
+        self.claim = claim
+
+
+def scan_key(center_number, station_number, vote_type):
+    """المفتاح المطبّع: أرقام لاتينية، ورقم المحطة دون أصفار بادئة"""
+    station = normalize_number(station_number)
+    if station.isdigit():
+        station = str(int(station))
+    return normalize_number(center_number), station, vote_type or 'general'
+
+
+def record_key(record):
+    """مفتاح سجل مسح؛ رقم المركز المربوط يُفضّل على المقروء (رموز QR ذات 8 أرقام)"""
+    center_number = record.polling_center.center_number if record.polling_center_id else record.center_number
+    return scan_key(center_number, record.station_number, record.vote_type)
+
+
+def _claim_for(record, key):
+    return ScanDedupKey(center_number=key[0], station_number=key[1], vote_type=key[2], scan=record)
+
+
+def _claims_query():
+    return ScanDedupKey.objects.select_related('scan__session', 'scan__operator')
+
+
+def find_claims(keys):
+    """المفاتيح المحجوزة من بين keys باستعلام واحد: {المفتاح: ScanDedupKey}"""
+    keys = set(keys)
+    if not keys:
+        return {}
+    claims = _claims_query().filter(
+        center_number__in={key[0] for key in keys},
+        station_number__in={key[1] for key in keys},
+        vote_type__in={key[2] for key in keys},
+    )
+    found = {}
+    for claim in claims:
+        key = (claim.center_number, claim.station_number, claim.vote_type)
+        if key in keys:
+            found[key] = claim
+    return found
+
+
+def find_claim(center_number, station_number, vote_type=None):
+    """مفتاح المحطة المحجوز (لأي نوع تصويت إن لم يُحدد) أو None"""
+    center = polling_directory.find_center(center_number)
+    center_number, station_number, _ = scan_key(
+        center.center_number if center else center_number, station_number, vote_type
+    )
+    claims = _claims_query().filter(center_number=center_number, station_number=station_number)
+    if vote_type:
+        claims = claims.filter(vote_type=vote_type)
+    return claims.order_by('claimed_at').first()
+
+
+def claim_scan_key(record):
+    """
+    حجز مفتاح محطة سجل محفوظ بإدراج واحد؛ يرفع DuplicateScan إن كانت محجوزة لمسح آخر
+    (يُستدعى داخل معاملة حفظ السجل لتُلغى مع الاستثناء)
+    """
+    key = record_key(record)
+    try:
+        with transaction.atomic():
+            _claim_for(record, key).save(force_insert=True)
+    except IntegrityError:
+        claim = find_claims([key]).get(key)
+        if claim is None:
+            raise
+        raise DuplicateScan(claim)
+
+
+def claim_scan_keys(records):
+    """
+    حجز مفاتيح سجلات محفوظة معاً: إدراج واحد يتجاهل التعارض ثم قراءة واحدة لمالكي المفاتيح
+    يعيد {رقم السجل: مفتاح المسح الآخر} للسجلات التي سبقها مسح آخر إلى محطتها
+    """
+    keys = {record.pk: record_key(record) for record in records}
+    if not keys:
+        return {}
+    ScanDedupKey.objects.bulk_create(
+        [_claim_for(record, keys[record.pk]) for record in records], ignore_conflicts=True
+    )
+    owners = find_claims(keys.values())
+    return {
+        pk: owners[key] for pk, key in keys.items()
+        if key in owners and owners[key].scan_id != pk
+    }
+
+
+def release_scan_keys(scans):
+    """تحرير مفاتيح مسحات رُفضت أو أعيدت للمعالجة (قائمة أو QuerySet)"""
+    return ScanDedupKey.objects.filter(scan__in=scans).delete()[0]
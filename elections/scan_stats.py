@@ -0,0 +1,79 @@
+"""
+عدادات مسح الباركود: عدادات الجلسة (BarcodeScanSession) وعدادات يوم المُشغِّل (ScanOperatorDay)
+تُزاد بتعبيرات F() في معاملة المسح نفسها، فلا تضيع زيادة بين طلبين متزامنين،
+وتُقرأ الإحصائيات من هذه العدادات بدل عدّ سجلات المسح
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import BarcodeScanSession, ScanOperatorDay
+
+SESSION_COUNTERS = ('total_scans', 'successful_scans', 'failed_scans', 'duplicate_scans')
+DAY_COUNTERS = ('sessions',) + SESSION_COUNTERS + ('processed_scans',)
+
+
+def _increments(counts):
+    return {field: F(field) + value for field, value in counts.items() if value}
+
+
+def add_operator_day(operator_id, date=None, **counts):
+    """زيادة عدادات يوم المُشغِّل (ينشئ صف اليوم عند أول زيادة)"""
+    increments = _increments(counts)
+    if not operator_id or not increments:
+        return
+    rows = ScanOperatorDay.objects.filter(operator_id=operator_id, date=date or timezone.localdate())
+    if rows.update(**increments, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            ScanOperatorDay.objects.create(operator_id=operator_id, date=date or timezone.localdate(), **counts)
+    except IntegrityError:
+        # أنشأه طلب متزامن
+        rows.update(**increments, updated_at=timezone.now())
+
+
+def count_scans(session, validated=0, error=0, duplicate=0):
+    """زيادة عدادات الجلسة ويوم مُشغِّلها بنتائج مسح أو دفعة مسحات"""
+    counts = {
+        'total_scans': validated + error + duplicate,
+        'successful_scans': validated,
+        'failed_scans': error,
+        'duplicate_scans': duplicate,
+    }
+    with transaction.atomic():
+        BarcodeScanSession.objects.filter(pk=session.pk).update(**_increments(counts))
+        add_operator_day(session.operator_id, **counts)
+    session.refresh_from_db(fields=SESSION_COUNTERS)
+
+
+def count_session_started(session):
+    add_operator_day(session.operator_id, sessions=1)
+
+
+def count_processed(scans):
+    """زيادة المسحات المعالجة اليوم لمُشغِّلي المسحات (مُشغِّل كل مسح، لا من وافق عليه)"""
+    per_operator = {}
+    for scan in scans:
+        per_operator[scan.operator_id] = per_operator.get(scan.operator_id, 0) + 1
+    for operator_id, processed in per_operator.items():
+        add_operator_day(operator_id, processed_scans=processed)
+
+
+def session_stats(session):
+    return {
+        'total_scans': session.total_scans,
+        'successful': session.successful_scans,
+        'failed': session.failed_scans,
+        'duplicates': session.duplicate_scans,
+        'success_rate': session.get_success_rate(),
+    }
+
+
+def operator_stats(user, date=None):
+    """مجاميع عدادات المُشغِّل (ليوم واحد إن حُدد) باستعلام واحد على صفوف أيامه"""
+    days = ScanOperatorDay.objects.filter(operator=user)
+    if date:
+        days = days.filter(date=date)
+    totals = days.aggregate(**{field: Sum(field) for field in DAY_COUNTERS})
+    return {field: totals[field] or 0 for field in DAY_COUNTERS}
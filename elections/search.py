@@ -0,0 +1,239 @@
+"""
+محرك البحث في سجل الناخبين
+تطبيع النصوص العربية + فهرس FTS5 على SQLite وفهرس Trigram (GIN) على PostgreSQL
+"""
+import re
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models.expressions import RawSQL
+
+
+# ==================== Arabic Normalization ====================
+
+# الأرقام العربية والفارسية -> الأرقام اللاتينية
+_DIGITS = {
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+    '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4',
+    '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9',
+}
+
+# توحيد أشكال الحروف
+_LETTERS = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    'ئ': 'ي', 'ى': 'ي', 'ی': 'ي',
+    'ة': 'ه',
+    'ک': 'ك',
+}
+
+_TRANSLATION = str.maketrans({**_DIGITS, **_LETTERS})
+
+# التشكيل والتطويل
+_DIACRITICS_RE = re.compile('[\u0640\u064B-\u065F\u0670\u06D6-\u06ED]')
+_SPACES_RE = re.compile(r'\s+')
+
+# الحقول التي يغطيها البحث
+VOTER_SEARCH_FIELDS = ('voter_number', 'full_name', 'phone')
+
+# أقصر مقطع يستطيع فهرس الـ trigram مطابقته
+MIN_TRIGRAM_LENGTH = 3
+
+
+def normalize_digits(value):
+    """تحويل الأرقام العربية/الفارسية إلى لاتينية وإزالة المسافات الطرفية"""
+    if not value:
+        return ''
+    return str(value).translate(str.maketrans(_DIGITS)).strip()
+
+
+def normalize_arabic(value):
+    """تطبيع النص العربي للبحث: توحيد الألف والياء والتاء المربوطة والأرقام وحذف التشكيل"""
+    if not value:
+        return ''
+    text = _DIACRITICS_RE.sub('', str(value))
+    text = text.translate(_TRANSLATION).lower()
+    return _SPACES_RE.sub(' ', text).strip()
+
+
+def build_voter_search_text(voter):
+    """بناء عمود البحث المطبّع للناخب (كائن Voter أو قاموس بيانات)"""
+    if isinstance(voter, dict):
+        parts = (voter.get(field) for field in VOTER_SEARCH_FIELDS)
+    else:
+        parts = (getattr(voter, field, '') for field in VOTER_SEARCH_FIELDS)
+    return normalize_arabic(' '.join(str(p) for p in parts if p))
+
+
+# ==================== Backend DDL ====================
+
+FTS_TABLE = 'elections_voter_fts'
+
+_SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        search_text, content='elections_voter', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON elections_voter BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON elections_voter BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_text ON elections_voter BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END""",
+]
+
+_SQLITE_DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+_POSTGRES_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS voter_search_trgm_idx ON elections_voter "
+    "USING gin (search_text gin_trgm_ops)",
+]
+
+_POSTGRES_DROP_SQL = [
+    "DROP INDEX IF EXISTS voter_search_trgm_idx",
+]
+
+_SQLITE_TRIGGERS = {f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au'}
+
+# مقسّم tokenize='trigram' في FTS5 متاح منذ SQLite 3.34
+MIN_SQLITE_TRIGRAM = (3, 34, 0)
+
+# حالة توفر FTS5 لكل اتصال (تُحسب مرة واحدة لكل عملية)
+_fts_available = {}
+
+
+def install_search_backend(connection, rebuild=False):
+    """
+    إنشاء فهرس البحث المناسب لنوع قاعدة البيانات (آمن للتكرار)
+    يعيد False إذا لم يدعم SQLite فهرس FTS5/trigram، فيبقى البحث على search_text بـ LIKE
+    """
+    if connection.vendor == 'sqlite':
+        if connection.Database.sqlite_version_info < MIN_SQLITE_TRIGRAM:
+            _fts_available[connection.alias] = False
+            return False
+        try:
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                for sql in _SQLITE_FTS_SQL:
+                    cursor.execute(sql)
+                if rebuild:
+                    cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        except DatabaseError:
+            # SQLite مبني دون FTS5
+            _fts_available[connection.alias] = False
+            return False
+        _fts_available.pop(connection.alias, None)
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for sql in _POSTGRES_SQL:
+                cursor.execute(sql)
+    return True
+
+
+def uninstall_search_backend(connection):
+    """حذف فهرس البحث"""
+    statements = {
+        'sqlite': _SQLITE_DROP_SQL,
+        'postgresql': _POSTGRES_DROP_SQL,
+    }.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+    _fts_available.pop(connection.alias, None)
+
+
+def _sqlite_fts_ready(connection):
+    """
+    التحقق من وجود جدول FTS5 ومشغلاته (مع التخزين المؤقت)
+    إعادة بناء الجدول في ترحيلات SQLite (_remake_table) تحذف المشغلات فيتقادم الفهرس بصمت؛
+    عندها تُعاد المشغلات ويُعاد بناء الفهرس، وإن تعذر ذلك يعود البحث إلى LIKE
+    """
+    if connection.alias not in _fts_available:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE (type = 'table' AND name = %s) "
+                "OR (type = 'trigger' AND tbl_name = 'elections_voter')",
+                [FTS_TABLE],
+            )
+            names = {row[0] for row in cursor.fetchall()}
+        if FTS_TABLE not in names:
+            _fts_available[connection.alias] = False
+        elif not _SQLITE_TRIGGERS <= names:
+            _fts_available[connection.alias] = install_search_backend(connection, rebuild=True)
+        else:
+            _fts_available[connection.alias] = True
+    return _fts_available[connection.alias]
+
+
+# ==================== Query Layer ====================
+
+def _fts_phrase(token):
+    return '"' + token.replace('"', '""') + '"'
+
+
+def search_voters(queryset, query):
+    """
+    تصفية queryset الناخبين حسب نص البحث
+    كل كلمة في البحث يجب أن تظهر (بداية أو جزء من) رقم الناخب أو الاسم أو الهاتف
+    """
+    term = normalize_arabic(query)
+    if not term:
+        return queryset
+
+    tokens = term.split(' ')
+    connection = connections[queryset.db]
+
+    if connection.vendor == 'sqlite' and _sqlite_fts_ready(connection):
+        long_tokens = [t for t in tokens if len(t) >= MIN_TRIGRAM_LENGTH]
+        if long_tokens:
+            match = ' AND '.join(_fts_phrase(t) for t in long_tokens)
+            queryset = queryset.filter(pk__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+            ))
+        # المقاطع القصيرة لا يطابقها الـ trigram
+        for token in tokens:
+            if len(token) < MIN_TRIGRAM_LENGTH:
+                queryset = queryset.filter(search_text__contains=token)
+        return queryset
+
+    # PostgreSQL: LIKE '%token%' يستخدم فهرس gin_trgm_ops
+    for token in tokens:
+        queryset = queryset.filter(search_text__contains=token)
+    return queryset
+
+
+def refresh_voter_search_text(queryset, batch_size=5000, only_missing=False):
+    """إعادة حساب عمود البحث لمجموعة من الناخبين على دفعات، وإرجاع عدد السجلات المحدثة"""
+    from .models import Voter
+
+    if only_missing:
+        queryset = queryset.filter(search_text='')
+
+    updated = 0
+    last_pk = 0
+    fields = VOTER_SEARCH_FIELDS + ('search_text',)
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk').only(*fields)[:batch_size]
+        )
+        if not rows:
+            break
+        changed = []
+        for voter in rows:
+            text = build_voter_search_text(voter)
+            if text != voter.search_text:
+                voter.search_text = text
+                changed.append(voter)
+        if changed:
+            Voter.objects.bulk_update(changed, ['search_text'], batch_size=1000)
+            updated += len(changed)
+        last_pk = rows[-1].pk
+    return updated
@@ -0,0 +1,231 @@
+"""
+محرك توزيع المقاعد بطريقة سانت ليغو المعدلة (القاسم الأول قابل للتعديل ثم 3، 5، 7...)
+يعمل على جدول المجاميع الحي (VoteTally) ويحسب مئات السيناريوهات (قاسم أول / عتبة / عدد مقاعد)
+دفعة واحدة بمصفوفة نواتج القسمة في NumPy: [سيناريو × كيان × ترتيب القاسم]
+النتائج تُخزن مؤقتاً حسب آخر حدث في VoteTallyEvent، فلا يُعاد الحساب حتى تتغير الأصوات
+"""
+import hashlib
+import itertools
+import json
+
+import numpy as np
+from django.core.cache import cache
+
+from .models import PartyCandidate, PoliticalParty, VoteTally, VoteTallyEvent
+from .tallies import with_tallies
+
+# القاسم الأول المعتمد في العراق (سانت ليغو المعدل)
+DEFAULT_FIRST_DIVISOR = 1.7
+
+DEFAULT_SEATS = 25
+
+# الحد الأقصى لعدد السيناريوهات في طلب واحد
+MAX_SCENARIOS = 1000
+
+MAX_SEATS = 500
+
+# الحد الأقصى لعدد الكيانات المدخلة يدوياً (POST)
+MAX_PARTIES = 500
+
+# أكبر مصفوفة نواتج قسمة [سيناريو × كيان × ترتيب القاسم] في استدعاء واحد لـ allocate_scenarios
+# (8 بايت للخلية، والترتيب ينسخها): السيناريوهات الأكثر تُحسب على دفعات
+ALLOCATION_CELLS = 4_000_000
+
+# مدة التخزين المؤقت للنتائج (ثوانٍ)؛ المفتاح يتضمن رقم نسخة المجاميع
+CACHE_TIMEOUT = 600
+
+VOTE_FIELDS = {
+    'all': ('general_votes', 'special_votes'),
+    'general': ('general_votes',),
+    'special': ('special_votes',),
+}
+
+
+def divisor_series(first_divisor, count):
+    """القواسم: first_divisor ثم 3، 5، 7..."""
+    divisors = np.arange(count, dtype=float) * 2 + 1
+    divisors[0] = first_divisor
+    return divisors
+
+
+def allocate_scenarios(votes, seats, first_divisors, thresholds):
+    """
+    توزيع المقاعد لعدة سيناريوهات دفعة واحدة
+    votes: أصوات الكيانات (متجه مشترك، أو مصفوفة [سيناريو × كيان] لأصوات مختلفة في كل سيناريو)
+    seats / first_divisors / thresholds: مصفوفات بطول عدد السيناريوهات
+    (العتبة نسبة من مجموع الأصوات، مثلاً 0.05). تعيد (مقاعد [سيناريو × كيان]، آخر ناتج فائز، هل كُسر تعادل)
+    التعادل على آخر مقعد يُحسم لصالح الكيان الأكثر أصواتاً ثم الأسبق في الترتيب
+    """
+    seats = np.asarray(seats, dtype=int)
+    first_divisors = np.asarray(first_divisors, dtype=float)
+    thresholds = np.asarray(thresholds, dtype=float)
+    scenario_count = len(seats)
+    votes = np.asarray(votes, dtype=float)
+    votes = np.broadcast_to(votes, (scenario_count, votes.shape[-1]))
+    party_count = votes.shape[1]
+    if party_count == 0 or scenario_count == 0:
+        return np.zeros((scenario_count, party_count), dtype=int), np.zeros(scenario_count), np.zeros(scenario_count, bool)
+
+    depth = max(int(seats.max()), 1)
+    divisors = np.tile(divisor_series(1.0, depth), (scenario_count, 1))
+    divisors[:, 0] = first_divisors
+
+    # [سيناريو × كيان × ترتيب القاسم]؛ الكيانات تحت العتبة تأخذ -1 فلا تفوز بأي مقعد
+    quotients = votes[:, :, None] / divisors[:, None, :]
+    eligible = (votes > 0) & (votes >= thresholds[:, None] * votes.sum(axis=1, keepdims=True))
+    quotients = np.where(eligible[:, :, None], quotients, -1.0)
+
+    # ناتج القسمة للمقعد الأخير في كل سيناريو (المقاعد تختلف بين السيناريوهات، لذا ترتيب كامل)
+    flat = quotients.reshape(scenario_count, -1)
+    ranked = -np.sort(-flat, axis=1)
+    cut = ranked[np.arange(scenario_count), np.minimum(seats, flat.shape[1]) - 1]
+    cut = np.where(cut > 0, cut, np.inf)  # لا كيان مؤهل: لا مقاعد
+
+    above = (quotients > cut[:, None, None]).sum(axis=2)
+    tied = (quotients == cut[:, None, None]).sum(axis=2)
+    remaining = seats - above.sum(axis=1)
+
+    # توزيع المقاعد المتعادلة بالترتيب: الأكثر أصواتاً أولاً ثم الأسبق
+    index = np.broadcast_to(np.arange(party_count), votes.shape)
+    order = np.lexsort((index, -votes), axis=1)
+    tied_ordered = np.take_along_axis(tied, order, axis=1)
+    before = np.cumsum(tied_ordered, axis=1) - tied_ordered
+    granted = np.clip(remaining[:, None] - before, 0, tied_ordered)
+    allocated_ties = np.empty_like(granted)
+    np.put_along_axis(allocated_ties, order, granted, axis=1)
+
+    tie_break = tied.sum(axis=1) > remaining
+    return above + allocated_ties, np.where(np.isfinite(cut), cut, 0.0), tie_break
+
+
+def allocate_in_batches(votes, seats, first_divisors, thresholds):
+    """
+    allocate_scenarios على دفعات لا تتجاوز نواتجها ALLOCATION_CELLS خلية
+    السيناريوهات تُرتب حسب عدد المقاعد فتكون أعماق القواسم في كل دفعة متقاربة
+    """
+    seats = np.asarray(seats, dtype=int)
+    first_divisors = np.asarray(first_divisors, dtype=float)
+    thresholds = np.asarray(thresholds, dtype=float)
+    votes = np.asarray(votes, dtype=float)
+    scenario_count, party_count = len(seats), votes.shape[-1]
+    allocation = np.zeros((scenario_count, party_count), dtype=int)
+    last_quotients = np.zeros(scenario_count)
+    tie_breaks = np.zeros(scenario_count, dtype=bool)
+
+    order = np.argsort(seats, kind='stable')
+    start = 0
+    while start < scenario_count:
+        end = start + 1
+        while end < scenario_count and (end + 1 - start) * party_count * max(seats[order[end]], 1) <= ALLOCATION_CELLS:
+            end += 1
+        batch = order[start:end]
+        allocation[batch], last_quotients[batch], tie_breaks[batch] = allocate_scenarios(
+            votes if votes.ndim == 1 else votes[batch], seats[batch], first_divisors[batch], thresholds[batch]
+        )
+        start = end
+    return allocation, last_quotients, tie_breaks
+
+
+def tally_version():
+    """رقم نسخة المجاميع: معرف آخر حدث تغيير"""
+    return VoteTallyEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def live_party_votes(vote_type='all'):
+    """أصوات الكيانات من جدول المجاميع الحي"""
+    fields = VOTE_FIELDS[vote_type]
+    parties = []
+    for party in with_tallies(PoliticalParty.objects.all(), VoteTally.SCOPE_PARTY).order_by('serial_number'):
+        parties.append({
+            'id': party.pk,
+            'name': party.name,
+            'serial_number': party.serial_number,
+            'color': party.color,
+            'votes': sum(getattr(party, field) or 0 for field in fields),
+        })
+    return parties
+
+
+def party_winners(party_seats, vote_type='all'):
+    """المرشحون الفائزون: أعلى المرشحين أصواتاً داخل كل كيان بعدد مقاعده {party_id: مقاعد}"""
+    fields = VOTE_FIELDS[vote_type]
+    winners = {}
+    candidates = with_tallies(
+        PartyCandidate.objects.filter(party_id__in=[pid for pid, n in party_seats.items() if n > 0]),
+        VoteTally.SCOPE_CANDIDATE,
+    ).order_by('party_id', 'serial_number')
+    for candidate in candidates:
+        votes = sum(getattr(candidate, field) or 0 for field in fields)
+        winners.setdefault(candidate.party_id, []).append({
+            'id': candidate.pk, 'name': candidate.full_name, 'serial_number': candidate.serial_number, 'votes': votes,
+        })
+    for party_id, rows in winners.items():
+        rows.sort(key=lambda row: (-row['votes'], row['serial_number']))
+        winners[party_id] = rows[:party_seats[party_id]]
+    return winners
+
+
+def evaluate(seats_options, first_divisors, thresholds, reserved_seats=0, vote_type='all', parties=None):
+    """
+    تقييم كل تركيبات (عدد المقاعد × القاسم الأول × العتبة)؛ المقاعد المحجوزة (الكوتا) تُطرح قبل التوزيع
+    parties: قائمة [{'name', 'votes'}] يدوية، وإلا تُقرأ أصوات الكيانات من جدول المجاميع (مع تخزين مؤقت)
+    """
+    scenarios = list(itertools.product(seats_options, first_divisors, thresholds))
+    if not scenarios:
+        raise ValueError('لا توجد سيناريوهات للحساب')
+    if len(scenarios) > MAX_SCENARIOS:
+        raise ValueError(f'عدد السيناريوهات ({len(scenarios)}) يتجاوز الحد ({MAX_SCENARIOS})')
+    for seats, divisor, threshold in scenarios:
+        if not 0 < seats - reserved_seats <= MAX_SEATS:
+            raise ValueError(f'عدد المقاعد غير صالح: {seats} (المحجوز {reserved_seats})')
+        if divisor <= 0 or not 0 <= threshold < 1:
+            raise ValueError('القاسم يجب أن يكون موجباً والعتبة بين 0 و 1')
+
+    params = {'scenarios': scenarios, 'reserved': reserved_seats, 'vote_type': vote_type}
+    cache_key = None
+    if parties is None:
+        version = tally_version()
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+        cache_key = f'seat_allocation:{version}:{digest}'
+        result = cache.get(cache_key)
+        if result is not None:
+            return result
+        parties = live_party_votes(vote_type)
+    else:
+        if len(parties) > MAX_PARTIES:
+            raise ValueError(f'عدد الكيانات ({len(parties)}) يتجاوز الحد ({MAX_PARTIES})')
+        version = None
+
+    votes = np.array([party['votes'] for party in parties], dtype=float)
+    seats_array = np.array([seats - reserved_seats for seats, _, _ in scenarios])
+    allocation, last_quotients, tie_breaks = allocate_in_batches(
+        votes, seats_array,
+        [divisor for _, divisor, _ in scenarios],
+        [threshold for _, _, threshold in scenarios],
+    )
+
+    result = {
+        'version': version,
+        'vote_type': vote_type,
+        'reserved_seats': reserved_seats,
+        'total_votes': int(votes.sum()),
+        'parties': parties,
+        'scenarios': [
+            {
+                'seats': seats,
+                'first_divisor': divisor,
+                'threshold': threshold,
+                'seats_by_party': allocation[index].tolist(),
+                'last_quotient': round(float(last_quotients[index]), 4),
+                'tie_break': bool(tie_breaks[index]),
+            }
+            for index, (seats, divisor, threshold) in enumerate(scenarios)
+        ],
+        'range_by_party': [
+            {'min': int(allocation[:, col].min()), 'max': int(allocation[:, col].max())}
+            for col in range(len(parties))
+        ],
+    }
+    if cache_key:
+        cache.set(cache_key, result, CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,280 @@
+"""
+توقع توزيع المقاعد من نتائج المحطات المُبلغ عنها جزئياً (محاكاة مونت كارلو)
+كل محطة لم تُبلغ بعد تأخذ في كل محاكاة معدلات أصوات (لكل ناخب مسجل) من محطة مُبلغة في نفس المركز
+(أو من نفس نوع الاقتراع إن لم يُبلغ المركز بعد)، تُختار بوزن عدد الناخبين المسجلين، وتُضرب في ناخبيها المسجلين.
+المحاكاة كلها مصفوفات NumPy (bincount ثم ضرب مصفوفي)، والتشغيلات الكبيرة تُوزع على عمليات متعددة.
+بيانات المحطات تُحدّث تدريجياً من أحداث VoteTallyEvent: تُعاد قراءة المحطات التي تغيرت فقط
+"""
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .models import PoliticalParty, PollingStation, VoteCount, VoteTallyEvent
+from .seat_allocation import MAX_SEATS, VOTE_FIELDS, allocate_scenarios, tally_version
+
+DEFAULT_SIMULATIONS = 2000
+
+# أكبر عدد محاكاة يُنفذ داخل الطلب؛ ما فوقه يُرسل إلى طابور المهام (run_jobs)
+INLINE_MAX_SIMULATIONS = 5000
+MAX_SIMULATIONS = 200000
+
+# عدد المحاكاة في كل دفعة مصفوفات، للمحاكاة ولتوزيع المقاعد (يحد استهلاك الذاكرة)
+SIMULATION_CHUNK = 500
+
+# أقل عدد محاكاة يستحق توزيعه على عمليات متعددة
+PROCESS_POOL_MIN = 20000
+
+# إعادة تحميل كاملة دورية (محطات أو كيانات جديدة لا تظهر في أحداث المجاميع)
+FULL_RELOAD_INTERVAL = 300
+
+# عدد الأحداث الذي يصبح بعده التحميل الكامل أرخص من التحديث التدريجي
+MAX_INCREMENTAL_EVENTS = 2000
+
+CACHE_TIMEOUT = 600
+
+
+# ==================== بيانات المحطات ====================
+
+class StationVotes:
+    """مصفوفة أصوات [محطة × كيان] لنوع تصويت، مع تحديث تدريجي من أحداث المجاميع"""
+
+    def __init__(self, vote_type):
+        self.vote_type = vote_type
+        self.version = None
+        self.loaded_at = 0
+        self._lock = threading.Lock()
+
+    def _vote_rows(self, station_ids=None):
+        rows = VoteCount.objects.all()
+        if self.vote_type != 'all':
+            rows = rows.filter(vote_type=self.vote_type)
+        if station_ids is not None:
+            rows = rows.filter(station_id__in=station_ids)
+        return rows.values('station_id', 'candidate__party_id').annotate(votes=Sum('vote_count')).order_by()
+
+    def _fill(self, rows):
+        for row in rows:
+            self.votes[self.station_index[row['station_id']], self.party_index[row['candidate__party_id']]] += row['votes']
+
+    def _full_load(self, version):
+        stations = list(PollingStation.objects.values_list(
+            'pk', 'center_id', 'center__voting_type', 'registered_voters'
+        ).order_by('pk'))
+        self.party_ids = list(PoliticalParty.objects.order_by('serial_number').values_list('pk', flat=True))
+        self.party_index = {pk: i for i, pk in enumerate(self.party_ids)}
+        self.station_ids = np.array([row[0] for row in stations], dtype=np.int64)
+        self.station_index = {pk: i for i, pk in enumerate(self.station_ids.tolist())}
+        self.centers = np.array([row[1] for row in stations], dtype=np.int64)
+        self.voting_types = np.array([row[2] or '' for row in stations])
+        self.registered = np.array([row[3] or 0 for row in stations], dtype=float)
+        self.votes = np.zeros((len(stations), len(self.party_ids)))
+        self._fill(self._vote_rows())
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    def _changed_stations(self, version):
+        """المحطات التي تغيرت منذ آخر تحميل، أو None إذا لزم تحميل كامل"""
+        events = list(VoteTallyEvent.objects.filter(id__gt=self.version, id__lte=version).values_list(
+            'changes', 'reset'
+        )[:MAX_INCREMENTAL_EVENTS + 1])
+        if len(events) > MAX_INCREMENTAL_EVENTS or any(reset for _, reset in events):
+            return None
+        return {change['id'] for changes, _ in events for change in changes if change['scope'] == 'station'}
+
+    def refresh(self):
+        with self._lock:
+            version = tally_version()
+            if self.version == version:
+                return self
+            changed = None
+            if self.version is not None and time.monotonic() - self.loaded_at < FULL_RELOAD_INTERVAL:
+                changed = self._changed_stations(version)
+            if changed is None or not changed.issubset(self.station_index):
+                self._full_load(version)
+                return self
+            rows = list(self._vote_rows(changed))
+            if any(row['candidate__party_id'] not in self.party_index for row in rows):
+                self._full_load(version)
+                return self
+            for station_id in changed:
+                self.votes[self.station_index[station_id]] = 0
+            self._fill(rows)
+            self.version = version
+            return self
+
+
+_station_votes = {vote_type: StationVotes(vote_type) for vote_type in VOTE_FIELDS}
+
+
+def station_votes(vote_type='all'):
+    return _station_votes[vote_type].refresh()
+
+
+# ==================== المحاكاة ====================
+
+def build_pools(data):
+    """
+    مجموعات الاستبدال: لكل مجموعة محطات غير مُبلغة، المحطات المُبلغة التي تُسحب منها واحتمالاتها
+    الأولوية لمحطات نفس المركز، ثم نفس نوع الاقتراع، ثم كل المحطات المُبلغة
+    """
+    reported = data.votes.sum(axis=1) > 0
+    reported_idx = np.flatnonzero(reported)
+    unreported_idx = np.flatnonzero(~reported)
+
+    # عدد الناخبين المسجلين غير المعروف (صفر) يُستبدل بالوسيط حتى لا تُهمل المحطة
+    known = data.registered[data.registered > 0]
+    fallback = float(np.median(known)) if len(known) else 1.0
+    registered = np.where(data.registered > 0, data.registered, fallback)
+
+    groups = {}
+    for station in unreported_idx:
+        center_donors = reported_idx[data.centers[reported_idx] == data.centers[station]]
+        if len(center_donors):
+            key = ('center', data.centers[station])
+        elif (data.voting_types[reported_idx] == data.voting_types[station]).any():
+            key = ('type', data.voting_types[station])
+        else:
+            key = ('all', '')
+        groups.setdefault(key, []).append(station)
+
+    pools = []
+    for (kind, value), stations in groups.items():
+        if kind == 'center':
+            donors = reported_idx[data.centers[reported_idx] == value]
+        elif kind == 'type':
+            donors = reported_idx[data.voting_types[reported_idx] == value]
+        else:
+            donors = reported_idx
+        weights = registered[donors]
+        pools.append((registered[np.array(stations)], donors, weights / weights.sum()))
+    return reported, registered, pools
+
+
+def simulate_unreported(rates, pools, simulations, seed):
+    """
+    أصوات المحطات غير المُبلغة في كل محاكاة: مصفوفة [محاكاة × كيان]
+    rates: أصوات كل كيان لكل ناخب مسجل في كل محطة [محطة × كيان]
+    """
+    rng = np.random.default_rng(seed)
+    projected = np.zeros((simulations, rates.shape[1]))
+    for start in range(0, simulations, SIMULATION_CHUNK):
+        size = min(SIMULATION_CHUNK, simulations - start)
+        for registered, donors, probs in pools:
+            picks = rng.choice(len(donors), size=(size, len(registered)), p=probs)
+            # مجموع الناخبين المسجلين المسندين لكل محطة مانحة في كل محاكاة
+            offsets = np.arange(size)[:, None] * len(donors)
+            assigned = np.bincount(
+                (offsets + picks).ravel(),
+                weights=np.broadcast_to(registered, picks.shape).ravel(),
+                minlength=size * len(donors),
+            ).reshape(size, len(donors))
+            projected[start:start + size] += assigned @ rates[donors]
+    return projected
+
+
+def _simulate_part(args):
+    return simulate_unreported(*args)
+
+
+def run_simulations(rates, pools, simulations, seed, processes=1):
+    """تشغيل المحاكاة، موزعة على عدة عمليات للتشغيلات الكبيرة"""
+    if processes <= 1 or simulations < PROCESS_POOL_MIN:
+        return simulate_unreported(rates, pools, simulations, seed)
+    seeds = np.random.SeedSequence(seed).spawn(processes)
+    sizes = [simulations // processes + (1 if i < simulations % processes else 0) for i in range(processes)]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        parts = executor.map(_simulate_part, [(rates, pools, size, s) for size, s in zip(sizes, seeds)])
+        return np.vstack(list(parts))
+
+
+# ==================== التوقع ====================
+
+def project_seats(seats=25, first_divisor=1.7, threshold=0.0, reserved_seats=0, vote_type='all',
+                  simulations=DEFAULT_SIMULATIONS, seed=None, processes=1):
+    """
+    توزيع احتمالي للمقاعد لكل كيان؛ النتيجة تُخزن مؤقتاً حسب نسخة المجاميع
+    البذرة الافتراضية مشتقة من نسخة المجاميع فلا تتغير النتائج بين الطلبات حتى تصل أصوات جديدة
+    """
+    if not 0 < seats - reserved_seats or seats > MAX_SEATS or not 0 < simulations <= MAX_SIMULATIONS:
+        raise ValueError('عدد المقاعد أو المحاكاة غير صالح')
+    if not first_divisor > 0 or not 0 <= threshold < 1:
+        raise ValueError('القاسم يجب أن يكون موجباً والعتبة بين 0 و 1')
+    if vote_type not in VOTE_FIELDS:
+        raise ValueError('نوع التصويت غير صالح')
+
+    data = station_votes(vote_type)
+    params = {'seats': seats, 'divisor': first_divisor, 'threshold': threshold, 'reserved': reserved_seats,
+              'vote_type': vote_type, 'simulations': simulations, 'seed': seed}
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    cache_key = f'seat_projection:{data.version}:{digest}'
+    result = cache.get(cache_key)
+    if result is not None:
+        return result
+
+    reported, registered, pools = build_pools(data)
+    if not reported.any():
+        raise ValueError('لم تُبلغ أي محطة عن نتائجها بعد')
+
+    rates = data.votes / registered[:, None]
+    counted = data.votes[reported].sum(axis=0)
+    seed = data.version if seed is None else seed
+    totals = counted[None, :] + run_simulations(rates, pools, simulations, seed, processes)
+
+    allocatable = seats - reserved_seats
+    allocation = np.empty(totals.shape, dtype=int)
+    for start in range(0, simulations, SIMULATION_CHUNK):
+        size = min(SIMULATION_CHUNK, simulations - start)
+        allocation[start:start + size], _, _ = allocate_scenarios(
+            totals[start:start + size], [allocatable] * size, [first_divisor] * size, [threshold] * size
+        )
+    current, _, _ = allocate_scenarios(counted, [allocatable], [first_divisor], [threshold])
+
+    shares = totals / totals.sum(axis=1, keepdims=True)
+    parties = {party.pk: party for party in PoliticalParty.objects.filter(pk__in=data.party_ids)}
+    distributions = []
+    for col, party_id in enumerate(data.party_ids):
+        if not totals[:, col].any():
+            continue
+        party_seats = allocation[:, col]
+        histogram = np.bincount(party_seats, minlength=party_seats.max() + 1) / simulations
+        distributions.append({
+            'id': party_id,
+            'name': parties[party_id].name,
+            'serial_number': parties[party_id].serial_number,
+            'color': parties[party_id].color,
+            'counted_votes': int(counted[col]),
+            'current_seats': int(current[0, col]),
+            'mean_seats': round(float(party_seats.mean()), 2),
+            'seats_p5': int(np.percentile(party_seats, 5)),
+            'seats_p50': int(np.percentile(party_seats, 50)),
+            'seats_p95': int(np.percentile(party_seats, 95)),
+            'prob_any_seat': round(float((party_seats > 0).mean()), 4),
+            'seat_probabilities': {str(k): round(float(p), 4) for k, p in enumerate(histogram) if p > 0},
+            'share_mean': round(float(shares[:, col].mean()), 4),
+            'share_p5': round(float(np.percentile(shares[:, col], 5)), 4),
+            'share_p95': round(float(np.percentile(shares[:, col], 95)), 4),
+        })
+    distributions.sort(key=lambda row: (-row['mean_seats'], -row['counted_votes']))
+
+    result = {
+        'version': data.version,
+        'vote_type': vote_type,
+        'seats': seats,
+        'reserved_seats': reserved_seats,
+        'first_divisor': first_divisor,
+        'threshold': threshold,
+        'simulations': simulations,
+        'stations_reported': int(reported.sum()),
+        'stations_total': len(reported),
+        'registered_reported': int(registered[reported].sum()),
+        'registered_total': int(registered.sum()),
+        'parties': distributions,
+    }
+    cache.set(cache_key, result, CACHE_TIMEOUT)
+    return result
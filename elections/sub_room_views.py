@@ -4,7 +4,7 @@ from django.contrib import messages
 from django.db.models import Count, Q
 from django.http import JsonResponse, HttpResponse
 from django.core.paginator import Paginator
-from .models import SubOperationRoom, Introducer, Anchor, CenterDirector, PoliticalEntityAgent, Voter
+from .models import SubOperationRoom, Introducer, Anchor, CenterDirector, PoliticalEntityAgent, Voter, HierarchyRollup
 from .sub_room_forms import SubOperationRoomForm, SubRoomFilterForm, AssignToRoomForm
 import json
 
@@ -18,7 +18,7 @@ def sub_room_list(request):
     
     # Add statistics to each room
     rooms_with_stats = []
-    for room in rooms:
+    for room in HierarchyRollup.attach(rooms, HierarchyRollup.SCOPE_ROOM):
         rooms_with_stats.append({
             'room': room,
             'introducers_count': room.get_introducers_count(),
@@ -239,7 +239,7 @@ def sub_room_statistics(request):
     rooms = SubOperationRoom.objects.all().order_by('room_code')
     
     statistics = []
-    for room in rooms:
+    for room in HierarchyRollup.attach(rooms, HierarchyRollup.SCOPE_ROOM):
         statistics.append({
             'room': room,
             'introducers': room.get_introducers_count(),
@@ -272,10 +272,10 @@ def sub_room_statistics(request):
 @login_required
 def sub_room_comparison(request):
     """مقارنة بين جميع الغرف"""
-    rooms = SubOperationRoom.objects.all().order_by('room_code')
+    rooms = SubOperationRoom.objects.select_related('supervisor').order_by('room_code')
     
     comparison_data = []
-    for room in rooms:
+    for room in HierarchyRollup.attach(rooms, HierarchyRollup.SCOPE_ROOM):
         comparison_data.append({
             'room_code': room.room_code,
             'room_name': room.name,
@@ -0,0 +1,363 @@
+"""
+صيانة جدول مجاميع الأصوات (VoteTally) لصفحات النتائج
+- كل إنشاء/تعديل/حذف لسجل VoteCount يطبّق فرق الأصوات بـ F() على صفوف المرشح والحزب والمركز والمحطة والإجمالي
+  داخل نفس المعاملة، فتقرأ صفحات النتائج المجاميع مباشرة بدل Sum على جدول VoteCount كاملاً
+- مسارات الإدخال المجمّع (bulk_create) التي لا ترسل إشارات تستدعي tally_vote_counts بعد الحفظ
+- إعادة البناء والمطابقة: rebuild_tallies() / reconcile_tallies() / أمر reconcile_vote_tallies
+- كل تغيير يُسجل في VoteTallyEvent لبثه إلى شاشات النتائج (elections/tally_stream.py)
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import (
+    PartyCandidate, PoliticalParty, PollingCenter, PollingStation, VoteCount, VoteTally, VoteTallyEvent,
+)
+
+_state = threading.local()
+
+TALLY_FIELDS = ('general_votes', 'special_votes', 'general_entries', 'special_entries')
+
+# عدد صفوف المجاميع في جملة UPDATE واحدة (حتى 14 معاملاً لكل صف، وحد SQLite القديم 999)
+TALLY_UPDATE_CHUNK = 60
+
+
+@contextmanager
+def tallies_suspended():
+    """إيقاف التحديث التلقائي مؤقتاً (للعمليات الجماعية التي تعيد البناء بعدها)"""
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def _suspended():
+    return getattr(_state, 'suspended', False)
+
+
+# ==================== Incremental Updates ====================
+
+def apply_tally_deltas(changes):
+    """
+    تطبيق فروقات الأصوات [(station_id, candidate_id, vote_type, votes_delta, entries_delta), ...]
+    الفروقات تُجمع حسب الصف المستهدف وتُحدّث كل الصفوف بجملة UPDATE واحدة (CASE لكل حقل)
+    """
+    changes = [c for c in changes if c[3] or c[4]]
+    if not changes:
+        return
+
+    parties = dict(PartyCandidate.objects.filter(
+        pk__in={c[1] for c in changes}
+    ).values_list('pk', 'party_id'))
+    centers = dict(PollingStation.objects.filter(
+        pk__in={c[0] for c in changes}
+    ).values_list('pk', 'center_id'))
+
+    deltas = defaultdict(lambda: dict.fromkeys(TALLY_FIELDS, 0))
+    for station_id, candidate_id, vote_type, votes, entries in changes:
+        fields = VoteTally.VOTE_TYPE_FIELDS.get(vote_type)
+        if fields is None:
+            continue
+        targets = [
+            (VoteTally.SCOPE_TOTAL, 0),
+            (VoteTally.SCOPE_STATION, station_id),
+            (VoteTally.SCOPE_CENTER, centers.get(station_id)),
+            (VoteTally.SCOPE_CANDIDATE, candidate_id),
+            (VoteTally.SCOPE_PARTY, parties.get(candidate_id)),
+        ]
+        for key in targets:
+            if key[1] is None:
+                continue
+            deltas[key][fields[0]] += votes
+            deltas[key][fields[1]] += entries
+
+    rows = {}
+    for key, delta in deltas.items():
+        delta = {field: value for field, value in delta.items() if value}
+        if delta:
+            rows[key] = delta
+    if not rows:
+        return
+
+    with transaction.atomic():
+        VoteTally.objects.bulk_create(
+            [VoteTally(scope=scope, object_id=object_id) for scope, object_id in rows],
+            ignore_conflicts=True,
+        )
+        items = list(rows.items())
+        for start in range(0, len(items), TALLY_UPDATE_CHUNK):
+            chunk = items[start:start + TALLY_UPDATE_CHUNK]
+            condition = Q()
+            for scope, object_id in (key for key, _ in chunk):
+                condition |= Q(scope=scope, object_id=object_id)
+            updates = {}
+            for field in TALLY_FIELDS:
+                whens = [
+                    When(scope=scope, object_id=object_id, then=Value(delta[field]))
+                    for (scope, object_id), delta in chunk if field in delta
+                ]
+                if whens:
+                    updates[field] = F(field) + Case(*whens, default=Value(0), output_field=BigIntegerField())
+            VoteTally.objects.filter(condition).update(**updates)
+        VoteTallyEvent.objects.create(changes=[
+            {'scope': scope, 'id': object_id, **delta} for (scope, object_id), delta in rows.items()
+        ])
+
+
+def tally_vote_counts(vote_counts, sign=1):
+    """إضافة (أو طرح بـ sign=-1) سجلات VoteCount حُفظت/حُذفت دون إشارات (bulk_create مثلاً)"""
+    apply_tally_deltas([
+        (vc.station_id, vc.candidate_id, vc.vote_type, sign * int(vc.vote_count), sign)
+        for vc in vote_counts
+    ])
+
+
+# ==================== Reads ====================
+
+def with_tallies(queryset, scope):
+    """
+    إضافة general_votes و special_votes و total_votes من جدول المجاميع إلى استعلام
+    (مرشحين / أحزاب / مراكز / محطات)؛ القيمة None إن لم تُسجل أصوات للكائن، كما في Sum
+    """
+    rows = VoteTally.objects.filter(scope=scope, object_id=OuterRef('pk'))
+    return queryset.annotate(
+        general_votes=Subquery(rows.values('general_votes')[:1]),
+        special_votes=Subquery(rows.values('special_votes')[:1]),
+        total_votes=Subquery(
+            rows.annotate(total=F('general_votes') + F('special_votes')).values('total')[:1]
+        ),
+    )
+
+
+def vote_totals_payload():
+    """المجاميع الإجمالية ومجاميع المرشحين والأحزاب (واجهة vote-totals ولقطة البث المباشر)"""
+    candidate_totals = list(
+        with_tallies(PartyCandidate.objects.all(), VoteTally.SCOPE_CANDIDATE).filter(total_votes__gt=0).values(
+            'id',
+            'party_id',
+            'party__serial_number',
+            'serial_number',
+            'full_name',
+            'party__name',
+            'party__color',
+            'general_votes',
+            'special_votes',
+            'total_votes'
+        ).order_by('-total_votes')
+    )
+    party_totals = list(
+        with_tallies(PoliticalParty.objects.all(), VoteTally.SCOPE_PARTY).filter(total_votes__gt=0).values(
+            'id',
+            'serial_number',
+            'name',
+            'color',
+            'general_votes',
+            'special_votes',
+            'total_votes'
+        ).order_by('-total_votes')
+    )
+    totals = VoteTally.totals()
+    return {
+        'candidate_totals': candidate_totals,
+        'party_totals': party_totals,
+        'totals': {
+            'general': totals.general_votes,
+            'special': totals.special_votes,
+            'all': totals.total_votes,
+            'general_count': totals.general_entries,
+            'special_count': totals.special_entries,
+        },
+    }
+
+
+# ==================== Rebuild / Reconcile ====================
+
+def compute_tallies():
+    """حساب جميع المجاميع من VoteCount باستعلامات تجميع (GROUP BY) لكل مستوى"""
+    totals = defaultdict(lambda: dict.fromkeys(TALLY_FIELDS, 0))
+
+    groupings = [
+        (VoteTally.SCOPE_CANDIDATE, 'candidate_id'),
+        (VoteTally.SCOPE_PARTY, 'candidate__party_id'),
+        (VoteTally.SCOPE_STATION, 'station_id'),
+        (VoteTally.SCOPE_CENTER, 'station__center_id'),
+        (VoteTally.SCOPE_TOTAL, None),
+    ]
+    for scope, key in groupings:
+        group_by = [key, 'vote_type'] if key else ['vote_type']
+        rows = VoteCount.objects.values(*group_by).annotate(
+            votes=Sum('vote_count'), entries=Count('id')
+        ).order_by()
+        for row in rows:
+            fields = VoteTally.VOTE_TYPE_FIELDS.get(row['vote_type'])
+            object_id = row[key] if key else 0
+            if fields is None or object_id is None:
+                continue
+            totals[(scope, object_id)][fields[0]] += row['votes'] or 0
+            totals[(scope, object_id)][fields[1]] += row['entries']
+    return totals
+
+
+def rebuild_tallies():
+    """إعادة بناء جدول المجاميع بالكامل"""
+    totals = compute_tallies()
+    with transaction.atomic():
+        VoteTally.objects.all().delete()
+        VoteTally.objects.bulk_create(
+            [VoteTally(scope=scope, object_id=object_id, **values)
+             for (scope, object_id), values in totals.items()],
+            batch_size=1000,
+        )
+        VoteTallyEvent.objects.create(reset=True)
+    return len(totals)
+
+
+def reconcile_tallies(fix=True):
+    """
+    مقارنة المجاميع المخزنة بالمحسوبة من VoteCount
+    يعيد قائمة الفروقات [(scope, object_id, stored, expected)] ويصححها إن كان fix=True
+    """
+    expected = compute_tallies()
+    stored = {
+        (row['scope'], row['object_id']): {field: row[field] for field in TALLY_FIELDS}
+        for row in VoteTally.objects.values('scope', 'object_id', *TALLY_FIELDS)
+    }
+    empty = dict.fromkeys(TALLY_FIELDS, 0)
+
+    mismatches = []
+    for key in set(expected) | set(stored):
+        want = expected.get(key, empty)
+        have = stored.get(key, empty)
+        if want != have:
+            mismatches.append((key[0], key[1], have, want))
+
+    if fix and mismatches:
+        with transaction.atomic():
+            for scope, object_id, _, want in mismatches:
+                VoteTally.objects.update_or_create(scope=scope, object_id=object_id, defaults=want)
+            VoteTallyEvent.objects.create(reset=True)
+    return mismatches
+
+
+def refresh_tallies(targets):
+    """إعادة حساب صفوف محددة [(scope, object_id), ...] (بعد نقل مرشح إلى حزب آخر أو محطة إلى مركز آخر)"""
+    lookups = {
+        VoteTally.SCOPE_CANDIDATE: 'candidate_id',
+        VoteTally.SCOPE_PARTY: 'candidate__party_id',
+        VoteTally.SCOPE_STATION: 'station_id',
+        VoteTally.SCOPE_CENTER: 'station__center_id',
+    }
+    targets = set(t for t in targets if t[1])
+    for scope, object_id in targets:
+        values = dict.fromkeys(TALLY_FIELDS, 0)
+        rows = VoteCount.objects.filter(**{lookups[scope]: object_id}).values('vote_type').annotate(
+            votes=Sum('vote_count'), entries=Count('id')
+        ).order_by()
+        for row in rows:
+            fields = VoteTally.VOTE_TYPE_FIELDS.get(row['vote_type'])
+            if fields:
+                values[fields[0]] += row['votes'] or 0
+                values[fields[1]] += row['entries']
+        VoteTally.objects.update_or_create(scope=scope, object_id=object_id, defaults=values)
+    if targets:
+        VoteTallyEvent.objects.create(reset=True)
+
+
+# ==================== Signals ====================
+
+_VOTE_FIELDS = ('station_id', 'candidate_id', 'vote_type', 'vote_count')
+
+
+@receiver(pre_save, sender=VoteCount)
+def vote_count_tally_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or _suspended():
+        return
+    instance._tally_previous = (
+        sender.objects.filter(pk=instance.pk).values(*_VOTE_FIELDS).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=VoteCount)
+def vote_count_tally_post_save(sender, instance, raw=False, **kwargs):
+    if raw or _suspended():
+        return
+    previous = getattr(instance, '_tally_previous', None)
+    current = {field: getattr(instance, field) for field in _VOTE_FIELDS}
+    if previous == current:
+        return
+    changes = []
+    if previous:
+        changes.append((previous['station_id'], previous['candidate_id'], previous['vote_type'],
+                        -previous['vote_count'], -1))
+    changes.append((instance.station_id, instance.candidate_id, instance.vote_type,
+                    int(instance.vote_count), 1))
+    apply_tally_deltas(changes)
+
+
+@receiver(post_delete, sender=VoteCount)
+def vote_count_tally_post_delete(sender, instance, **kwargs):
+    if _suspended():
+        return
+    tally_vote_counts([instance], sign=-1)
+
+
+@receiver(pre_save, sender=PartyCandidate)
+def candidate_tally_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or _suspended() or not instance.pk:
+        return
+    instance._tally_previous_party = sender.objects.filter(pk=instance.pk).values_list(
+        'party_id', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=PartyCandidate)
+def candidate_tally_post_save(sender, instance, raw=False, created=False, **kwargs):
+    if raw or _suspended() or created:
+        return
+    previous_party = getattr(instance, '_tally_previous_party', None)
+    if previous_party != instance.party_id:
+        refresh_tallies([(VoteTally.SCOPE_PARTY, previous_party), (VoteTally.SCOPE_PARTY, instance.party_id)])
+
+
+@receiver(pre_save, sender=PollingStation)
+def station_tally_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or _suspended() or not instance.pk:
+        return
+    instance._tally_previous_center = sender.objects.filter(pk=instance.pk).values_list(
+        'center_id', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=PollingStation)
+def station_tally_post_save(sender, instance, raw=False, created=False, **kwargs):
+    if raw or _suspended() or created:
+        return
+    previous_center = getattr(instance, '_tally_previous_center', None)
+    if previous_center != instance.center_id:
+        refresh_tallies([(VoteTally.SCOPE_CENTER, previous_center), (VoteTally.SCOPE_CENTER, instance.center_id)])
+
+
+_OWNER_SCOPES = {
+    PartyCandidate: VoteTally.SCOPE_CANDIDATE,
+    PoliticalParty: VoteTally.SCOPE_PARTY,
+    PollingStation: VoteTally.SCOPE_STATION,
+    PollingCenter: VoteTally.SCOPE_CENTER,
+}
+
+
+@receiver(post_delete, sender=PartyCandidate)
+@receiver(post_delete, sender=PoliticalParty)
+@receiver(post_delete, sender=PollingStation)
+@receiver(post_delete, sender=PollingCenter)
+def tally_owner_post_delete(sender, instance, **kwargs):
+    # أصوات الكائن حُذفت قبله بالتتالي (وطُرحت من المجاميع)، فيبقى صفه فارغاً
+    if _suspended():
+        return
+    VoteTally.objects.filter(scope=_OWNER_SCOPES[sender], object_id=instance.pk).delete()
@@ -0,0 +1,201 @@
+"""
+بث مباشر لتغييرات مجاميع الأصوات (Server-Sent Events عبر ASGI)
+منتج واحد في كل عملية يقرأ جدول VoteTallyEvent مرة كل ثانية ويوزع الأحداث على كل الشاشات المتصلة،
+فإضافة شاشة لا تضيف استعلامات؛ الشاشة التي تعيد الاتصال تستأنف من آخر معرف حدث استلمته (Last-Event-ID)
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import VoteTallyEvent
+from .tallies import vote_totals_payload
+
+# الفاصل بين قراءات جدول الأحداث (ثوانٍ)
+POLL_INTERVAL = 1.0
+
+# عدد الأحداث المحفوظة في الذاكرة لإعادة إرسالها عند إعادة الاتصال
+REPLAY_BUFFER = 1000
+
+# مهلة انتظار حدث ناقص في التسلسل (معاملة لم تُثبت بعد) قبل تخطيه (ثوانٍ)
+GAP_WAIT = 5.0
+
+# تعليق دوري يبقي الاتصال مفتوحاً خلف الوسطاء (ثوانٍ)
+KEEPALIVE_INTERVAL = 15.0
+
+# مدة الاحتفاظ بالأحداث في قاعدة البيانات
+EVENT_RETENTION = timedelta(hours=6)
+PRUNE_INTERVAL = 600
+
+# مدة إعادة الاتصال التي يستخدمها المتصفح (ميلي ثانية)
+RETRY_MS = 3000
+
+
+def _load_snapshot():
+    """لقطة المجاميع الحالية ومعرف آخر حدث مشمول فيها (في معاملة واحدة متسقة)"""
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        cursor_id = VoteTallyEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        payload = vote_totals_payload()
+    payload['cursor'] = cursor_id
+    payload['last_updated'] = timezone.now().strftime('%Y-%m-%d %H:%M:%S')
+    return payload
+
+
+def _latest_event_id():
+    return VoteTallyEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _fetch_events(after_id, limit=500):
+    return [event.to_dict() for event in VoteTallyEvent.objects.filter(id__gt=after_id).order_by('id')[:limit]]
+
+
+def _prune_events():
+    VoteTallyEvent.objects.filter(created_at__lt=timezone.now() - EVENT_RETENTION).delete()
+
+
+class TallyEventHub:
+    """المنتج المشترك: قراءة واحدة لجدول الأحداث لكل عملية، وطابور لكل مشترك"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._buffer = deque(maxlen=REPLAY_BUFFER)
+        self._cursor = None
+        self._start_cursor = None
+        self._task = None
+        self._loop = None
+        self._snapshot = None
+        self._snapshot_lock = None
+        self._gap_since = None
+        self._last_prune = 0.0
+
+    # ---------- الاشتراك ----------
+
+    def subscribe(self):
+        self._ensure_running()
+        queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def replay_since(self, last_id):
+        """الأحداث بعد last_id من الذاكرة، أو None إن لم تعد متوفرة (يلزم إرسال لقطة كاملة)"""
+        if last_id is None or self._cursor is None:
+            return None
+        if len(self._buffer) == self._buffer.maxlen:
+            floor = self._buffer[0]['id'] - 1
+        else:
+            floor = self._start_cursor
+        if last_id < floor:
+            return None
+        # last_id أحدث من هذه العملية (اتصال سابق بعملية أخرى): الأحداث التالية ستصل عبر الطابور
+        events = [event for event in self._buffer if event['id'] > last_id]
+        if any(event['reset'] for event in events):
+            return None
+        return events
+
+    async def snapshot(self):
+        """لقطة مشتركة بين الشاشات الجديدة (تُعاد قراءتها فقط بعد وصول أحداث جديدة)"""
+        async with self._snapshot_lock:
+            if self._snapshot is None or self._snapshot['cursor'] < (self._cursor or 0):
+                self._snapshot = await sync_to_async(_load_snapshot)()
+            return self._snapshot
+
+    # ---------- المنتج ----------
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._snapshot = None
+        self._snapshot_lock = asyncio.Lock()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while self._cursor is None:
+            try:
+                self._cursor = self._start_cursor = await sync_to_async(_latest_event_id)()
+            except Exception:
+                await sync_to_async(close_old_connections)()
+                await asyncio.sleep(POLL_INTERVAL)
+        while True:
+            try:
+                if self._subscribers:
+                    await self._poll()
+                if time.monotonic() - self._last_prune > PRUNE_INTERVAL:
+                    self._last_prune = time.monotonic()
+                    await sync_to_async(_prune_events)()
+            except Exception:
+                # خطأ مؤقت في قاعدة البيانات لا يوقف البث؛ يُعاد الاتصال والمحاولة في الدورة التالية
+                await sync_to_async(close_old_connections)()
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def _poll(self):
+        events = await sync_to_async(_fetch_events)(self._cursor)
+        for event in events:
+            # المعرفات تُحجز عند الإدراج لا عند التثبيت: فجوة تعني غالباً معاملة لم تُثبت بعد
+            if event['id'] != self._cursor + 1:
+                if self._gap_since is None:
+                    self._gap_since = time.monotonic()
+                if time.monotonic() - self._gap_since < GAP_WAIT:
+                    return
+            self._gap_since = None
+            self._cursor = event['id']
+            self._buffer.append(event)
+            for queue in list(self._subscribers):
+                queue.put_nowait(event)
+
+
+hub = TallyEventHub()
+
+
+# ==================== SSE ====================
+
+def format_event(event_type, event_id, data):
+    return f'event: {event_type}\nid: {event_id}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n'
+
+
+async def event_stream(last_event_id=None):
+    """مولّد غير متزامن لأحداث SSE: لقطة أو إعادة إرسال، ثم التغييرات أولاً بأول"""
+    queue = hub.subscribe()
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+
+        replay = hub.replay_since(last_event_id)
+        if replay is None:
+            snapshot = await hub.snapshot()
+            sent = snapshot['cursor']
+            yield format_event('snapshot', sent, snapshot)
+        else:
+            sent = last_event_id
+            for event in replay:
+                sent = event['id']
+                yield format_event('tally', sent, event)
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event['id'] <= sent:
+                continue
+            sent = event['id']
+            if event['reset']:
+                snapshot = await hub.snapshot()
+                sent = max(sent, snapshot['cursor'])
+                yield format_event('snapshot', sent, snapshot)
+            else:
+                yield format_event('tally', sent, event)
+    finally:
+        hub.unsubscribe(queue)
@@ -18,6 +18,8 @@ from . import task_notifications
 from . import communication_views
 from . import sub_room_views
 from . import views_import_tool
+from . import job_views
+from . import anomaly_views
 
 
 
@@ -38,8 +40,10 @@ urlpatterns = [
     path('voters/', views.VoterListView.as_view(), name='voter_list'),
     path('voters/<int:pk>/', views.VoterDetailView.as_view(), name='voter_detail'),
     path('voter-search/', views.VoterSearchView.as_view(), name='voter_search'),
+    path('api/voter-search/', views.voter_search_ajax, name='voter_search_ajax'),
     path('voters/<int:voter_pk>/log/', views.log_communication, name='log_communication'),
     path('api/voter-lookup/', views.voter_lookup_ajax, name='voter_lookup_ajax'),
+    path('api/voter-lookup/batch/', views.voter_lookup_batch, name='voter_lookup_batch'),
     
     # Candidates - Unified (using PartyCandidate as the single source)
     path('candidates/', views.PartyCandidateListView.as_view(), name='candidate_list'),
@@ -186,10 +190,15 @@ urlpatterns = [
     
     # Tools / Calculator
     path('tools/sainte-lague/', views_calculator.SainteLagueCalculatorView.as_view(), name='sainte_lague_calculator'),
+    path('tools/sainte-lague/report/', views_calculator.SeatAllocationReportView.as_view(), name='seat_allocation_report'),
+    path('api/seat-allocation/', views_calculator.seat_allocation_api, name='seat_allocation_api'),
+    path('tools/seat-projection/', views_calculator.SeatProjectionView.as_view(), name='seat_projection'),
+    path('api/seat-projection/', views_calculator.seat_projection_api, name='seat_projection_api'),
 
     # AJAX APIs for Vote Counting
     path('api/polling-center/<str:center_number>/', vote_count_views.get_polling_center_info, name='get_polling_center_info'),
     path('api/vote-totals/', vote_count_views.get_vote_totals_api, name='vote_totals_api'),
+    path('api/vote-totals/stream/', vote_count_views.vote_totals_stream, name='vote_totals_stream'),
     path('api/vote-count/bulk-save/', vote_count_views.save_bulk_votes, name='save_bulk_votes'),
     
     # ==================== Electoral Public (المرتكزات) ====================
@@ -250,7 +259,10 @@ urlpatterns = [
     
     # Barcode Processing API
     path('barcode/api/process/', barcode_views.process_barcode_scan, name='process_barcode_scan'),
+    path('barcode/api/process-batch/', barcode_views.process_barcode_batch, name='process_barcode_batch'),
     path('barcode/api/scan/<int:scan_id>/approve/', barcode_views.approve_and_process_scan, name='approve_and_process_scan'),
+    path('barcode/api/scans/approve/', barcode_views.approve_scans_bulk, name='approve_scans_bulk'),
+    path('barcode/api/stats/', barcode_views.scan_stats_api, name='scan_stats_api'),
     
     # Session Lists and Details
     path('barcode/sessions/', barcode_views.scan_sessions_list, name='scan_sessions_list'),
@@ -277,6 +289,12 @@ urlpatterns = [
     # ==================== Result Entry (إدخال نتائج الانتخابات) ====================
     path('results/entry/dashboard/', result_entry_views.result_entry_dashboard, name='data_entry_results_dashboard'),
     path('results/entry/add/', result_entry_views.result_entry_add, name='result_entry_add'),
+    path('results/entry/sheet/', result_entry_views.result_entry_sheet, name='result_entry_sheet'),
+
+    # فحص نتائج المحطات
+    path('results/anomalies/', anomaly_views.anomaly_review, name='anomaly_review'),
+    path('results/anomalies/<int:pk>/update/', anomaly_views.anomaly_update, name='anomaly_update'),
+    path('results/anomalies/scan/', anomaly_views.anomaly_scan_start, name='anomaly_scan_start'),
     
     # ==================== Unified Communications Hub ====================
     path('communications/', communication_views.communications_dashboard, name='communications_dashboard'),
@@ -301,5 +319,10 @@ urlpatterns = [
     path('tool/import-remaining/status/', views_import_tool.get_import_status, name='import_get_status'),
     path('tool/import-remaining/stop/', views_import_tool.stop_import, name='import_stop'),
     path('tool/import-remaining/final/', views_import_tool.run_final_import, name='import_final'),
+    
+    # ==================== Background Jobs ====================
+    path('api/jobs/<int:job_id>/', job_views.job_status, name='job_status'),
+    path('api/jobs/<int:job_id>/cancel/', job_views.job_cancel, name='job_cancel'),
+    path('api/jobs/<int:job_id>/download/', job_views.job_download, name='job_download'),
 ]
 
@@ -6,6 +6,7 @@ from django.urls import reverse_lazy
 from django.http import JsonResponse, HttpResponse
 from django.db.models import Q, Count, Sum, Case, When, Value, IntegerField
 from django.contrib import messages
+import json
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.db import transaction
@@ -16,9 +17,8 @@ from .models import (
     CommunicationLog, CampaignTask, Area, Neighborhood,
     PoliticalParty, PartyCandidate, PollingCenter, PollingStation, VoteCount,
     UserRole, UserProfile, CivilSocietyObserver, InternationalObserver, PoliticalEntityAgent,
-    SubOperationRoom
+    SubOperationRoom, IntroducerVoterCounter, HierarchyRollup, VoteTally
 )
-from .models_legacy import PersonHD, PCHd, VrcHD, GovernorateHD
 from .forms import (
     CandidateForm, AnchorForm, IntroducerForm, VoterAssignmentForm,
     CommunicationLogForm, CampaignTaskForm, CandidateMonitorForm,
@@ -27,6 +27,16 @@ from .forms import (
     GeneralVoteCountForm, SpecialVoteCountForm
 )
 from .decorators import role_required, permission_required, admin_only, can_export, can_delete
+from .search import search_voters
+from .pagination import KeysetPaginator, estimated_count
+from .assignment import bulk_assign_voters
+from .rollups import rollups_suspended, rebuild_rollups
+from .tallies import rebuild_tallies, tallies_suspended, with_tallies
+from .vote_sheets import parse_sheet_counts, save_station_sheet, summarize_diff
+from .voter_resolver import (
+    voter_resolver, normalize_voter_number, parse_voter_numbers, local_voter_to_data, new_voter_fields,
+    MAX_BATCH_LOOKUP,
+)
 
 
 # ==================== PWA Offline Page ====================
@@ -337,11 +347,7 @@ class VoterListView(LoginRequiredMixin, ListView):
         has_introducer = self.request.GET.get('has_introducer')
         
         if q:
-            queryset = queryset.filter(
-                Q(voter_number__icontains=q) |
-                Q(full_name__icontains=q) |
-                Q(phone__icontains=q)
-            )
+            queryset = search_voters(queryset, q)
         
         if classification:
             queryset = queryset.filter(classification=classification)
@@ -353,9 +359,19 @@ class VoterListView(LoginRequiredMixin, ListView):
         
         return queryset.select_related('introducer', 'area')
     
+    def paginate_queryset(self, queryset, page_size):
+        """ترقيم بالمفتاح على رقم الناخب بدلاً من OFFSET"""
+        paginator = KeysetPaginator(queryset, page_size, key='voter_number')
+        page = paginator.page(self.request.GET.get('cursor'))
+        return (paginator, page, page.object_list, page.has_other_pages())
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_count'] = self.get_queryset().count()
+        context['total_count'] = estimated_count(self.object_list)
+        
+        params = self.request.GET.copy()
+        params.pop('cursor', None)
+        context['base_query'] = params.urlencode()
         return context
 
 
@@ -373,22 +389,7 @@ class VoterDetailView(LoginRequiredMixin, DetailView):
 
 def voter_lookup_ajax(request):
     """AJAX endpoint to fetch voter data by voter_number from Legacy DB or Local DB"""
-    from django.conf import settings
-    
-    voter_number = request.GET.get('voter_number')
-    
-    # Normalize Arabic numerals
-    if voter_number:
-        replacements = {
-            '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
-            '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
-            '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4',
-            '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9'
-        }
-        for arabic, english in replacements.items():
-            voter_number = voter_number.replace(arabic, english)
-        voter_number = voter_number.strip()
-
+    voter_number = normalize_voter_number(request.GET.get('voter_number'))
     introducer_id = request.GET.get('introducer_id')  # New parameter
     
     if not voter_number:
@@ -397,121 +398,52 @@ def voter_lookup_ajax(request):
     # Check if voter exists in local database and is assigned to an introducer
     already_assigned = False
     same_introducer = False
-    local_voter = None
-    
-    try:
-        local_voter = Voter.objects.get(voter_number=voter_number)
-        if local_voter.introducer:
-            if introducer_id and str(local_voter.introducer.pk) == str(introducer_id):
-                same_introducer = True
-            else:
-                already_assigned = True
-    except Voter.DoesNotExist:
-        local_voter = None
-    
-    # Check if legacy database is configured
-    legacy_db_available = 'legacy_voters_db' in settings.DATABASES
-    
-    if legacy_db_available:
-        try:
-            # Query Legacy DB
-            person = PersonHD.objects.using('legacy_voters_db').get(per_id=voter_number)
-            
-            # Get Center Name
-            try:
-                center = PCHd.objects.using('legacy_voters_db').get(pcno=person.pcno)
-                center_name = center.pc_name
-            except PCHd.DoesNotExist:
-                center_name = ''
-
-            # Get Registration Center Name
-            try:
-                vrc = VrcHD.objects.using('legacy_voters_db').get(vrc_id=person.per_vrc_id)
-                reg_center_name = vrc.vrc_name_ar
-            except (VrcHD.DoesNotExist, AttributeError):
-                reg_center_name = ''
-
-            # Get Governorate Name
-            try:
-                gov = GovernorateHD.objects.using('legacy_voters_db').get(gov_no=str(person.per_gov_id))
-                gov_name = gov.gov_name
-            except (GovernorateHD.DoesNotExist, AttributeError, ValueError):
-                gov_name = ''
-
-            # Construct Full Name
-            full_name = filter(None, [person.per_first, person.per_father, person.per_grand])
-            full_name = ' '.join(full_name)
-            
-            data = {
-                'full_name': full_name,
-                'date_of_birth': person.per_dob or '',
-                'mother_name': '',
-                'phone': '',
-                'voting_center_number': person.pcno,
-                'voting_center_name': center_name,
-                'family_number': person.per_famno,
-                'registration_center_name': reg_center_name,
-                'registration_center_number': person.per_vrc_id,
-                'governorate': gov_name, 
-                'station_number': person.psno,
-                'status': 'active',
-                'found': True,
-                'already_assigned': already_assigned,
-                'same_introducer': same_introducer,
-            }
-            return JsonResponse(data)
-        except PersonHD.DoesNotExist:
-            pass  # Fall through to local voter check
-        except Exception as e:
-            # Database connection error or other issue - fall through to local check
-            import logging
-            logging.warning(f"Legacy DB lookup failed: {e}")
-    
-    # Fallback to local Voter model
-    if local_voter:
-        data = {
-            'full_name': local_voter.full_name,
-            'date_of_birth': local_voter.date_of_birth.strftime('%Y-%m-%d') if local_voter.date_of_birth else '',
-            'mother_name': local_voter.mother_name or '',
-            'phone': local_voter.phone or '',
-            'voting_center_number': local_voter.voting_center_number or '',
-            'voting_center_name': local_voter.voting_center_name or '',
-            'family_number': local_voter.family_number or '',
-            'registration_center_name': local_voter.registration_center_name or '',
-            'registration_center_number': local_voter.registration_center_number or '',
-            'governorate': local_voter.governorate or '',
-            'station_number': local_voter.station_number or '',
-            'status': local_voter.status or 'active',
-            'found': True,
-            'already_assigned': already_assigned,
-            'same_introducer': same_introducer,
-        }
-        return JsonResponse(data)
-    
-    # Not found in any database
-    total_voters_count = Voter.objects.count()
-    
-    # Debug file existence
-    import os
-    zip_exists = os.path.exists('voter_batches.zip')
-    dir_exists = os.path.exists('voter_batches')
-    batch_files_count = len(os.listdir('voter_batches')) if dir_exists else 0
+    local_voter = voter_resolver.get_local(voter_number)
+    if local_voter and local_voter.introducer_id:
+        if introducer_id and str(local_voter.introducer_id) == str(introducer_id):
+            same_introducer = True
+        else:
+            already_assigned = True
+    
+    # Legacy DB first (single query + in-memory center/governorate names), then local record
+    person = voter_resolver.get_person(voter_number)
+    if person:
+        data = {**person, 'mother_name': '', 'phone': '', 'status': 'active'}
+    elif local_voter:
+        data = local_voter_to_data(local_voter)
+    else:
+        # Not found in any database
+        return JsonResponse({
+            'found': False, 
+            'error': 'الناخب غير موجود في قاعدة البيانات',
+            'message': 'يرجى التأكد من صحة رقم الناخب',
+        })
     
-    return JsonResponse({
-        'found': False, 
-        'error': 'الناخب غير موجود في قاعدة البيانات',
-        'message': 'يرجى التأكد من صحة رقم الناخب',
-        'debug_total_voters': total_voters_count,
-        'debug_zip_exists': zip_exists,
-        'debug_dir_exists': dir_exists,
-        'debug_batch_files_count': batch_files_count
+    data.pop('voter_number', None)
+    data.update({
+        'found': True,
+        'already_assigned': already_assigned,
+        'same_introducer': same_introducer,
     })
+    return JsonResponse(data)
 
 
 # ==================== Candidate Views ====================
 
-class CandidateListView(LoginRequiredMixin, ListView):
+class HierarchyRollupMixin:
+    """تحميل الإحصائيات المجمّعة لعناصر الصفحة باستعلام واحد بدل عدّة استعلامات لكل صف"""
+    rollup_scope = None
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+        object_list = HierarchyRollup.attach(object_list, self.rollup_scope)
+        page.object_list = object_list
+        return paginator, page, object_list, is_paginated
+
+
+class CandidateListView(LoginRequiredMixin, HierarchyRollupMixin, ListView):
     model = Candidate
+    rollup_scope = HierarchyRollup.SCOPE_CANDIDATE
     template_name = 'elections/candidate_list.html'
     context_object_name = 'candidates'
     paginate_by = 20
@@ -546,8 +478,9 @@ class CandidateCreateView(LoginRequiredMixin, CreateView):
 
 # ==================== Anchor Views ====================
 
-class AnchorListView(LoginRequiredMixin, ListView):
+class AnchorListView(LoginRequiredMixin, HierarchyRollupMixin, ListView):
     model = Anchor
+    rollup_scope = HierarchyRollup.SCOPE_ANCHOR
     template_name = 'elections/anchor_list.html'
     context_object_name = 'anchors'
     paginate_by = 30
@@ -699,8 +632,9 @@ class AnchorDeleteView(LoginRequiredMixin, DeleteView):
 
 # ==================== Introducer Views ====================
 
-class IntroducerListView(LoginRequiredMixin, ListView):
+class IntroducerListView(LoginRequiredMixin, HierarchyRollupMixin, ListView):
     model = Introducer
+    rollup_scope = HierarchyRollup.SCOPE_INTRODUCER
     template_name = 'elections/introducer_list.html'
     context_object_name = 'introducers'
     paginate_by = 30
@@ -1023,6 +957,22 @@ class VoterSearchView(LoginRequiredMixin, TemplateView):
     template_name = 'elections/voter_search.html'
 
 
+@login_required
+def voter_search_ajax(request):
+    """AJAX endpoint للبحث بالاسم أو جزء من الرقم في سجل الناخبين"""
+    query = request.GET.get('q', '').strip()
+    if len(query) < 2:
+        return JsonResponse({'results': [], 'count': 0})
+    
+    voters = search_voters(Voter.objects.all(), query).values(
+        'id', 'voter_number', 'full_name', 'phone',
+        'voting_center_name', 'station_number', 'governorate'
+    )[:20]
+    results = list(voters)
+    
+    return JsonResponse({'results': results, 'count': len(results)})
+
+
 # ==================== Vote Counting Views ====================
 
 from elections.models import PoliticalParty, PartyCandidate, PollingCenter, PollingStation, VoteCount
@@ -1030,7 +980,7 @@ from elections.forms import (
     PoliticalPartyForm, PartyCandidateForm, PollingCenterForm, 
     PollingStationForm, VoteCountForm, QuickVoteCountForm
 )
-from django.db.models import Sum, Count, Q
+from django.db.models import Count, Q
 
 
 # Party Views
@@ -1180,28 +1130,25 @@ class QuickVoteCountView(LoginRequiredMixin, TemplateView):
             return redirect('quick_vote_count')
         
         station = get_object_or_404(PollingStation, id=station_id)
-        candidates = PartyCandidate.objects.all()
-        
-        with transaction.atomic():
-            for candidate in candidates:
-                field_name = f'candidate_{candidate.id}'
-                vote_count = request.POST.get(field_name, 0)
-                try:
-                    vote_count = int(vote_count) if vote_count else 0
-                except ValueError:
-                    vote_count = 0
-                
-                if vote_count > 0:
-                    VoteCount.objects.update_or_create(
-                        station=station,
-                        candidate=candidate,
-                        defaults={
-                            'vote_count': vote_count,
-                            'entered_by': request.user
-                        }
-                    )
-        
-        messages.success(request, f'تم حفظ جرد الأصوات للمحطة {station.full_number}')
+        vote_type = request.POST.get('vote_type', 'general')
+        if vote_type not in dict(VoteCount.VOTE_TYPE_CHOICES):
+            vote_type = 'general'
+
+        # Every input starts at 0, so only the non-zero counts are entries
+        counts, errors = parse_sheet_counts(
+            {key[len('candidate_'):]: value for key, value in request.POST.items() if key.startswith('candidate_')},
+            skip_zero=True,
+        )
+        if errors:
+            messages.error(request, 'لم يتم الحفظ: ' + '، '.join(errors[:10]))
+            return redirect('quick_vote_count')
+
+        summary = summarize_diff(save_station_sheet(station, vote_type, counts, request.user))
+        messages.success(
+            request,
+            f'تم حفظ جرد الأصوات للمحطة {station.full_number}: '
+            f'{summary["created"]} جديد، {summary["updated"]} معدّل، {summary["unchanged"]} دون تغيير'
+        )
         return redirect('quick_vote_count')
 
 
@@ -1213,19 +1160,17 @@ class ResultsDashboardView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         
         # Party results
-        party_results = PoliticalParty.objects.annotate(
-            total_votes=Sum('candidates__vote_counts__vote_count')
-        ).order_by('-total_votes')
+        party_results = with_tallies(PoliticalParty.objects.all(), VoteTally.SCOPE_PARTY).order_by('-total_votes')
         
         # Candidate results
-        candidate_results = PartyCandidate.objects.annotate(
-            total_votes=Sum('vote_counts__vote_count')
-        ).select_related('party').order_by('-total_votes')[:20]
+        candidate_results = with_tallies(
+            PartyCandidate.objects.select_related('party'), VoteTally.SCOPE_CANDIDATE
+        ).order_by('-total_votes')[:20]
         
         # Statistics
         context['party_results'] = party_results
         context['candidate_results'] = candidate_results
-        context['total_votes'] = VoteCount.objects.aggregate(Sum('vote_count'))['vote_count__sum'] or 0
+        context['total_votes'] = VoteTally.totals().total_votes
         context['stations_counted'] = PollingStation.objects.filter(counting_status='completed').count()
         context['total_stations'] = PollingStation.objects.count()
         
@@ -1285,19 +1230,18 @@ class CandidateDashboardView(LoginRequiredMixin, TemplateView):
         # إحصائيات عامة
         context['total_candidates'] = PartyCandidate.objects.count()
         context['total_parties'] = PoliticalParty.objects.count()
-        context['total_votes'] = VoteCount.objects.aggregate(Sum('vote_count'))['vote_count__sum'] or 0
+        context['total_votes'] = VoteTally.totals().total_votes
         
         # ترتيب المرشحين حسب الأصوات
-        candidates_with_votes = PartyCandidate.objects.annotate(
-            total_votes=Sum('vote_counts__vote_count')
-        ).select_related('party').order_by('-total_votes')[:20]
+        candidates_with_votes = with_tallies(
+            PartyCandidate.objects.select_related('party'), VoteTally.SCOPE_CANDIDATE
+        ).order_by('-total_votes')[:20]
         
         context['top_candidates'] = candidates_with_votes
         
         # ترتيب الأحزاب حسب الأصوات
-        parties_with_votes = PoliticalParty.objects.annotate(
-            total_votes=Sum('candidates__vote_counts__vote_count'),
-            candidates_count=Count('candidates')
+        parties_with_votes = with_tallies(
+            PoliticalParty.objects.annotate(candidates_count=Count('candidates')), VoteTally.SCOPE_PARTY
         ).order_by('-total_votes')
         
         context['party_results'] = parties_with_votes
@@ -1569,14 +1513,12 @@ def candidates_dashboard(request):
     ).values('name', 'serial_number', 'candidate_count').order_by('serial_number')
     
     # Top candidates by votes
-    top_candidates = PartyCandidate.objects.annotate(
-        total_votes=Sum('vote_counts__vote_count')
-    ).select_related('party').order_by('-total_votes')[:10]
+    top_candidates = with_tallies(
+        PartyCandidate.objects.select_related('party'), VoteTally.SCOPE_CANDIDATE
+    ).order_by('-total_votes')[:10]
     
     # Vote statistics by party
-    party_votes = PoliticalParty.objects.annotate(
-        total_votes=Sum('candidates__vote_counts__vote_count')
-    ).order_by('-total_votes')
+    party_votes = with_tallies(PoliticalParty.objects.all(), VoteTally.SCOPE_PARTY).order_by('-total_votes')
     
     context = {
         'total_candidates': total_candidates,
@@ -1614,20 +1556,7 @@ def add_voter_to_introducer(request, pk):
         return JsonResponse({'success': False, 'error': 'طريقة غير مسموحة'}, status=405)
     
     introducer = get_object_or_404(Introducer, pk=pk)
-    voter_number = request.POST.get('voter_number', '')
-    
-    # Normalize Arabic numerals
-    if voter_number:
-        replacements = {
-            '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
-            '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
-            '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4',
-            '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9'
-        }
-        for arabic, english in replacements.items():
-            voter_number = voter_number.replace(arabic, english)
-    
-    voter_number = voter_number.strip()
+    voter_number = normalize_voter_number(request.POST.get('voter_number', ''))
     phone = request.POST.get('phone', '').strip()
     
     if not voter_number:
@@ -1647,8 +1576,7 @@ def add_voter_to_introducer(request, pk):
             voter.phone = phone
         
         # توليد كود الناخب
-        count = Voter.objects.filter(introducer=introducer).count() + 1
-        voter.voter_code = f"{introducer.introducer_code}-VOT-{count:03d}"
+        voter.voter_code = IntroducerVoterCounter.allocate(introducer)[0]
         
         voter.save()
         
@@ -1667,53 +1595,16 @@ def add_voter_to_introducer(request, pk):
         
     except Voter.DoesNotExist:
         # محاولة إنشاء ناخب جديد من قاعدة البيانات الخارجية
+        person = voter_resolver.get_person(voter_number)
+        if not person:
+            return JsonResponse({'success': False, 'error': 'الناخب غير موجود في قاعدة البيانات'})
+        
         try:
-            from .models_legacy import PersonHD, PCHd, VrcHD, GovernorateHD
-            
-            person = PersonHD.objects.using('legacy_voters_db').get(per_id=voter_number)
-            
-            # الحصول على اسم المركز
-            try:
-                center = PCHd.objects.using('legacy_voters_db').get(pcno=person.pcno)
-                center_name = center.pc_name
-            except PCHd.DoesNotExist:
-                center_name = ''
-            
-            # الحصول على اسم مركز التسجيل
-            try:
-                vrc = VrcHD.objects.using('legacy_voters_db').get(vrc_id=person.per_vrc_id)
-                reg_center_name = vrc.vrc_name_ar
-            except:
-                reg_center_name = ''
-            
-            # الحصول على اسم المحافظة
-            try:
-                gov = GovernorateHD.objects.using('legacy_voters_db').get(gov_no=str(person.per_gov_id))
-                gov_name = gov.gov_name
-            except:
-                gov_name = 'البصرة'
-            
-            # بناء الاسم الكامل
-            full_name = ' '.join(filter(None, [person.per_first, person.per_father, person.per_grand]))
-            
-            # إنشاء ناخب جديد
-            count = Voter.objects.filter(introducer=introducer).count() + 1
-            voter_code = f"{introducer.introducer_code}-VOT-{count:03d}"
-            
+            # إنشاء ناخب جديد (كود الناخب يُحجز من عداد المعرف في save)
             voter = Voter.objects.create(
-                voter_number=voter_number,
-                full_name=full_name,
-                date_of_birth=person.per_dob,
-                phone=phone or '',
-                voting_center_number=person.pcno or '',
-                voting_center_name=center_name,
-                registration_center_name=reg_center_name,
-                registration_center_number=person.per_vrc_id or '',
-                governorate=gov_name,
-                station_number=person.psno or '',
-                family_number=person.per_famno or '',
+                **new_voter_fields(person),
+                phone=phone or None,
                 introducer=introducer,
-                voter_code=voter_code,
             )
             
             return JsonResponse({
@@ -1729,8 +1620,6 @@ def add_voter_to_introducer(request, pk):
                 }
             })
             
-        except PersonHD.DoesNotExist:
-            return JsonResponse({'success': False, 'error': 'الناخب غير موجود في قاعدة البيانات'})
         except Exception as e:
             return JsonResponse({'success': False, 'error': f'خطأ: {str(e)}'})
 
@@ -1773,76 +1662,24 @@ def bulk_add_voters_to_introducer(request, pk):
     if not voter_numbers_str:
         return JsonResponse({'success': False, 'error': 'أرقام الناخبين مطلوبة'})
 
-    # Normalize Arabic numerals in the bulk string first
-    replacements = {
-        '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
-        '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
-        '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4',
-        '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9'
-    }
-    for arabic, english in replacements.items():
-        voter_numbers_str = voter_numbers_str.replace(arabic, english)
-    
-    voter_numbers = [n.strip() for n in voter_numbers_str.split(',') if n.strip()]
-    
-    added = 0
-    already_exists = 0
-    not_found = 0
+    voter_numbers = parse_voter_numbers(voter_numbers_str)
+    if len(voter_numbers) > MAX_BATCH_LOOKUP:
+        return JsonResponse({
+            'success': False,
+            'error': f'الحد الأقصى {MAX_BATCH_LOOKUP} رقم في الطلب الواحد'
+        })
     
-    for voter_number in voter_numbers:
-        try:
-            voter = Voter.objects.get(voter_number=voter_number)
-            
-            if voter.introducer == introducer:
-                already_exists += 1
-                continue
-            
-            # ربط الناخب بالمعرف
-            voter.introducer = introducer
-            count = Voter.objects.filter(introducer=introducer).count() + 1
-            voter.voter_code = f"{introducer.introducer_code}-VOT-{count:03d}"
-            voter.save()
-            added += 1
-            
-        except Voter.DoesNotExist:
-            # محاولة إنشاء من قاعدة البيانات الخارجية
-            try:
-                from .models_legacy import PersonHD, PCHd
-                
-                person = PersonHD.objects.using('legacy_voters_db').get(per_id=voter_number)
-                
-                try:
-                    center = PCHd.objects.using('legacy_voters_db').get(pcno=person.pcno)
-                    center_name = center.pc_name
-                except:
-                    center_name = ''
-                
-                full_name = ' '.join(filter(None, [person.per_first, person.per_father, person.per_grand]))
-                
-                count = Voter.objects.filter(introducer=introducer).count() + 1
-                voter_code = f"{introducer.introducer_code}-VOT-{count:03d}"
-                
-                Voter.objects.create(
-                    voter_number=voter_number,
-                    full_name=full_name,
-                    voting_center_number=person.pcno or '',
-                    voting_center_name=center_name,
-                    station_number=person.psno or '',
-                    family_number=person.per_famno or '',
-                    introducer=introducer,
-                    voter_code=voter_code,
-                    governorate='البصرة',
-                )
-                added += 1
-                
-            except:
-                not_found += 1
+    try:
+        results, counts = bulk_assign_voters(introducer, voter_numbers)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': f'خطأ: {str(e)}'})
     
     return JsonResponse({
         'success': True,
-        'added': added,
-        'already_exists': already_exists,
-        'not_found': not_found,
+        'added': counts['added'],
+        'already_exists': counts['already_exists'],
+        'not_found': counts['not_found'],
+        'results': results,
         'total_voters': introducer.voters.count()
     })
 
@@ -1850,29 +1687,15 @@ def bulk_add_voters_to_introducer(request, pk):
 @login_required
 def voter_lookup_for_introducer(request):
     """بحث عن ناخب مع التحقق من ارتباطه بمعرف"""
-    voter_number = request.GET.get('voter_number', '')
-    
-    # Normalize Arabic numerals
-    if voter_number:
-        replacements = {
-            '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
-            '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
-            '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4',
-            '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9'
-        }
-        for arabic, english in replacements.items():
-            voter_number = voter_number.replace(arabic, english)
-    
-    voter_number = voter_number.strip()
+    voter_number = normalize_voter_number(request.GET.get('voter_number', ''))
     introducer_id = request.GET.get('introducer_id')
     
     if not voter_number:
         return JsonResponse({'found': False, 'error': 'رقم الناخب مطلوب'})
     
     # البحث أولاً في قاعدة البيانات المحلية
-    try:
-        voter = Voter.objects.get(voter_number=voter_number)
-        
+    voter = voter_resolver.get_local(voter_number)
+    if voter:
         data = {
             'found': True,
             'full_name': voter.full_name,
@@ -1883,34 +1706,65 @@ def voter_lookup_for_introducer(request):
             'current_introducer': voter.introducer.full_name if voter.introducer else None,
         }
         return JsonResponse(data)
-        
-    except Voter.DoesNotExist:
-        # البحث في قاعدة البيانات الخارجية
+    
+    # البحث في قاعدة البيانات الخارجية
+    person = voter_resolver.get_person(voter_number)
+    if not person:
+        return JsonResponse({'found': False, 'error': 'الناخب غير موجود'})
+    
+    return JsonResponse({
+        'found': True,
+        'full_name': person['full_name'],
+        'date_of_birth': person['date_of_birth'],
+        'voting_center_name': person['voting_center_name'],
+        'already_assigned': False,
+        'same_introducer': False,
+        'is_new': True,  # سيتم إنشاؤه عند الإضافة
+    })
+
+
+@login_required
+def voter_lookup_batch(request):
+    """
+    بحث جماعي عن الناخبين (POST)
+    يقبل JSON: {"voter_numbers": [...], "introducer_id": ...} أو حقل voter_numbers مفصول بفواصل/أسطر
+    ويعيد قاموساً حسب رقم الناخب مع حالة الارتباط بالمعرف
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'طريقة غير مسموحة'}, status=405)
+    
+    if request.content_type == 'application/json':
         try:
-            from .models_legacy import PersonHD, PCHd
-            
-            person = PersonHD.objects.using('legacy_voters_db').get(per_id=voter_number)
-            
-            try:
-                center = PCHd.objects.using('legacy_voters_db').get(pcno=person.pcno)
-                center_name = center.pc_name
-            except:
-                center_name = ''
-            
-            full_name = ' '.join(filter(None, [person.per_first, person.per_father, person.per_grand]))
-            
-            return JsonResponse({
-                'found': True,
-                'full_name': full_name,
-                'date_of_birth': person.per_dob or '',
-                'voting_center_name': center_name,
-                'already_assigned': False,
-                'same_introducer': False,
-                'is_new': True,  # سيتم إنشاؤه عند الإضافة
-            })
-            
-        except PersonHD.DoesNotExist:
-            return JsonResponse({'found': False, 'error': 'الناخب غير موجود'})
+            payload = json.loads(request.body or '{}')
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'بيانات JSON غير صالحة'}, status=400)
+        raw_numbers = payload.get('voter_numbers') or []
+        if isinstance(raw_numbers, str):
+            raw_numbers = [raw_numbers]
+        introducer_id = payload.get('introducer_id')
+    else:
+        raw_numbers = [request.POST.get('voter_numbers', '')]
+        introducer_id = request.POST.get('introducer_id')
+    
+    voter_numbers = parse_voter_numbers(','.join(str(n) for n in raw_numbers))
+    if not voter_numbers:
+        return JsonResponse({'success': False, 'error': 'أرقام الناخبين مطلوبة'}, status=400)
+    if len(voter_numbers) > MAX_BATCH_LOOKUP:
+        return JsonResponse({
+            'success': False,
+            'error': f'الحد الأقصى {MAX_BATCH_LOOKUP} رقم في الطلب الواحد'
+        }, status=400)
+    
+    results = voter_resolver.resolve_many(voter_numbers, introducer_id=introducer_id)
+    found = sum(1 for item in results.values() if item['found'])
+    
+    return JsonResponse({
+        'success': True,
+        'count': len(results),
+        'found': found,
+        'not_found': len(results) - found,
+        'results': results,
+    })
 
 
 
@@ -1940,7 +1794,8 @@ class DataResetView(LoginRequiredMixin, View):
         deleted_counts = {}
 
         try:
-            with transaction.atomic():
+            # الحذف الجماعي لا يحدّث الإحصائيات صفاً بصف، بل يُعاد بناؤها مرة واحدة بعده
+            with transaction.atomic(), rollups_suspended(), tallies_suspended():
                 if 'candidates' in reset_targets:
                     count, _ = Candidate.objects.all().delete()
                     pc_count, _ = PartyCandidate.objects.all().delete()
@@ -1973,6 +1828,9 @@ class DataResetView(LoginRequiredMixin, View):
                     count, _ = VoteCount.objects.filter(vote_type='special').delete()
                     deleted_counts['نتائج التصويت الخاص'] = count
 
+                rebuild_rollups()
+                rebuild_tallies()
+
             if deleted_counts:
                 msg_parts = [f"{k}: {v}" for k, v in deleted_counts.items()]
                 messages.success(request, f"تم حذف البيانات بنجاح: {', '.join(msg_parts)}")
@@ -2001,48 +1859,23 @@ def api_parties_list(request):
 # ==================== Emergency Import Tool ====================
 
 def run_import_script(request):
-    """Trigger the voter import script"""
-    import threading
-    from django.core.management import call_command
+    """Queue the voter import script as a background job (run by `manage.py run_jobs`)"""
+    from .jobs import enqueue
     
     # Only allow superusers OR secret key
     secret_key = request.GET.get('secret')
     if secret_key != 'shems_voter_import_2024_secure' and not request.user.is_superuser:
         return HttpResponse('Unauthorized - Admin Access Only', status=403)
-        
-    def run_in_background():
-        import io
-        from contextlib import redirect_stdout, redirect_stderr
-        
-        try:
-            with open('import_log.txt', 'a', encoding='utf-8') as f:
-                import datetime
-                f.write(f"\n[{datetime.datetime.now()}] --- Starting voter import process ---\n")
-            
-            output = io.StringIO()
-            with redirect_stdout(output), redirect_stderr(output):
-                call_command('import_voters')
-            
-            with open('import_log.txt', 'a', encoding='utf-8') as f:
-                f.write(output.getvalue())
-                import datetime
-                f.write(f"[{datetime.datetime.now()}] --- Voter import process ended ---\n")
-        except Exception as e:
-            with open('import_log.txt', 'a', encoding='utf-8') as f:
-                import datetime
-                f.write(f"[{datetime.datetime.now()}] CRITICAL Voter import failure: {e}\n")
-
-    # Start the thread
-    thread = threading.Thread(target=run_in_background)
-    thread.daemon = True
-    thread.start()
+    
+    job = enqueue('import_voters', {'name': 'voter import process'}, user=request.user,
+                  label='Voter import (import_voters)')
 
     return HttpResponse(f'''
-        <h1>✅ Import Started Successfully!</h1>
-        <p>The voter import process is now running in the background.</p>
-        <p>You can close this page and continue using the site.</p>
+        <h1>✅ Import Queued Successfully!</h1>
+        <p>The voter import process was queued as background job #{job.pk}.</p>
+        <p>It runs in the job worker, so you can close this page and continue using the site.</p>
         <p>Data will appear gradually as it is processed (approx 10-20 mins).</p>
-        <p><a href="/tool/import-log/">View Import Log</a></p>
+        <p><a href="/tool/import-log/">View Import Log</a> | <a href="/api/jobs/{job.pk}/">Job Progress</a></p>
         <p><a href="/dashboard/">Return to Dashboard</a></p>
     ''')
 
@@ -2183,51 +2016,24 @@ def run_import_part3(request):
     return _run_import_subset(request, "Part 3 (31-38)", 31, 39)
 
 def _run_import_subset(request, name, start_batch, end_batch):
-    """Helper to run a subset of batches"""
+    """Helper to queue a subset of batches as a background job"""
+    from .jobs import enqueue
+    
     secret = request.GET.get('secret')
     if secret != 'shems_voter_import_2024_secure' and not request.user.is_superuser:
         return HttpResponse('Unauthorized - Admin Access Only', status=403)
-        
-    import threading
-    from django.core.management import call_command
     
-    def run_in_background():
-        import io
-        from contextlib import redirect_stdout, redirect_stderr
-        
-        try:
-            with open('import_log.txt', 'a', encoding='utf-8') as f:
-                import datetime
-                f.write(f"\n[{datetime.datetime.now()}] --- Starting {name} import ---\n")
-            
-            output = io.StringIO()
-            with redirect_stdout(output), redirect_stderr(output):
-                # Call command with start/end arguments (needs update in management command)
-                # But here we will rely on the script arguments update or environment variables
-                # For simplicity, we'll set an ENV var that the script can read
-                import os
-                os.environ['IMPORT_START_BATCH'] = str(start_batch)
-                os.environ['IMPORT_END_BATCH'] = str(end_batch)
-                
-                call_command('import_voters')
-            
-            with open('import_log.txt', 'a', encoding='utf-8') as f:
-                import datetime
-                f.write(output.getvalue())
-                f.write(f"[{datetime.datetime.now()}] --- {name} import process ended ---\n")
-        except Exception as e:
-            with open('import_log.txt', 'a', encoding='utf-8') as f:
-                import datetime
-                f.write(f"[{datetime.datetime.now()}] CRITICAL {name} import failure: {e}\n")
-
-    # Start the thread
-    thread = threading.Thread(target=run_in_background)
-    thread.daemon = True
-    thread.start()
+    # The import script reads the batch range from IMPORT_START_BATCH / IMPORT_END_BATCH
+    job = enqueue(
+        'import_voters',
+        {'name': f'{name} import', 'start_batch': start_batch, 'end_batch': end_batch},
+        user=request.user,
+        label=f'Voter import {name}',
+    )
 
     return HttpResponse(f'''
-        <h1>✅ {name} Import Started!</h1>
-        <p>Importing batches {start_batch} to {end_batch-1}.</p>
-        <p>Check the <a href="/tool/import-log/">Import Log</a> for progress.</p>
+        <h1>✅ {name} Import Queued!</h1>
+        <p>Importing batches {start_batch} to {end_batch-1} as background job #{job.pk}.</p>
+        <p>Check the <a href="/tool/import-log/">Import Log</a> or <a href="/api/jobs/{job.pk}/">Job Progress</a>.</p>
         <p><a href="/dashboard/">Return to Dashboard</a></p>
     ''')
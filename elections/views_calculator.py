@@ -1,12 +1,195 @@
+import json
+
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.urls import reverse
+
+from .jobs import enqueue
+from .seat_allocation import (
+    DEFAULT_FIRST_DIVISOR, DEFAULT_SEATS, MAX_PARTIES, MAX_SEATS, VOTE_FIELDS, evaluate, party_winners,
+)
+from .seat_projection import DEFAULT_SIMULATIONS, INLINE_MAX_SIMULATIONS, MAX_SIMULATIONS, project_seats
+
+
+def _parse_numbers(value, cast=float):
+    """
+    "1.7" أو "1.5,1.7,1.9" أو مدى "1.1:1.9:0.1" (بداية:نهاية:خطوة شاملة النهاية)
+    """
+    if isinstance(value, (list, tuple)):
+        return [cast(item) for item in value]
+    if isinstance(value, (int, float)):
+        return [cast(value)]
+    value = str(value).strip()
+    if ':' in value:
+        start, stop, step = (float(part) for part in value.split(':'))
+        if step <= 0:
+            raise ValueError('خطوة المدى يجب أن تكون موجبة')
+        count = int(round((stop - start) / step)) + 1
+        if count > 1000:
+            raise ValueError('المدى كبير جداً')
+        return [cast(round(start + i * step, 6)) for i in range(count)]
+    return [cast(part) for part in value.split(',') if part.strip()]
+
+
+def parse_allocation_params(data):
+    """قراءة إعدادات السيناريوهات من GET أو من جسم JSON؛ ترفع ValueError عند إدخال غير صالح"""
+    vote_type = data.get('vote_type') or 'all'
+    if vote_type not in VOTE_FIELDS:
+        raise ValueError('نوع التصويت غير صالح')
+    # العتبات تُدخل كنسبة مئوية (5 = 5%)
+    thresholds = [value / 100 for value in _parse_numbers(data.get('thresholds') or 0)]
+    params = {
+        'seats_options': _parse_numbers(data.get('seats') or DEFAULT_SEATS, int),
+        'first_divisors': _parse_numbers(data.get('divisors') or DEFAULT_FIRST_DIVISOR),
+        'thresholds': thresholds,
+        'reserved_seats': int(data.get('reserved') or 0),
+        'vote_type': vote_type,
+    }
+    parties = data.get('parties')
+    if parties is not None:
+        if len(parties) > MAX_PARTIES:
+            raise ValueError(f'عدد الكيانات ({len(parties)}) يتجاوز الحد ({MAX_PARTIES})')
+        params['parties'] = [
+            {'name': str(party.get('name') or ''), 'votes': max(0, int(party.get('votes') or 0))}
+            for party in parties
+        ]
+    return params
+
 
 class SainteLagueCalculatorView(LoginRequiredMixin, TemplateView):
     template_name = 'elections/sainte_lague_calculator.html'
-    
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # We can add default settings here if needed, but JS will handle most.
         # Default divisor for Iraq 2025 (Modified Sainte-Laguë) is usually 1.7
-        context['default_divisor'] = 1.7 
+        context['default_divisor'] = DEFAULT_FIRST_DIVISOR
+        return context
+
+
+@login_required
+def seat_allocation_api(request):
+    """
+    API توزيع المقاعد: GET على الأصوات الحية، أو POST بجسم JSON يتضمن "parties" لأصوات يدوية
+    مثال: ?seats=25&divisors=1.1:1.9:0.1&thresholds=0,2,5&reserved=1&vote_type=all
+    """
+    try:
+        data = json.loads(request.body) if request.method == 'POST' else request.GET
+        result = evaluate(**parse_allocation_params(data))
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse({'success': True, **result})
+
+
+class SeatAllocationReportView(LoginRequiredMixin, TemplateView):
+    """تقرير السيناريوهات: مقاعد كل كيان لكل تركيبة قاسم / عتبة / عدد مقاعد، والفائزون في السيناريو الأول"""
+    template_name = 'elections/seat_allocation_report.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        try:
+            params = parse_allocation_params(self.request.GET)
+            params.pop('parties', None)
+            result = evaluate(**params)
+        except (ValueError, TypeError) as e:
+            context['error'] = str(e)
+            return context
+
+        parties = result['parties']
+        # الكيانات التي لم تفز بأي مقعد في أي سيناريو تُحذف من الجدول
+        columns = [index for index, bounds in enumerate(result['range_by_party']) if bounds['max'] > 0]
+        context['parties'] = [parties[index] for index in columns]
+        context['ranges'] = [result['range_by_party'][index] for index in columns]
+        context['rows'] = [
+            {**scenario, 'cells': [scenario['seats_by_party'][index] for index in columns]}
+            for scenario in result['scenarios']
+        ]
+        context['result'] = result
+
+        base = result['scenarios'][0]
+        base_seats = {party['id']: seats for party, seats in zip(parties, base['seats_by_party'])}
+        winners = party_winners(base_seats, result['vote_type'])
+        context['base_scenario'] = base
+        context['winners'] = [
+            {'party': party, 'seats': base_seats[party['id']], 'candidates': winners.get(party['id'], [])}
+            for party in parties if base_seats[party['id']] > 0
+        ]
+        context['query'] = self.request.GET
+        return context
+
+
+def parse_projection_params(data):
+    """إعدادات توقع المقاعد (سيناريو واحد)؛ العتبة كنسبة مئوية"""
+    vote_type = data.get('vote_type') or 'all'
+    if vote_type not in VOTE_FIELDS:
+        raise ValueError('نوع التصويت غير صالح')
+    threshold = float(data.get('threshold') or 0) / 100
+    if not 0 <= threshold < 1:
+        raise ValueError('العتبة يجب أن تكون بين 0 و 100')
+    seats = int(data.get('seats') or DEFAULT_SEATS)
+    if not 0 < seats <= MAX_SEATS:
+        raise ValueError(f'عدد المقاعد يجب أن يكون بين 1 و {MAX_SEATS}')
+    first_divisor = float(data.get('divisor') or DEFAULT_FIRST_DIVISOR)
+    if not first_divisor > 0:
+        raise ValueError('القاسم يجب أن يكون موجباً')
+    simulations = int(data.get('simulations') or DEFAULT_SIMULATIONS)
+    if not 0 < simulations <= MAX_SIMULATIONS:
+        raise ValueError(f'عدد المحاكاة يجب أن يكون بين 1 و {MAX_SIMULATIONS:,}')
+    return {
+        'seats': seats,
+        'first_divisor': first_divisor,
+        'threshold': threshold,
+        'reserved_seats': int(data.get('reserved') or 0),
+        'vote_type': vote_type,
+        'simulations': simulations,
+    }
+
+
+@login_required
+def seat_projection_api(request):
+    """
+    API توقع المقاعد من المحطات المُبلغة: توزيع احتمالي لمقاعد كل كيان
+    المحاكاة الكبيرة (أكثر من INLINE_MAX_SIMULATIONS) تُرسل إلى طابور المهام ويُعاد رقم المهمة
+    مثال: ?seats=25&divisor=1.7&threshold=0&simulations=2000
+    """
+    try:
+        params = parse_projection_params(request.GET)
+        if params['simulations'] > INLINE_MAX_SIMULATIONS:
+            job = enqueue('seat_projection', params, user=request.user,
+                          label=f"توقع المقاعد ({params['simulations']:,} محاكاة)")
+            return JsonResponse({
+                'success': True,
+                'job_id': job.pk,
+                'status_url': reverse('job_status', args=[job.pk]),
+            }, status=202)
+        result = project_seats(**params)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse({'success': True, **result})
+
+
+class SeatProjectionView(LoginRequiredMixin, TemplateView):
+    """صفحة توقع المقاعد: احتمال عدد مقاعد كل كيان حسب المحطات المُبلغة حتى الآن"""
+    template_name = 'elections/seat_projection.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET
+        try:
+            params = parse_projection_params(self.request.GET)
+            params['simulations'] = min(params['simulations'], INLINE_MAX_SIMULATIONS)
+            result = project_seats(**params)
+        except (ValueError, TypeError) as e:
+            context['error'] = str(e)
+            return context
+
+        # أعمدة المدرج التكراري: من 0 إلى أكبر عدد مقاعد ظهر في أي محاكاة
+        max_seats = max((int(k) for party in result['parties'] for k in party['seat_probabilities']), default=0)
+        context['seat_columns'] = list(range(max_seats + 1))
+        context['rows'] = [
+            {**party, 'histogram': [party['seat_probabilities'].get(str(k), 0) for k in context['seat_columns']]}
+            for party in result['parties']
+        ]
+        context['result'] = result
         return context
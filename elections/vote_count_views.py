@@ -3,18 +3,18 @@ from django.views.generic import TemplateView, ListView, CreateView, DetailView,
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView, LogoutView
 from django.urls import reverse_lazy
-from django.http import JsonResponse, HttpResponse
-from django.db.models import Q, Count, Sum, Case, When, Value, IntegerField
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.db.models import Count, Case, When, Value, IntegerField
 from django.contrib import messages
 from datetime import datetime, timedelta
 from django.utils import timezone
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.contrib.auth.decorators import login_required
 
 from .models import (
     Voter, Candidate, Anchor, Introducer, CandidateMonitor,
     CommunicationLog, CampaignTask, Area, Neighborhood,
-    PoliticalParty, PartyCandidate, PollingCenter, PollingStation, VoteCount
+    PoliticalParty, PartyCandidate, PollingCenter, PollingStation, VoteCount, VoteTally
 )
 from .forms import (
     CandidateForm, AnchorForm, IntroducerForm, VoterAssignmentForm,
@@ -23,6 +23,13 @@ from .forms import (
     PollingStationForm, VoteCountForm, QuickVoteCountForm,
     GeneralVoteCountForm, SpecialVoteCountForm
 )
+from .candidate_resolver import candidate_resolver
+from .exports import is_asgi
+from .idempotency import idempotent
+from .polling_directory import polling_directory
+from .search import normalize_digits
+from .tallies import tally_vote_counts, vote_totals_payload, with_tallies
+from .tally_stream import event_stream
 
 
 # ==================== General Vote Counting (جرد عام) ====================
@@ -219,34 +226,25 @@ class CombinedResultsView(LoginRequiredMixin, TemplateView):
         
         # Aggregate results by candidate (combining general + special)
         # Note: stations_voted and stations_not_voted are model fields, not aggregates
-        candidate_results = PartyCandidate.objects.annotate(
-            general_votes=Sum('vote_counts__vote_count', filter=Q(vote_counts__vote_type='general')),
-            special_votes=Sum('vote_counts__vote_count', filter=Q(vote_counts__vote_type='special')),
-            total_votes=Sum('vote_counts__vote_count')
-        ).select_related('party').order_by('-total_votes')
+        candidate_results = with_tallies(
+            PartyCandidate.objects.select_related('party'), VoteTally.SCOPE_CANDIDATE
+        ).order_by('-total_votes')
         
         # Apply party filter to candidate results
         if party_filter:
             candidate_results = candidate_results.filter(party_id=party_filter)
         
         # Aggregate results by party
-        party_results = PoliticalParty.objects.annotate(
-            general_votes=Sum('candidates__vote_counts__vote_count', filter=Q(candidates__vote_counts__vote_type='general')),
-            special_votes=Sum('candidates__vote_counts__vote_count', filter=Q(candidates__vote_counts__vote_type='special')),
-            total_votes=Sum('candidates__vote_counts__vote_count')
-        ).order_by('-total_votes')
+        party_results = with_tallies(PoliticalParty.objects.all(), VoteTally.SCOPE_PARTY).order_by('-total_votes')
         
         # Aggregate results by center
-        center_results = PollingCenter.objects.annotate(
-            general_votes=Sum('stations__vote_counts__vote_count', filter=Q(stations__vote_counts__vote_type='general')),
-            special_votes=Sum('stations__vote_counts__vote_count', filter=Q(stations__vote_counts__vote_type='special')),
-            total_votes=Sum('stations__vote_counts__vote_count')
-        ).order_by('-total_votes')
+        center_results = with_tallies(PollingCenter.objects.all(), VoteTally.SCOPE_CENTER).order_by('-total_votes')
         
         # Statistics
-        total_general_votes = VoteCount.objects.filter(vote_type='general').aggregate(Sum('vote_count'))['vote_count__sum'] or 0
-        total_special_votes = VoteCount.objects.filter(vote_type='special').aggregate(Sum('vote_count'))['vote_count__sum'] or 0
-        total_all_votes = total_general_votes + total_special_votes
+        totals = VoteTally.totals()
+        total_general_votes = totals.general_votes
+        total_special_votes = totals.special_votes
+        total_all_votes = totals.total_votes
         
         # Filters for dropdowns
         context['centers'] = PollingCenter.objects.all()
@@ -279,24 +277,16 @@ def get_polling_center_info(request, center_number):
     AJAX endpoint لجلب معلومات مركز الاقتراع بناءً على رقمه
     """
     try:
-        # Normalize input: Strip whitespace and convert Arabic numerals to Western
-        center_number = str(center_number).strip().translate(str.maketrans('٠١٢٣٤٥٦٧٨٩', '0123456789'))
-        
-        # Try finding center by exact number
-        center = PollingCenter.objects.filter(center_number=center_number).first()
-        
-        # If not found and it's an 8-digit code (common in some QR formats), try first 6 digits
-        if not center and len(center_number) == 8:
-            fallback_number = center_number[:6]
-            center = PollingCenter.objects.filter(center_number=fallback_number).first()
-            
+        # الرقم يُطبّع ويُبحث عنه (مع قاعدة الـ 8 أرقام) في دليل المراكز والمحطات في الذاكرة
+        center = polling_directory.find_center(center_number)
         if not center:
             raise PollingCenter.DoesNotExist
         
         # جلب المحطات المرتبطة بالمركز
-        stations = PollingStation.objects.filter(center=center).values(
-            'id', 'station_number', 'full_number'
-        )
+        stations = [
+            {'id': station.pk, 'station_number': station.station_number, 'full_number': station.full_number}
+            for station in polling_directory.center_stations(center)
+        ]
         
         data = {
             'success': True,
@@ -313,7 +303,7 @@ def get_polling_center_info(request, center_number):
                 'governorate': center.governorate,
                 'station_count': center.station_count,
             },
-            'stations': list(stations)
+            'stations': stations
         }
         
         return JsonResponse(data)
@@ -340,27 +330,24 @@ class VoteTotalsDashboardView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         
         # إحصائيات حسب المرشح (عام + خاص)
-        candidate_totals = PartyCandidate.objects.annotate(
-            general_votes=Sum('vote_counts__vote_count', filter=Q(vote_counts__vote_type='general')),
-            special_votes=Sum('vote_counts__vote_count', filter=Q(vote_counts__vote_type='special')),
-            total_votes=Sum('vote_counts__vote_count')
-        ).filter(total_votes__gt=0).select_related('party').order_by('-total_votes')
+        candidate_totals = with_tallies(
+            PartyCandidate.objects.select_related('party'), VoteTally.SCOPE_CANDIDATE
+        ).filter(total_votes__gt=0).order_by('-total_votes')
         
         # إحصائيات حسب الحزب
-        party_totals = PoliticalParty.objects.annotate(
-            general_votes=Sum('candidates__vote_counts__vote_count', filter=Q(candidates__vote_counts__vote_type='general')),
-            special_votes=Sum('candidates__vote_counts__vote_count', filter=Q(candidates__vote_counts__vote_type='special')),
-            total_votes=Sum('candidates__vote_counts__vote_count')
+        party_totals = with_tallies(
+            PoliticalParty.objects.all(), VoteTally.SCOPE_PARTY
         ).filter(total_votes__gt=0).order_by('-total_votes')
         
         # إجمالي عام
-        total_general = VoteCount.objects.filter(vote_type='general').aggregate(Sum('vote_count'))['vote_count__sum'] or 0
-        total_special = VoteCount.objects.filter(vote_type='special').aggregate(Sum('vote_count'))['vote_count__sum'] or 0
-        total_all = total_general + total_special
+        totals = VoteTally.totals()
+        total_general = totals.general_votes
+        total_special = totals.special_votes
+        total_all = totals.total_votes
         
         # عدد السجلات
-        general_count = VoteCount.objects.filter(vote_type='general').count()
-        special_count = VoteCount.objects.filter(vote_type='special').count()
+        general_count = totals.general_entries
+        special_count = totals.special_entries
         
         context['candidate_totals'] = candidate_totals
         context['party_totals'] = party_totals
@@ -379,60 +366,9 @@ def get_vote_totals_api(request):
     AJAX API endpoint لجلب المجموع الإجمالي للأصوات (للتحديث التلقائي)
     """
     try:
-        # إحصائيات حسب المرشح
-        candidate_totals = list(
-            PartyCandidate.objects.annotate(
-                general_votes=Sum('vote_counts__vote_count', filter=Q(vote_counts__vote_type='general')),
-                special_votes=Sum('vote_counts__vote_count', filter=Q(vote_counts__vote_type='special')),
-                total_votes=Sum('vote_counts__vote_count')
-            ).filter(total_votes__gt=0).values(
-                'party__serial_number',
-                'serial_number',
-                'full_name',
-                'party__name',
-                'party__color',
-                'general_votes',
-                'special_votes',
-                'total_votes'
-            ).order_by('-total_votes')
-        )
-        
-        # إحصائيات حسب الحزب
-        party_totals = list(
-            PoliticalParty.objects.annotate(
-                general_votes=Sum('candidates__vote_counts__vote_count', filter=Q(candidates__vote_counts__vote_type='general')),
-                special_votes=Sum('candidates__vote_counts__vote_count', filter=Q(candidates__vote_counts__vote_type='special')),
-                total_votes=Sum('candidates__vote_counts__vote_count')
-            ).filter(total_votes__gt=0).values(
-                'serial_number',
-                'name',
-                'color',
-                'general_votes',
-                'special_votes',
-                'total_votes'
-            ).order_by('-total_votes')
-        )
-        
-        # إجمالي عام
-        total_general = VoteCount.objects.filter(vote_type='general').aggregate(Sum('vote_count'))['vote_count__sum'] or 0
-        total_special = VoteCount.objects.filter(vote_type='special').aggregate(Sum('vote_count'))['vote_count__sum'] or 0
-        total_all = total_general + total_special
-        
-        # عدد السجلات
-        general_count = VoteCount.objects.filter(vote_type='general').count()
-        special_count = VoteCount.objects.filter(vote_type='special').count()
-        
         data = {
             'success': True,
-            'candidate_totals': candidate_totals,
-            'party_totals': party_totals,
-            'totals': {
-                'general': total_general,
-                'special': total_special,
-                'all': total_all,
-                'general_count': general_count,
-                'special_count': special_count
-            },
+            **vote_totals_payload(),
             'last_updated': timezone.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
@@ -445,7 +381,33 @@ def get_vote_totals_api(request):
         }, status=500)
 
 
+async def vote_totals_stream(request):
+    """
+    بث مباشر (Server-Sent Events) لتغييرات المجاميع بدل الاستطلاع الدوري لـ get_vote_totals_api
+    الحدث الأول لقطة كاملة (snapshot) ثم فروقات (tally)؛ عند إعادة الاتصال يُستأنف من Last-Event-ID
+    يتطلب التشغيل عبر ASGI (electoral_office/asgi.py)؛ تحت WSGI يعيد 503 فتعود اللوحة إلى الاستطلاع الدوري
+    """
+    if not is_asgi(request):
+        return JsonResponse({'success': False, 'error': 'البث المباشر غير متاح على هذا الخادم'}, status=503)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'success': False, 'error': 'يجب تسجيل الدخول'}, status=401)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('cursor')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    response = StreamingHttpResponse(event_stream(last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # تعطيل التخزين المؤقت في nginx
+    return response
+
+
 @login_required # Ensure user is logged in
+@idempotent('save_bulk_votes')
 def save_bulk_votes(request):
     """
     API endpoint لحفظ مجموعة من الأصوات دفعة واحدة (من QR Code)
@@ -465,29 +427,11 @@ def save_bulk_votes(request):
         if not all([center_number, station_number, votes_data]):
             return JsonResponse({'success': False, 'error': 'بيانات غير مكتملة'}, status=400)
             
-        # 1. Get Center
-        try:
-            # Normalize input
-            center_number = str(center_number).strip().translate(str.maketrans('٠١٢٣٤٥٦٧٨٩', '0123456789'))
-            station_number = str(station_number).strip().translate(str.maketrans('٠١٢٣٤٥٦٧٨٩', '0123456789'))
-            
-            # Try finding center by exact number
-            center = PollingCenter.objects.filter(center_number=center_number).first()
-            
-            # Fallback for 8-digit codes
-            if not center and len(center_number) == 8:
-                fallback_number = center_number[:6]
-                center = PollingCenter.objects.filter(center_number=fallback_number).first()
-                
-            if not center:
-                raise PollingCenter.DoesNotExist
-        except PollingCenter.DoesNotExist:
+        # 1-2. Get Center and Station from the in-memory directory (normalization and 8-digit fallback included)
+        center, station = polling_directory.find_station(center_number, station_number)
+        if not center:
             return JsonResponse({'success': False, 'error': f'مركز الاقتراع رقم {center_number} غير موجود'}, status=404)
-
-        # 2. Get Station
-        try:
-            station = PollingStation.objects.get(center=center, station_number=station_number)
-        except (PollingStation.DoesNotExist, ValueError):
+        if not station:
             return JsonResponse({'success': False, 'error': f'المحطة رقم {station_number} غير موجودة في هذا المركز'}, status=404)
         # 3. Check for existing votes for this station/type
         # If we have any votes for this station and this type, we warn/error?
@@ -504,81 +448,68 @@ def save_bulk_votes(request):
                 'error': f'توجد بيانات مسجلة مسبقاً لهذه المحطة ({existing_count} سجل). يرجى حذفها أولاً إذا كنت تريد إعادة الإدخال.'
             }, status=409)
 
-        # 4. Save Votes
-        saved_count = 0
-        with transaction.atomic():
-            for vote_entry in votes_data:
-                candidate_id = vote_entry.get('candidateId') or vote_entry.get('candidate_id')
-                count = vote_entry.get('voteCount') or vote_entry.get('count')
-                
-                if candidate_id is None or count is None:
-                    continue
-                    
-                # Find Candidate
-                # Trying to match candidate_id (from QR) to PartyCandidate
-                # QR ID likely corresponds to 'serial_number' within the list if per-party,
-                # OR 'candidate_code', OR strict DB ID.
-                # Given user context: "114" is State of Law (Party IDs usually).
-                # Wait, "114" is a LIST NUMBER (tsaful).
-                # PartyCandidate has 'serial_number'.
-                # But lists have numbers (Parties have numbers).
-                # If "114" is "State of Law", that's a PARTY number (PoliticalParty.serial_number).
-                # But votes are cast for CANDIDATES? Or Lists?
-                # In Iraqi elections, you vote for a List (Party) AND optionally a Candidate.
-                # VoteCount model links to `PartyCandidate`.
-                # If the input is just "114" (Party) with count 50, does it mean 50 votes for the party head?
-                # Or does `VoteCount` support voting for a Party directly?
-                # `VoteCount.candidate` is ForeignKey to `PartyCandidate`.
-                # If the generic vote is for the list, usually there is a "List 114" candidate entity?
-                # Or maybe the system creates a "Party Vote" dummy candidate?
-                # Let's check if there is a PartyCandidate with serial_number 114? 
-                # Or if there is a Candidate whose ID is 114?
-                
-                # Search Strategy:
-                # 1. Try PartyCandidate PK (ID)
-                # 2. Try PoliticalParty Serial Number (assuming it maps to the 'Head of List' or we need to handle Party Votes separate)
-                # Note: The current VoteCount model ONLY links to PartyCandidate. 
-                # If valid candidates are just candidates, then 114 must be a candidate.
-                
-                candidate = None
-                
-                # Case A: Try valid ID
-                if str(candidate_id).isdigit():
-                    candidate = PartyCandidate.objects.filter(pk=candidate_id).first()
-                    
-                # Case B: Try Candidate Code
-                if not candidate:
-                    candidate = PartyCandidate.objects.filter(candidate_code=candidate_id).first()
-                    
-                # Case C: Try Serial Number (risky if not unique across parties? No, Party.serial is unique, Candidate.serial is per party)
-                # If candidate_id matches a Party Serial Number, maybe we pick the first candidate?
-                if not candidate:
-                    # Check if it's a Party ID?
-                    party = PoliticalParty.objects.filter(serial_number=candidate_id).first()
-                    if party:
-                        # Find the "List Vote" candidate or the first candidate?
-                        # Usually, there is a candidate entry representing the list itself or just assign to the first/leader.
-                        # For now, warning if not found.
-                        pass
-                
-                if candidate:
-                    VoteCount.objects.create(
-                        station=station,
-                        candidate=candidate,
-                        vote_count=int(count),
-                        vote_type=vote_type,
-                        entered_by=request.user
-                    )
-                    saved_count += 1
-                else:
-                    # Skip or error?
-                    # Ideally log detailed errors.
-                    pass
-        
+        # 4. Validate the whole sheet, resolving candidates from the in-memory map
+        entries = []
+        for vote_entry in votes_data:
+            candidate_id = vote_entry.get('candidateId') or vote_entry.get('candidate_id')
+            count = vote_entry.get('voteCount') or vote_entry.get('count')
+            if candidate_id is None or count is None:
+                continue
+            entries.append((normalize_digits(str(candidate_id)), count))
+
+        invalid = []
+        for key, count in entries:
+            try:
+                if int(normalize_digits(str(count))) < 0:
+                    invalid.append(key)
+            except ValueError:
+                invalid.append(key)
+        if invalid:
+            return JsonResponse({
+                'success': False,
+                'error': f'عدد أصوات غير صالح للمرشحين: {", ".join(invalid[:20])}'
+            }, status=400)
+
+        resolved = candidate_resolver.resolve_many(key for key, _ in entries)
+        vote_counts = {}
+        skipped = []
+        for key, count in entries:
+            candidate_pk = resolved.get(key)
+            if candidate_pk is None:
+                # Unknown candidate ids (e.g. a list number) are skipped as before
+                skipped.append(key)
+                continue
+            if candidate_pk in vote_counts:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'المرشح {key} مكرر في البيانات المرسلة'
+                }, status=400)
+            vote_counts[candidate_pk] = VoteCount(
+                station=station,
+                candidate_id=candidate_pk,
+                vote_count=int(normalize_digits(str(count))),
+                vote_type=vote_type,
+                entered_by=request.user
+            )
+
+        # 5. Save Votes (one INSERT, tallies updated in the same transaction)
+        try:
+            with transaction.atomic():
+                VoteCount.objects.bulk_create(vote_counts.values(), batch_size=500)
+                tally_vote_counts(vote_counts.values())
+        except IntegrityError:
+            # Another entry for this station was saved concurrently, or a candidate was just deleted
+            candidate_resolver.clear()
+            return JsonResponse({
+                'success': False,
+                'error': 'توجد بيانات مسجلة مسبقاً لهذه المحطة أو تغيرت قائمة المرشحين. يرجى إعادة المحاولة.'
+            }, status=409)
+
         return JsonResponse({
             'success': True, 
-            'message': f'تم حفظ {saved_count} سجل بنجاح للمحطة {station.full_number}',
-            'station_full_number': station.full_number
+            'message': f'تم حفظ {len(vote_counts)} سجل بنجاح للمحطة {station.full_number}',
+            'station_full_number': station.full_number,
+            'skipped': skipped,
         })
 
     except json.JSONDecodeError:
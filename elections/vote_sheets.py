@@ -0,0 +1,123 @@
+"""
+حفظ ورقة نتائج محطة كاملة (أصوات كل المرشحين لنوع تصويت واحد) دفعة واحدة
+التحقق من الورقة كاملة قبل الحفظ، ثم جملة upsert واحدة (bulk_create مع update_conflicts)
+وتحديث المجاميع بالفروقات، مع إرجاع ما تغير لكل مرشح (جديد / معدّل / دون تغيير)
+"""
+from django.db import transaction
+
+from .candidate_resolver import candidate_resolver
+from .models import PollingStation, VoteCount
+from .search import normalize_digits
+from .tallies import apply_tally_deltas
+
+STATUS_CREATED = 'created'
+STATUS_UPDATED = 'updated'
+STATUS_UNCHANGED = 'unchanged'
+
+
+def parse_sheet_counts(values, skip_zero=False):
+    """
+    تحويل {معرف المرشح: العدد كما أُدخل} إلى ({pk: عدد}, [أخطاء])
+    الحقول الفارغة تُتجاهل؛ skip_zero يتجاهل الأصفار أيضاً (نماذج تبدأ كل حقولها بصفر)
+    """
+    resolved = candidate_resolver.resolve_many(values)
+    counts, errors = {}, []
+    for key, raw in values.items():
+        raw = '' if raw is None else normalize_digits(str(raw))
+        if raw == '':
+            continue
+        candidate_pk = resolved.get(normalize_digits(str(key)))
+        if candidate_pk is None:
+            errors.append(f'المرشح {key} غير موجود')
+            continue
+        try:
+            count = int(raw)
+        except ValueError:
+            errors.append(f'عدد أصوات غير صالح للمرشح {key}: {raw}')
+            continue
+        if count < 0:
+            errors.append(f'عدد أصوات سالب للمرشح {key}')
+            continue
+        if skip_zero and count == 0:
+            continue
+        if candidate_pk in counts:
+            errors.append(f'المرشح {key} مكرر في الورقة')
+            continue
+        counts[candidate_pk] = count
+    return counts, errors
+
+
+def parse_sheet_versions(values):
+    """تحويل {معرف المرشح: النسخة المقروءة أو فارغ} إلى {pk: نسخة أو None}؛ المعرفات غير المعروفة تُتجاهل"""
+    resolved = candidate_resolver.resolve_many(values)
+    versions = {}
+    for key, raw in values.items():
+        candidate_pk = resolved.get(normalize_digits(str(key)))
+        raw = '' if raw is None else normalize_digits(str(raw))
+        if candidate_pk is None or not (raw == '' or raw.isdigit()):
+            continue
+        versions[candidate_pk] = int(raw) if raw else None
+    return versions
+
+
+def save_station_sheet(station, vote_type, counts, user=None, expected_versions=None):
+    """
+    حفظ {candidate_id: عدد} لمحطة ونوع تصويت بجملة upsert واحدة
+    الصفر لمرشح ليس له سجل لا يُنشئ سجلاً؛ يعيد قائمة الفروقات لكل مرشح في الورقة
+    expected_versions: {candidate_id: النسخة التي قرأها المستخدم أو None إن لم يكن له سجل}؛
+    أي اختلاف يرفع VoteCount.StaleVersion بقائمة المرشحين المتعارضين ولا يُحفظ شيء
+    """
+    with transaction.atomic():
+        # قفل المحطة يمنع ورقتين متزامنتين لنفس المحطة من حساب الفروقات على نفس القيم القديمة
+        PollingStation.objects.select_for_update().filter(pk=station.pk).first()
+        existing = {
+            candidate_id: (count, version)
+            for candidate_id, count, version in VoteCount.objects.filter(
+                station=station, vote_type=vote_type, candidate_id__in=counts
+            ).values_list('candidate_id', 'vote_count', 'version')
+        }
+        if expected_versions:
+            conflicts = [
+                candidate_id for candidate_id, version in expected_versions.items()
+                if candidate_id in counts and existing.get(candidate_id, (None, None))[1] != version
+            ]
+            if conflicts:
+                raise VoteCount.StaleVersion(conflicts)
+
+        diff, rows, deltas = [], [], []
+        for candidate_id, new in counts.items():
+            old, version = existing.get(candidate_id, (None, 0))
+            if old is None and new == 0:
+                continue
+            if old == new:
+                diff.append({'candidate_id': candidate_id, 'old': old, 'new': new, 'status': STATUS_UNCHANGED,
+                             'version': version})
+                continue
+            rows.append(VoteCount(
+                station=station, candidate_id=candidate_id, vote_type=vote_type,
+                vote_count=new, entered_by=user, version=version + 1,
+            ))
+            deltas.append((station.pk, candidate_id, vote_type, new - (old or 0), 0 if old is not None else 1))
+            diff.append({
+                'candidate_id': candidate_id, 'old': old, 'new': new,
+                'status': STATUS_CREATED if old is None else STATUS_UPDATED, 'version': version + 1,
+            })
+
+        if rows:
+            VoteCount.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['station', 'candidate', 'vote_type'],
+                update_fields=['vote_count', 'entered_by', 'updated_at', 'version'],
+                batch_size=500,
+            )
+            apply_tally_deltas(deltas)
+    return diff
+
+
+def summarize_diff(diff):
+    """عدد السجلات الجديدة والمعدّلة وغير المتغيرة"""
+    summary = dict.fromkeys((STATUS_CREATED, STATUS_UPDATED, STATUS_UNCHANGED), 0)
+    for row in diff:
+        summary[row['status']] += 1
+    return summary
@@ -0,0 +1,248 @@
+"""
+استيراد سجل الناخبين السريع من ملفات التصدير (voters_data_parts / voter_batches)
+السجلات تُقرأ من ملف JSON (أو من داخل ZIP) بشكل متدفق دون تحميل الملف كاملاً في الذاكرة،
+وتُكتب على دفعات: bulk_create على SQLite و COPY FROM STDIN (عبر جدول مؤقت + ON CONFLICT) على PostgreSQL
+"""
+import io
+import json
+import time
+import zipfile
+from pathlib import Path
+
+from django.db import connection, transaction
+
+from .models import Voter
+from .search import build_voter_search_text
+
+# عدد السجلات في كل دفعة كتابة
+IMPORT_BATCH_SIZE = 5000
+
+# حجم القراءة من الملف في كل مرة (أحرف)
+READ_CHUNK_SIZE = 1 << 20
+
+STAGE_TABLE = 'voter_import_stage'
+
+
+# ==================== القراءة المتدفقة ====================
+
+def iter_fixture_records(stream, chunk_size=READ_CHUNK_SIZE):
+    """
+    قراءة عناصر مصفوفة JSON (صيغة dumpdata) عنصراً عنصراً من ملف نصي
+    لا يُحتفظ في الذاكرة إلا بالجزء غير المحلل من آخر قراءة
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    started = False
+    eof = False
+
+    while True:
+        # تخطي الفواصل والمسافات بين العناصر
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if not started and pos < len(buffer):
+            if buffer[pos] != '[':
+                raise ValueError('الملف ليس مصفوفة JSON')
+            started = True
+            pos += 1
+            continue
+        if started and pos < len(buffer) and buffer[pos] == ']':
+            return
+
+        if pos < len(buffer):
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                record = None
+            if record is not None:
+                pos = end
+                yield record
+                continue
+
+        if eof:
+            return
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def open_part(path):
+    """فتح ملف دفعة (JSON أو ZIP يحتوي ملف JSON واحد) كنص UTF-8"""
+    path = Path(path)
+    if path.suffix == '.zip':
+        archive = zipfile.ZipFile(path)
+        member = archive.open(archive.namelist()[0])
+        return io.TextIOWrapper(member, encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def part_number(path):
+    """رقم الدفعة من اسم الملف (voters_part_007.zip / voters_batch_007.json -> 7)"""
+    digits = ''.join(ch for ch in Path(path).stem.rsplit('_', 1)[-1] if ch.isdigit())
+    return int(digits) if digits else None
+
+
+def iter_voter_fields(path):
+    """(pk, fields) لكل ناخب في ملف الدفعة"""
+    with open_part(path) as stream:
+        for record in iter_fixture_records(stream):
+            if record.get('model', 'elections.voter') == 'elections.voter':
+                yield record.get('pk'), record.get('fields', {})
+
+
+# ==================== تحويل السجلات ====================
+
+class VoterRowBuilder:
+    """
+    تحويل حقول السجل إلى أعمدة جدول الناخبين
+    المفاتيح الأجنبية لسجلات غير موجودة محلياً تُترك فارغة (بدل فشل الدفعة كاملة)
+    """
+
+    def __init__(self):
+        # المفتاح الأساسي أول حقل في concrete_fields، فترتيب الأعمدة يطابق ترتيب الحقول
+        self.fields = list(Voter._meta.concrete_fields[1:])
+        self.columns = [f.column for f in Voter._meta.concrete_fields]
+        self.known_ids = {
+            f.name: set(f.related_model._default_manager.values_list('pk', flat=True))
+            for f in self.fields if f.is_relation
+        }
+
+    def values(self, pk, data):
+        """قيم الأعمدة بترتيب self.columns"""
+        row = [pk]
+        for field in self.fields:
+            if field.name == 'search_text':
+                value = build_voter_search_text(data)
+            elif field.name in data:
+                value = data[field.name]
+                if field.is_relation and value not in self.known_ids[field.name]:
+                    value = None
+            else:
+                value = field.get_default()
+            row.append(value)
+        return row
+
+    def instance(self, pk, data):
+        """كائن Voter غير محفوظ (لـ bulk_create)"""
+        # الإنشاء بالمعاملات الموضعية (بترتيب concrete_fields) أسرع بكثير من الكلمات المفتاحية
+        return Voter(*self.values(pk, data))
+
+
+# ==================== الكتابة ====================
+
+def _copy_text(value):
+    """ترميز قيمة لصيغة COPY النصية"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _copy_from(cursor, sql, data):
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):  # psycopg2
+        raw.copy_expert(sql, io.StringIO(data))
+    else:  # psycopg 3
+        with raw.copy(sql) as copy:
+            copy.write(data)
+
+
+def _write_postgres(builder, batch):
+    """COPY إلى جدول مؤقت ثم INSERT ... ON CONFLICT DO NOTHING (يعيد عدد الصفوف المضافة)"""
+    columns = ', '.join(connection.ops.quote_name(c) for c in builder.columns)
+    table = connection.ops.quote_name(Voter._meta.db_table)
+    data = ''.join(
+        '\t'.join(_copy_text(v) for v in builder.values(pk, fields)) + '\n'
+        for pk, fields in batch
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} '
+            f'(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS'
+        )
+        _copy_from(cursor, f'COPY {STAGE_TABLE} ({columns}) FROM STDIN', data)
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {STAGE_TABLE} '
+            f'ON CONFLICT DO NOTHING'
+        )
+        return cursor.rowcount
+
+
+def _write_orm(builder, batch):
+    """
+    bulk_create مع تجاهل المكررات (يعيد عدد الصفوف المضافة، SQLite)
+    كل جزء جملة INSERT واحدة، فيُقرأ عدد المضاف منها بـ changes() (لا يحسب صفوف مشغلات فهرس البحث)
+    """
+    voters = [builder.instance(pk, fields) for pk, fields in batch]
+    size = connection.ops.bulk_batch_size(Voter._meta.concrete_fields, voters)
+    inserted = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(voters), size):
+            Voter.objects.bulk_create(voters[start:start + size], batch_size=size, ignore_conflicts=True)
+            cursor.execute('SELECT changes()')
+            inserted += cursor.fetchone()[0]
+    return inserted
+
+
+def import_part(path, batch_size=IMPORT_BATCH_SIZE, builder=None, on_batch=None):
+    """
+    استيراد ملف دفعة واحد
+    يعيد قاموس: part, read, inserted, with_introducer, seconds
+    """
+    builder = builder or VoterRowBuilder()
+    write = _write_postgres if connection.vendor == 'postgresql' else _write_orm
+    stats = {'part': part_number(path), 'read': 0, 'inserted': 0, 'with_introducer': 0}
+    start = time.time()
+
+    batch = []
+    for pk, fields in iter_voter_fields(path):
+        batch.append((pk, fields))
+        if fields.get('introducer'):
+            stats['with_introducer'] += 1
+        if len(batch) >= batch_size:
+            stats['inserted'] += write(builder, batch)
+            stats['read'] += len(batch)
+            batch = []
+            if on_batch:
+                on_batch(stats)
+    if batch:
+        stats['inserted'] += write(builder, batch)
+        stats['read'] += len(batch)
+        if on_batch:
+            on_batch(stats)
+
+    stats['seconds'] = time.time() - start
+    return stats
+
+
+def reset_voter_sequence():
+    """مزامنة تسلسل المفتاح الأساسي بعد إدخال مفاتيح صريحة (PostgreSQL)"""
+    from django.core.management.color import no_style
+    statements = connection.ops.sequence_reset_sql(no_style(), [Voter])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+# ==================== التنفيذ المتوازي ====================
+
+def init_import_worker():
+    import django
+    from django.apps import apps
+    if not apps.ready:  # spawn (Windows/macOS): العملية الفرعية تبدأ بدون إعداد Django
+        django.setup()
+
+
+def import_part_worker(path, batch_size):
+    from django.db import connections
+    try:
+        return import_part(path, batch_size)
+    finally:
+        connections.close_all()
@@ -0,0 +1,293 @@
+"""
+خدمة موحدة للبحث عن الناخبين برقم الناخب
+تجمع السجل المحلي (Voter) وقاعدة البيانات القديمة (legacy_voters_db) باستعلام واحد لكل مصدر،
+مع تحميل جداول الأبعاد الصغيرة (المراكز، مراكز التسجيل، المحافظات) في الذاكرة مرة واحدة
+وذاكرة LRU محدودة الحجم مع مدة صلاحية لنتائج البحث الأخيرة
+"""
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Voter
+from .models_legacy import PersonHD, PCHd, VrcHD, GovernorateHD
+from .search import normalize_digits
+
+logger = logging.getLogger(__name__)
+
+LEGACY_DB = 'legacy_voters_db'
+
+# الحد الأقصى لعدد الأرقام في طلب بحث جماعي واحد
+MAX_BATCH_LOOKUP = 1000
+
+# علامة للنتائج السلبية (الناخب غير موجود) حتى لا يتكرر الاستعلام عنها
+_MISSING = object()
+
+
+def normalize_voter_number(value):
+    """توحيد رقم الناخب: أرقام لاتينية بدون مسافات"""
+    return normalize_digits(value)
+
+
+_NUMBER_SEPARATORS_RE = re.compile(r'[\s,،;]+')
+
+
+def parse_voter_numbers(text):
+    """تحويل نص ملصوق (فواصل، أسطر، مسافات) إلى قائمة أرقام ناخبين موحدة دون تكرار"""
+    numbers = _NUMBER_SEPARATORS_RE.split(normalize_voter_number(text))
+    return list(dict.fromkeys(n for n in numbers if n))
+
+
+class TTLCache:
+    """ذاكرة LRU محدودة الحجم مع مدة صلاحية لكل عنصر (آمنة للاستخدام من عدة threads)"""
+
+    def __init__(self, maxsize=4096, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class VoterResolver:
+    """البحث عن بيانات الناخب في قاعدة البيانات القديمة والمحلية"""
+
+    def __init__(self, maxsize=4096, ttl=300, dimensions_ttl=3600):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.dimensions_ttl = dimensions_ttl
+        self._dimensions = None
+        self._dimensions_loaded_at = 0
+        self._lock = threading.Lock()
+
+    # ---------- Legacy dimension tables ----------
+
+    @property
+    def legacy_available(self):
+        return LEGACY_DB in settings.DATABASES
+
+    def _load_dimensions(self):
+        centers, vrcs, governorates = {}, {}, {}
+        try:
+            centers = dict(PCHd.objects.using(LEGACY_DB).values_list('pcno', 'pc_name'))
+            vrcs = dict(VrcHD.objects.using(LEGACY_DB).values_list('vrc_id', 'vrc_name_ar'))
+            governorates = {
+                str(gov_no): name
+                for gov_no, name in GovernorateHD.objects.using(LEGACY_DB).values_list('gov_no', 'gov_name')
+            }
+        except Exception as e:
+            logger.warning(f"Legacy dimension load failed: {e}")
+        return {'centers': centers, 'vrcs': vrcs, 'governorates': governorates}
+
+    @property
+    def dimensions(self):
+        """جداول الأبعاد محملة في الذاكرة (تُحدّث كل dimensions_ttl ثانية)"""
+        now = time.monotonic()
+        if self._dimensions is None or now - self._dimensions_loaded_at > self.dimensions_ttl:
+            with self._lock:
+                if self._dimensions is None or now - self._dimensions_loaded_at > self.dimensions_ttl:
+                    self._dimensions = self._load_dimensions()
+                    self._dimensions_loaded_at = now
+        return self._dimensions
+
+    def center_name(self, pcno):
+        return self.dimensions['centers'].get(pcno) or ''
+
+    def registration_center_name(self, vrc_id):
+        return self.dimensions['vrcs'].get(vrc_id) or ''
+
+    def governorate_name(self, gov_id):
+        if gov_id is None:
+            return ''
+        return self.dimensions['governorates'].get(str(gov_id)) or ''
+
+    # ---------- Lookups ----------
+
+    def person_to_data(self, person):
+        """تحويل سجل PersonHD إلى قاموس بيانات الناخب"""
+        full_name = ' '.join(filter(None, [person.per_first, person.per_father, person.per_grand]))
+        return {
+            'voter_number': str(person.per_id),
+            'full_name': full_name,
+            'date_of_birth': person.per_dob or '',
+            'voting_center_number': person.pcno,
+            'voting_center_name': self.center_name(person.pcno),
+            'family_number': person.per_famno,
+            'registration_center_name': self.registration_center_name(person.per_vrc_id),
+            'registration_center_number': person.per_vrc_id,
+            'governorate': self.governorate_name(person.per_gov_id),
+            'station_number': person.psno,
+        }
+
+    def get_person(self, voter_number):
+        """بيانات الناخب من قاعدة البيانات القديمة (استعلام واحد، مع التخزين المؤقت)"""
+        if not voter_number or not self.legacy_available:
+            return None
+
+        cached = self.cache.get(voter_number)
+        if cached is not None:
+            return None if cached is _MISSING else cached
+
+        try:
+            person = PersonHD.objects.using(LEGACY_DB).filter(per_id=voter_number).first()
+        except Exception as e:
+            # Database connection error or invalid number - don't cache
+            logger.warning(f"Legacy DB lookup failed: {e}")
+            return None
+
+        data = self.person_to_data(person) if person else None
+        self.cache.set(voter_number, data if data else _MISSING)
+        return data
+
+    def get_people(self, voter_numbers):
+        """بيانات عدة ناخبين من قاعدة البيانات القديمة باستعلام IN واحد للأرقام غير المخزنة"""
+        found = {}
+        if not self.legacy_available:
+            return found
+
+        pending = []
+        for number in voter_numbers:
+            cached = self.cache.get(number)
+            if cached is None:
+                pending.append(number)
+            elif cached is not _MISSING:
+                found[number] = cached
+
+        ids = [int(n) for n in pending if n.isdigit()]
+        if ids:
+            try:
+                people = PersonHD.objects.using(LEGACY_DB).filter(per_id__in=ids)
+                for person in people:
+                    data = self.person_to_data(person)
+                    found[data['voter_number']] = data
+            except Exception as e:
+                logger.warning(f"Legacy DB batch lookup failed: {e}")
+                return found
+
+        for number in pending:
+            self.cache.set(number, found.get(number, _MISSING))
+        return found
+
+    def get_local(self, voter_number):
+        """الناخب من السجل المحلي مع المعرف (استعلام واحد)"""
+        if not voter_number:
+            return None
+        return Voter.objects.select_related('introducer').filter(voter_number=voter_number).first()
+
+    def get_local_many(self, voter_numbers):
+        """الناخبون المحليون لعدة أرقام باستعلام IN واحد، كقاموس حسب رقم الناخب"""
+        if not voter_numbers:
+            return {}
+        voters = Voter.objects.select_related('introducer').filter(voter_number__in=voter_numbers)
+        return {voter.voter_number: voter for voter in voters}
+
+    def resolve_many(self, voter_numbers, introducer_id=None):
+        """
+        البحث الجماعي: استعلام IN واحد على Voter واستعلام IN واحد على PersonHD للأرقام غير المخزنة
+        يعيد قاموساً حسب رقم الناخب يتضمن البيانات وحالة الارتباط بالمعرف
+        """
+        numbers = list(dict.fromkeys(n for n in voter_numbers if n))
+        local = self.get_local_many(numbers)
+        people = self.get_people(numbers)
+
+        results = {}
+        for number in numbers:
+            voter = local.get(number)
+            person = people.get(number)
+            if person:
+                data = {**person, 'mother_name': '', 'phone': (voter.phone or '') if voter else '',
+                        'status': 'active'}
+            elif voter:
+                data = local_voter_to_data(voter)
+            else:
+                results[number] = {'found': False}
+                continue
+
+            same_introducer = bool(
+                voter and voter.introducer_id and introducer_id
+                and str(voter.introducer_id) == str(introducer_id)
+            )
+            data.update({
+                'found': True,
+                'is_new': voter is None,
+                'already_assigned': bool(voter and voter.introducer_id and not same_introducer),
+                'same_introducer': same_introducer,
+                'current_introducer': voter.introducer.full_name if voter and voter.introducer else None,
+            })
+            results[number] = data
+        return results
+
+    def clear(self):
+        self.cache.clear()
+        with self._lock:
+            self._dimensions = None
+
+
+def local_voter_to_data(voter):
+    """تحويل سجل Voter المحلي إلى نفس صيغة بيانات البحث"""
+    return {
+        'voter_number': voter.voter_number,
+        'full_name': voter.full_name,
+        'date_of_birth': voter.date_of_birth.strftime('%Y-%m-%d') if voter.date_of_birth else '',
+        'mother_name': voter.mother_name or '',
+        'phone': voter.phone or '',
+        'voting_center_number': voter.voting_center_number or '',
+        'voting_center_name': voter.voting_center_name or '',
+        'family_number': voter.family_number or '',
+        'registration_center_name': voter.registration_center_name or '',
+        'registration_center_number': voter.registration_center_number or '',
+        'governorate': voter.governorate or '',
+        'station_number': voter.station_number or '',
+        'status': voter.status or 'active',
+    }
+
+
+def new_voter_fields(data):
+    """حقول إنشاء Voter جديد من بيانات قاعدة البيانات القديمة"""
+    return {
+        'voter_number': data['voter_number'],
+        'full_name': data['full_name'],
+        'date_of_birth': data['date_of_birth'] or None,
+        'voting_center_number': data['voting_center_number'] or '',
+        'voting_center_name': data['voting_center_name'],
+        'registration_center_name': data['registration_center_name'],
+        'registration_center_number': data['registration_center_number'] or '',
+        'governorate': data['governorate'] or 'البصرة',
+        'station_number': data['station_number'] or '',
+        'family_number': data['family_number'] or '',
+    }
+
+
+# Shared per-process resolver
+voter_resolver = VoterResolver()
@@ -2,6 +2,10 @@
 ASGI config for electoral_office project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Production serves this through gunicorn's uvicorn worker (see Procfile) so the
+live vote totals stream (/api/vote-totals/stream/) holds no worker thread.
+Synchronous exports and file downloads are wrapped in async iterators
+(elections/exports.py) so they keep streaming instead of being buffered.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -11,6 +15,14 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'electoral_office.settings')
+# Force production settings
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'electoral_office.settings_production')
 
 application = get_asgi_application()
+
+# تحميل دليل المراكز والمحطات عند بدء العملية بدل أول طلب مسح
+try:
+    from elections.polling_directory import polling_directory
+    polling_directory.warm()
+except Exception as e:
+    print(f"Polling directory warm-up skipped: {e}")
@@ -3,6 +3,15 @@
  * نظام مسح الباركود لجرد الأصوات
  */
 
+// المسحات التي تعذر إرسالها تُحفظ على الجهاز وتُرسل لاحقاً كدفعة واحدة
+const PENDING_SCANS_KEY = 'barcodeScanner.pendingScans';
+// الدفعة قيد الإرسال مع مفتاحها (Idempotency-Key)، فإعادة إرسالها بعد انقطاع أو إغلاق الصفحة لا تكررها
+const INFLIGHT_BATCH_KEY = 'barcodeScanner.inflightBatch';
+const MAX_SCAN_BATCH = 200;
+const FLUSH_INTERVAL = 30000;
+// تحديث إحصائيات الجلسة من الخادم (مسحات من أجهزة أخرى لنفس المُشغِّل)
+const STATS_INTERVAL = 15000;
+
 class BarcodeScanner {
     constructor() {
         this.html5QrCode = null;
@@ -23,7 +32,27 @@ class BarcodeScanner {
         document.addEventListener('DOMContentLoaded', () => {
             this.setupEventListeners();
             this.checkActiveSession();
+            this.flushPendingScans();
         });
+
+        window.addEventListener('online', () => this.flushPendingScans());
+        setInterval(() => this.flushPendingScans(), FLUSH_INTERVAL);
+        setInterval(() => this.refreshStats(), STATS_INTERVAL);
+    }
+
+    async refreshStats() {
+        if (!this.sessionId || document.hidden || !navigator.onLine) {
+            return;
+        }
+        try {
+            const response = await fetch('/barcode/api/stats/');
+            const data = await response.json();
+            if (data.success && data.session_stats && String(data.session_id) === String(this.sessionId)) {
+                this.updateStats(data.session_stats);
+            }
+        } catch (error) {
+            // يُعاد في الدورة التالية
+        }
     }
 
     setupEventListeners() {
@@ -272,12 +301,23 @@ class BarcodeScanner {
         // Show processing state
         this.updateProcessingUI(true);
 
+        // One key per scan: network retries replay the server's first answer instead of
+        // being counted as duplicate scans
+        const idempotencyKey = this.newIdempotencyKey();
+
+        if (!navigator.onLine) {
+            this.queueScan(barcodeData, barcodeType, idempotencyKey);
+            this.updateProcessingUI(false);
+            return;
+        }
+
         try {
-            const response = await fetch('/barcode/api/process/', {
+            const request = () => fetch('/barcode/api/process/', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    'X-CSRFToken': this.getCSRFToken()
+                    'X-CSRFToken': this.getCSRFToken(),
+                    'Idempotency-Key': idempotencyKey
                 },
                 body: JSON.stringify({
                     barcode_data: barcodeData,
@@ -286,6 +326,20 @@ class BarcodeScanner {
                 })
             });
 
+            let response;
+            for (let attempt = 1; ; attempt++) {
+                try {
+                    response = await request();
+                    break;
+                } catch (networkError) {
+                    if (attempt >= 3) {
+                        this.queueScan(barcodeData, barcodeType, idempotencyKey);
+                        return;
+                    }
+                    await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+                }
+            }
+
             const data = await response.json();
 
             if (data.success) {
@@ -294,6 +348,9 @@ class BarcodeScanner {
                 this.handleScanError(data);
             }
 
+            // الاتصال عاد: إرسال ما تراكم على الجهاز
+            this.flushPendingScans();
+
         } catch (error) {
             this.showError('فشل في معالجة الباركود: ' + error.message);
         } finally {
@@ -301,6 +358,99 @@ class BarcodeScanner {
         }
     }
 
+    newIdempotencyKey() {
+        return window.crypto && crypto.randomUUID
+            ? crypto.randomUUID()
+            : Date.now() + '-' + Math.random().toString(36).slice(2);
+    }
+
+    readStorage(key, fallback) {
+        try {
+            return JSON.parse(localStorage.getItem(key)) || fallback;
+        } catch (error) {
+            return fallback;
+        }
+    }
+
+    queueScan(barcodeData, barcodeType, clientId) {
+        const pending = this.readStorage(PENDING_SCANS_KEY, []);
+        pending.push({ barcode_data: barcodeData, barcode_type: barcodeType, client_id: clientId });
+        localStorage.setItem(PENDING_SCANS_KEY, JSON.stringify(pending));
+        this.showWarning(`لا يوجد اتصال - تم حفظ المسح على الجهاز (${pending.length} بانتظار الإرسال)`);
+    }
+
+    async flushPendingScans() {
+        if (this.flushing || !this.sessionId || !navigator.onLine) {
+            return;
+        }
+
+        let batch = this.readStorage(INFLIGHT_BATCH_KEY, null);
+        if (!batch) {
+            const pending = this.readStorage(PENDING_SCANS_KEY, []);
+            if (!pending.length) {
+                return;
+            }
+            batch = {
+                key: this.newIdempotencyKey(),
+                body: JSON.stringify({ session_id: this.sessionId, scans: pending.slice(0, MAX_SCAN_BATCH) })
+            };
+            localStorage.setItem(INFLIGHT_BATCH_KEY, JSON.stringify(batch));
+            localStorage.setItem(PENDING_SCANS_KEY, JSON.stringify(pending.slice(MAX_SCAN_BATCH)));
+        }
+
+        this.flushing = true;
+        try {
+            const response = await fetch('/barcode/api/process-batch/', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': this.getCSRFToken(),
+                    'Idempotency-Key': batch.key
+                },
+                body: batch.body
+            });
+
+            // خطأ في الخادم أو الدفعة نفسها قيد المعالجة: تُعاد لاحقاً بنفس المفتاح
+            if (response.status >= 500 || response.status === 409) {
+                return;
+            }
+
+            const scans = JSON.parse(batch.body).scans;
+            localStorage.removeItem(INFLIGHT_BATCH_KEY);
+
+            // الجلسة انتهت: تعود المسحات للانتظار وتُرسل مع الجلسة التالية بمفتاح جديد
+            if (response.status === 404) {
+                const pending = this.readStorage(PENDING_SCANS_KEY, []);
+                localStorage.setItem(PENDING_SCANS_KEY, JSON.stringify(scans.concat(pending)));
+                this.showError('الجلسة التي حُفظت فيها المسحات لم تعد نشطة');
+                return;
+            }
+
+            const data = await response.json();
+            if (!data.success) {
+                this.showError(data.error || 'فشل إرسال المسحات المحفوظة');
+                return;
+            }
+
+            data.results.forEach(result => {
+                if (result.data) {
+                    this.addToRecentScans(result.data, result.status);
+                }
+            });
+            this.updateStats(data.session_stats);
+            const summary = data.summary;
+            this.showInfo(`تم إرسال ${scans.length} مسح محفوظ: ${summary.validated} ناجح، ${summary.error} خاطئ، ${summary.duplicate} مكرر`);
+
+            if (this.readStorage(PENDING_SCANS_KEY, []).length) {
+                setTimeout(() => this.flushPendingScans(), 0);
+            }
+        } catch (error) {
+            // لا يزال الاتصال منقطعاً: تبقى الدفعة محفوظة
+        } finally {
+            this.flushing = false;
+        }
+    }
+
     handleScanSuccess(data) {
         // Update stats
         this.updateStats(data.session_stats);
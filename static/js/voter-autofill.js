@@ -1,8 +1,8 @@
 /**
  * Voter Auto-fill Utility
  * Automatically fills form fields when a valid voter number is entered
- * Version: 2.0
- * Last Updated: 2026-01-15
+ * Version: 2.1
+ * Last Updated: 2026-10-17
  */
 
 (function () {
@@ -14,8 +14,13 @@
         debounceDelay: 500,     // Milliseconds to wait after user stops typing
         successDisplayTime: 3000, // How long to show success message
         apiEndpoint: '/api/voter-lookup/',
+        batchEndpoint: '/api/voter-lookup/batch/',
+        batchSize: 1000,        // Max voter numbers per batch request (server limit)
     };
 
+    // Results already fetched in this page (voter number -> data)
+    const lookupCache = new Map();
+
     // Arabic to English numeral mapping
     const ARABIC_TO_ENGLISH = {
         '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
@@ -35,6 +40,60 @@
         return normalized;
     }
 
+    /**
+     * Reads the CSRF token cookie for POST requests
+     */
+    function getCsrfToken() {
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : '';
+    }
+
+    /**
+     * Looks up many voter numbers with one request per batch.
+     * Returns an object keyed by voter number (each entry has `found`).
+     */
+    async function lookupBatch(voterNumbers, introducerId) {
+        const numbers = [...new Set(voterNumbers.map(n => normalizeArabicNumerals(String(n)).trim()).filter(Boolean))];
+        const results = {};
+        const pending = [];
+
+        for (const number of numbers) {
+            if (!introducerId && lookupCache.has(number)) {
+                results[number] = lookupCache.get(number);
+            } else {
+                pending.push(number);
+            }
+        }
+
+        for (let i = 0; i < pending.length; i += CONFIG.batchSize) {
+            const response = await fetch(CONFIG.batchEndpoint, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCsrfToken()
+                },
+                body: JSON.stringify({
+                    voter_numbers: pending.slice(i, i + CONFIG.batchSize),
+                    introducer_id: introducerId || null
+                })
+            });
+
+            const data = await response.json();
+            if (!response.ok || !data.success) {
+                throw new Error(data.error || 'خطأ في البحث عن أرقام الناخبين');
+            }
+
+            for (const [number, item] of Object.entries(data.results)) {
+                results[number] = item;
+                if (!introducerId && item.found) {
+                    lookupCache.set(number, item);
+                }
+            }
+        }
+
+        return results;
+    }
+
     /**
      * Maps API response fields to form input names
      */
@@ -142,16 +201,24 @@
         showElement(ui.successDiv, false);
 
         try {
-            const response = await fetch(
-                `${CONFIG.apiEndpoint}?voter_number=${encodeURIComponent(voterNumber)}`
-            );
+            let data = lookupCache.get(voterNumber);
 
-            if (!response.ok) {
-                const errorData = await response.json();
-                throw new Error(errorData.error || 'خطأ في البحث عن رقم الناخب');
+            if (!data) {
+                const response = await fetch(
+                    `${CONFIG.apiEndpoint}?voter_number=${encodeURIComponent(voterNumber)}`
+                );
+
+                if (!response.ok) {
+                    const errorData = await response.json();
+                    throw new Error(errorData.error || 'خطأ في البحث عن رقم الناخب');
+                }
+
+                data = await response.json();
+                if (data.found) {
+                    lookupCache.set(voterNumber, data);
+                }
             }
 
-            const data = await response.json();
             const filledCount = fillFormFields(data);
 
             showSpinner(ui.spinner, false);
@@ -220,6 +287,12 @@
         });
     }
 
+    // Public API for pages that resolve pasted lists of voter numbers
+    window.VoterAutofill = {
+        lookupBatch: lookupBatch,
+        normalizeArabicNumerals: normalizeArabicNumerals
+    };
+
     // Initialize on DOM ready
     if (document.readyState === 'loading') {
         document.addEventListener('DOMContentLoaded', initVoterAutofill);